@@ -0,0 +1,285 @@
+# ARQUIVO: analise.py
+# Separadores analíticos do ecrã Relatórios (top de produtos e categorias, ABC, receita móvel,
+# tamanho do cesto, funcionários), calculados com NumPy em vez de SQL.
+#
+# As linhas das encomendas são lidas uma vez para arrays por coluna (dia, produto, funcionário,
+# cliente, quantidade, preço) e depois só se acrescentam as encomendas com NEnc novo: as
+# encomendas nunca são alteradas, só criadas ou apagadas (e apagar obriga a ler tudo de novo).
+# Cada relatório fica guardado até à próxima escrita na BD (db.versao_dados()).
+import numpy as np
+
+# Encomendas por pedido a linhas_analise (também serve por HTTP, ver servico.py)
+PASSO = 20000
+TOP = 20
+# Classes ABC: A até 80 % da receita acumulada, B até 95 %, C o resto
+LIMITES_ABC = (("A", 0.80), ("B", 0.95), ("C", 1.0))
+# Cestos com MAX_CESTO artigos ou mais ficam na última linha
+MAX_CESTO = 10
+
+# Colunas das linhas (a ordem é a do linhas_analise, mais o valor Quant * Preço) e das
+# encomendas (uma posição por encomenda, para o cesto e os funcionários). O que serve de índice
+# ao np.bincount fica em intp: com int32 cada chamada começava por converter o array todo.
+COLUNAS_LINHAS = (("nenc", np.int32), ("dia", np.int32), ("cli", np.int32), ("func", np.int32),
+                  ("prod", np.intp), ("quant", np.int32), ("preco", np.float64), ("valor", np.float64))
+COLUNAS_ENCOMENDAS = (("dia", np.int32), ("cli", np.int32), ("func", np.intp),
+                      ("artigos", np.int32), ("valor", np.float64))
+
+
+def dia_numero(data):
+    # "AAAA-MM-DD" -> dias desde 1970-01-01 (como o linhas_analise)
+    return int(np.datetime64(data[:10], "D").astype(np.int64))
+
+
+def formatar(linhas, formatos):
+    # Valores para a Treeview: "€" moeda, "%" percentagem, "d" dia, "1" uma casa decimal
+    saida = []
+    for linha in linhas:
+        valores = []
+        for valor, formato in zip(linha, formatos):
+            if formato == "€":
+                valor = f"{valor:.2f} €"
+            elif formato == "%":
+                valor = f"{valor:.1f} %"
+            elif formato == "1":
+                valor = f"{valor:.1f}"
+            elif formato == "d":
+                valor = str(np.datetime64(int(valor), "D"))
+            valores.append(valor)
+        saida.append(tuple(valores))
+    return saida
+
+
+class Colunas:
+    # Arrays por coluna com capacidade a dobrar: acrescentar não copia tudo de cada vez.
+    # colunas["dia"] = só as posições preenchidas.
+    def __init__(self, tipos):
+        self.tipos = tipos
+        self.n = 0
+        self._arrays = {nome: np.empty(0, tipo) for nome, tipo in tipos}
+
+    def __getitem__(self, nome):
+        return self._arrays[nome][:self.n]
+
+    def __len__(self):
+        return self.n
+
+    def acrescentar(self, valores):
+        total = self.n + len(next(iter(valores.values())))
+        if total > len(self._arrays[self.tipos[0][0]]):
+            capacidade = max(total, 2 * self.n, 1024)
+            for nome, tipo in self.tipos:
+                array = np.empty(capacidade, tipo)
+                array[:self.n] = self[nome]
+                self._arrays[nome] = array
+        for nome, valor in valores.items():
+            self._arrays[nome][self.n:total] = valor
+        self.n = total
+
+    def limpar(self):
+        self.n = 0
+
+
+class AnaliseVendas:
+    # Só é usada na thread do TrabalhadorBD (como a ligação do db)
+    def __init__(self, db):
+        self.db = db
+        self.versao = None
+        self.linhas = Colunas(COLUNAS_LINHAS)
+        self.encomendas = Colunas(COLUNAS_ENCOMENDAS)
+        # Encomendas já lidas (para saber se alguma foi apagada) e a última lida
+        self.num_encomendas = 0
+        self.ultima_nenc = 0
+        self.produtos = {}
+        self.categorias = np.empty(0, np.int32)
+        self.nomes_categorias = []
+        self.funcionarios = {}
+        self._cache = {}
+
+    # Carregamento
+    def atualizar(self):
+        versao = self.db.versao_dados()
+        if versao == self.versao:
+            return
+        if self.db.contar_encomendas(self.ultima_nenc)[0] != self.num_encomendas:
+            self.linhas.limpar()
+            self.encomendas.limpar()
+            self.num_encomendas = self.ultima_nenc = 0
+        num_encomendas, maior = self.db.contar_encomendas()
+        for de in range(self.ultima_nenc + 1, (maior or 0) + 1, PASSO):
+            self._acrescentar(self.db.linhas_analise(de, de + PASSO - 1))
+        self.num_encomendas = num_encomendas
+        self.ultima_nenc = maior or 0
+        self._ler_nomes()
+        self._cache.clear()
+        self.versao = versao
+
+    def _acrescentar(self, linhas):
+        if not linhas:
+            return
+        novas = np.array(linhas, dtype=np.float64)
+        colunas = {nome: novas[:, i] for i, (nome, _tipo) in enumerate(COLUNAS_LINHAS[:-1])}
+        colunas["valor"] = colunas["quant"] * colunas["preco"]
+        self.linhas.acrescentar(colunas)
+        # Cada lote traz encomendas inteiras, ordenadas por NEnc: cada uma é um bloco seguido
+        nenc = colunas["nenc"]
+        inicios = np.flatnonzero(np.concatenate(([True], nenc[1:] != nenc[:-1])))
+        self.encomendas.acrescentar({"dia": colunas["dia"][inicios], "cli": colunas["cli"][inicios],
+                                     "func": colunas["func"][inicios],
+                                     "artigos": np.add.reduceat(colunas["quant"], inicios),
+                                     "valor": np.add.reduceat(colunas["valor"], inicios)})
+
+    def _ler_nomes(self):
+        produtos = self.db.consultar_produtos()
+        self.produtos = {p[0]: p[1] for p in produtos}
+        # CodProd -> índice da categoria (0 = sem categoria, também para produtos apagados); cobre
+        # todos os CodProd das linhas lidas
+        self.nomes_categorias = ["Sem categoria"] + sorted({p[2] for p in produtos if p[2]})
+        indices = {nome: i for i, nome in enumerate(self.nomes_categorias)}
+        maior = max([p[0] for p in produtos] + [int(self.linhas["prod"].max()) if len(self.linhas) else 0])
+        self.categorias = np.zeros(maior + 1, np.int32)
+        for p in produtos:
+            self.categorias[p[0]] = indices.get(p[2], 0)
+        self.funcionarios = {f[0]: f[1] for f in self.db.consultar_funcionarios()}
+
+    # Relatórios
+    def relatorio(self, nome, inicio=None, fim=None):
+        # (colunas, linhas já formatadas) do separador nome, no período inicio..fim (AAAA-MM-DD)
+        self.atualizar()
+        chave = (nome, inicio, fim)
+        if chave not in self._cache:
+            metodo, colunas, formatos = RELATORIOS[nome]
+            self._cache[chave] = colunas, formatar(metodo(self, inicio, fim), formatos)
+        return self._cache[chave]
+
+    def _periodo(self, tabela, inicio, fim, *nomes):
+        # Colunas das linhas (ou encomendas) do período; None = sem limite
+        colunas = [tabela[nome] for nome in nomes]
+        if inicio is None and fim is None:
+            return colunas
+        dias = tabela["dia"]
+        mascara = np.ones(len(dias), bool)
+        if inicio is not None:
+            mascara &= dias >= dia_numero(inicio)
+        if fim is not None:
+            mascara &= dias <= dia_numero(fim)
+        return [c[mascara] for c in colunas]
+
+    def _top(self, valores, n):
+        # Índices dos n maiores valores (> 0), do maior para o menor
+        n = min(n, int(np.count_nonzero(valores > 0)))
+        if n == 0:
+            return np.empty(0, np.intp)
+        top = np.argpartition(-valores, n - 1)[:n]
+        return top[np.argsort(-valores[top], kind="stable")]
+
+    def _por_produto(self, inicio, fim):
+        # (receita, unidades) por CodProd no período; base do top de produtos, das categorias e do ABC
+        chave = ("produtos", inicio, fim)
+        if chave not in self._cache:
+            prod, quant, valor = self._periodo(self.linhas, inicio, fim, "prod", "quant", "valor")
+            receita = np.bincount(prod, weights=valor, minlength=len(self.categorias))
+            self._cache[chave] = receita, np.bincount(prod, weights=quant, minlength=len(receita))
+        return self._cache[chave]
+
+    def top_produtos(self, inicio=None, fim=None, n=TOP):
+        receita, unidades = self._por_produto(inicio, fim)
+        total = receita.sum() or 1
+        return [(self.produtos.get(int(p), f"ID {p} (apagado)"),
+                 self.nomes_categorias[self.categorias[p]],
+                 int(unidades[p]), receita[p], 100 * receita[p] / total)
+                for p in self._top(receita, n)]
+
+    def top_categorias(self, inicio=None, fim=None, n=TOP):
+        # Soma-se por produto e depois por categoria: a segunda soma é só sobre os produtos
+        receita_prod, unidades_prod = self._por_produto(inicio, fim)
+        receita = np.bincount(self.categorias, weights=receita_prod, minlength=len(self.nomes_categorias))
+        unidades = np.bincount(self.categorias, weights=unidades_prod, minlength=len(receita))
+        total = receita.sum() or 1
+        return [(self.nomes_categorias[c], int(unidades[c]), receita[c], 100 * receita[c] / total)
+                for c in self._top(receita, n)]
+
+    def classes_abc(self, inicio=None, fim=None):
+        # Pareto dos produtos vendidos: classe, produto, receita, % e % acumulada
+        receita, _unidades = self._por_produto(inicio, fim)
+        vendidos = np.flatnonzero(receita > 0)
+        vendidos = vendidos[np.argsort(-receita[vendidos], kind="stable")]
+        parte = receita[vendidos] / (receita.sum() or 1)
+        acumulada = np.cumsum(parte)
+        # Conta a receita acumulada antes do produto: o que passa dos 80 % ainda é A
+        antes = acumulada - parte
+        classes = np.searchsorted([limite for _, limite in LIMITES_ABC[:-1]], antes, side="right")
+        return [(LIMITES_ABC[c][0], self.produtos.get(int(p), f"ID {p} (apagado)"), receita[p], 100 * s, 100 * a)
+                for c, p, s, a in zip(classes, vendidos, parte, acumulada)]
+
+    def receita_movel(self, inicio=None, fim=None):
+        # Receita de cada dia e das janelas de 7 e 30 dias que acabam nele (mais recente primeiro);
+        # as janelas do início do período contam os dias anteriores a ele
+        if len(self.encomendas) == 0:
+            return []
+        if "diaria" not in self._cache:
+            dia = self.encomendas["dia"]
+            primeiro = int(dia.min())
+            diaria = np.bincount(dia - primeiro, weights=self.encomendas["valor"])
+            acumulada = np.concatenate(([0.0], np.cumsum(diaria)))
+            fins = np.arange(1, len(diaria) + 1)
+            self._cache["diaria"] = (primeiro, diaria, acumulada[fins] - acumulada[np.maximum(fins - 7, 0)],
+                                     acumulada[fins] - acumulada[np.maximum(fins - 30, 0)])
+        primeiro, diaria, movel7, movel30 = self._cache["diaria"]
+        de = 0 if inicio is None else max(0, dia_numero(inicio) - primeiro)
+        ate = len(diaria) if fim is None else min(len(diaria), dia_numero(fim) - primeiro + 1)
+        return [(primeiro + i, diaria[i], movel7[i], movel30[i]) for i in range(ate - 1, de - 1, -1)]
+
+    def tamanho_cesto(self, inicio=None, fim=None):
+        # Vendas por nº de artigos: vendas, % das vendas, receita, ticket médio
+        artigos, valor = self._periodo(self.encomendas, inicio, fim, "artigos", "valor")
+        artigos = np.clip(artigos, 1, MAX_CESTO)
+        vendas = np.bincount(artigos, minlength=MAX_CESTO + 1)
+        receita = np.bincount(artigos, weights=valor, minlength=MAX_CESTO + 1)
+        total = vendas.sum() or 1
+        return [(f"{a}+" if a == MAX_CESTO else str(a), int(vendas[a]), 100 * vendas[a] / total, receita[a],
+                 receita[a] / vendas[a]) for a in range(1, MAX_CESTO + 1) if vendas[a]]
+
+    def funcionarios_conversao(self, inicio=None, fim=None):
+        # Sem registo de visitas à loja, a "conversão" de cada funcionário mede-se nas vendas:
+        # % com mais de um artigo (venda adicional) e % de clientes que voltaram a comprar-lhe
+        func, cli, artigos, valor = self._periodo(self.encomendas, inicio, fim, "func", "cli", "artigos", "valor")
+        vendas = np.bincount(func)
+        if len(vendas) == 0:
+            return []
+        receita = np.bincount(func, weights=valor, minlength=len(vendas))
+        artigos_func = np.bincount(func, weights=artigos, minlength=len(vendas))
+        varios = np.bincount(func, weights=artigos > 1, minlength=len(vendas))
+        # Pares (funcionário, cliente) distintos e quantos se repetem (cliente 0 = sem cliente)
+        pares, compras = np.unique(func.astype(np.int64) << 32 | cli, return_counts=True)
+        func_par = (pares >> 32).astype(np.intp)
+        com_cliente = (pares & 0xFFFFFFFF) > 0
+        clientes = np.bincount(func_par[com_cliente], minlength=len(vendas))
+        voltaram = np.bincount(func_par[com_cliente], weights=compras[com_cliente] > 1, minlength=len(vendas))
+        linhas = []
+        for f in np.argsort(-receita, kind="stable"):
+            if vendas[f] == 0:
+                continue
+            nome = self.funcionarios.get(int(f), "Sem funcionário" if f == 0 else f"ID {f} (apagado)")
+            linhas.append((nome, int(vendas[f]), receita[f], receita[f] / vendas[f], artigos_func[f] / vendas[f],
+                           100 * varios[f] / vendas[f], int(clientes[f]),
+                           100 * voltaram[f] / clientes[f] if clientes[f] else 0.0))
+        return linhas
+
+
+# Separador -> (método, colunas, formato de cada coluna para formatar())
+RELATORIOS = {
+    "Top produtos": (AnaliseVendas.top_produtos,
+                     ("Produto", "Categoria", "Unidades", "Receita (€)", "% Receita"), ("", "", "", "€", "%")),
+    "Top categorias": (AnaliseVendas.top_categorias,
+                       ("Categoria", "Unidades", "Receita (€)", "% Receita"), ("", "", "€", "%")),
+    "ABC": (AnaliseVendas.classes_abc,
+            ("Classe", "Produto", "Receita (€)", "% Receita", "% Acumulada"), ("", "", "€", "%", "%")),
+    "Receita 7/30 dias": (AnaliseVendas.receita_movel,
+                          ("Dia", "Receita (€)", "Últimos 7 dias (€)", "Últimos 30 dias (€)"), ("d", "€", "€", "€")),
+    "Cesto": (AnaliseVendas.tamanho_cesto,
+              ("Artigos", "Vendas", "% Vendas", "Receita (€)", "Ticket Médio (€)"), ("", "", "%", "€", "€")),
+    "Funcionários": (AnaliseVendas.funcionarios_conversao,
+                     ("Funcionário", "Vendas", "Receita (€)", "Ticket Médio (€)", "Artigos/Venda",
+                      "% Vendas 2+ Artigos", "Clientes", "% Clientes Repetentes"),
+                     ("", "", "€", "€", "1", "%", "", "%")),
+}
@@ -0,0 +1,237 @@
+# ARQUIVO: benchmark_bd.py
+# Tempos de todos os métodos do MaquilhagemDB em BDs geradas (gerar_dados.py) com 1k, 100k e 1M
+# encomendas. Os resultados vão para um JSON, que se pode comparar com o de outra versão.
+#
+#   python benchmark_bd.py --escalas 1000,100000 --saida antes.json
+#   python benchmark_bd.py --escalas 1000,100000 --saida depois.json --comparar antes.json
+#
+# As BDs geradas ficam em --pasta e são reutilizadas (mesma semente e escala = mesmos dados);
+# as escritas medidas são desfeitas no fim de cada grupo, por isso os dados não mudam entre corridas.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from gestao_de_maquilhagem import MaquilhagemDB
+from gerar_dados import gerar
+
+ESCALAS = "1000,100000,1000000"
+
+
+def tamanhos(encomendas):
+    # Restantes tabelas proporcionais ao número de encomendas, como numa loja real
+    return {"clientes": max(50, encomendas // 10), "produtos": max(50, min(encomendas // 50, 20000)),
+            "funcionarios": max(3, min(encomendas // 20000, 50)), "encomendas": encomendas}
+
+
+def preparar_bd(pasta, semente, encomendas):
+    caminho = os.path.join(pasta, f"bench_s{semente}_e{encomendas}.db")
+    if not os.path.exists(caminho):
+        # Gera num ficheiro à parte: uma geração interrompida não é reutilizada
+        temporario = caminho + ".gerar"
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        t0 = time.perf_counter()
+        db = MaquilhagemDB(temporario)
+        gerar(db, semente, **tamanhos(encomendas),
+              progresso=lambda n, total: print(f"\r  a gerar {n}/{total} encomendas...", end="", flush=True))
+        db.fechar()
+        os.replace(temporario, caminho)
+        print(f"\r  BD com {encomendas} encomendas gerada em {time.perf_counter() - t0:.0f} s")
+    return caminho
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def resumo(metodo, escala, tempos, linhas):
+    tempos = sorted(tempos)
+    return {"escala": escala, "metodo": metodo, "n": len(tempos), "linhas": linhas,
+            "min_ms": tempos[0] * 1000, "p50_ms": percentil(tempos, 0.5) * 1000,
+            "p95_ms": percentil(tempos, 0.95) * 1000, "max_ms": tempos[-1] * 1000}
+
+
+def medir(funcao, repeticoes, tempo_max):
+    # Pelo menos uma execução; para mais cedo se já passou tempo_max segundos
+    tempos = []
+    inicio = time.perf_counter()
+    while len(tempos) < repeticoes:
+        t0 = time.perf_counter()
+        r = funcao()
+        if r is not None and not isinstance(r, (list, tuple, dict, bool)):
+            r = list(r)  # geradores (exportar_linhas_encomendas) consomem-se dentro da medição
+        tempos.append(time.perf_counter() - t0)
+        if time.perf_counter() - inicio > tempo_max:
+            break
+    return tempos, len(r) if isinstance(r, (list, tuple, dict)) else None
+
+
+def contexto(db, semente):
+    # Argumentos das chamadas, escolhidos da BD com a mesma semente (iguais entre versões)
+    rnd = random.Random(semente)
+    conn = db.connect()
+    nencs = [r[0] for r in conn.execute("SELECT NEnc FROM Encomendas ORDER BY NEnc")]
+    produtos = conn.execute("SELECT CodProd, CodigoBarras, Preco, Quantidade FROM Produtos ORDER BY CodProd").fetchall()
+    vendedor = conn.execute("SELECT CodFunc FROM Funcionarios WHERE Username='vendedor2'").fetchone()[0]
+    ultimo_dia = conn.execute("SELECT MAX(DataEnc) FROM Encomendas").fetchone()[0]
+    return {"nenc": rnd.choice(nencs), "nenc_meio": nencs[len(nencs) // 2], "produto": rnd.choice(produtos),
+            "codigos": [p[1] for p in rnd.sample(produtos, min(20, len(produtos)))],
+            "vendaveis": [p for p in produtos if p[3] >= 100],
+            "cod_cli": conn.execute("SELECT MIN(CodCli) FROM Clientes").fetchone()[0], "vendedor": vendedor,
+            "mes_ini": ultimo_dia[:8] + "01", "mes_fim": ultimo_dia, "rnd": rnd}
+
+
+def leituras(db, c):
+    return [
+        ("efetuar_login", lambda: db.efetuar_login("vendedor1", "vendedor1")),
+        ("consultar_clientes", db.consultar_clientes),
+        ("consultar_clientes_pagina", lambda: db.consultar_clientes_pagina(apos=c["cod_cli"] + 100)),
+        ("consultar_produtos", db.consultar_produtos),
+        ("consultar_produtos_pagina", db.consultar_produtos_pagina),
+        ("obter_produto_por_id", lambda: db.obter_produto_por_id(c["produto"][0])),
+        ("obter_produto_por_codigo", lambda: db.obter_produto_por_codigo(c["produto"][1])),
+        ("codigos_em_uso", lambda: db.codigos_em_uso(c["codigos"])),
+        ("consultar_funcionarios", db.consultar_funcionarios),
+        ("consultar_funcionarios_pagina", db.consultar_funcionarios_pagina),
+        ("consultar_encomendas", db.consultar_encomendas),
+        ("consultar_encomendas(vendedor)", lambda: db.consultar_encomendas(c["vendedor"])),
+        ("consultar_encomendas_pagina", db.consultar_encomendas_pagina),
+        ("consultar_encomendas_pagina(meio)", lambda: db.consultar_encomendas_pagina(apos=c["nenc_meio"])),
+        ("obter_encomenda", lambda: db.obter_encomenda(c["nenc"])),
+        ("consultar_itens_encomenda", lambda: db.consultar_itens_encomenda(c["nenc"])),
+        ("verificar_totais_encomendas", db.verificar_totais_encomendas),
+        ("pesquisar_clientes", lambda: db.pesquisar_clientes("ana silva")),
+        ("pesquisar_produtos", lambda: db.pesquisar_produtos("batom matte")),
+        ("pesquisar_funcionarios", lambda: db.pesquisar_funcionarios("vended")),
+        ("pesquisar_encomendas", lambda: db.pesquisar_encomendas("silva")),
+        ("resumo_vendas_funcionarios", db.resumo_vendas_funcionarios),
+        ("resumo_vendas_funcionarios(vendedor)", lambda: db.resumo_vendas_funcionarios(c["vendedor"])),
+        ("vendas_por_funcionario_mes", lambda: db.vendas_por_funcionario_mes(c["vendedor"])),
+        ("vendas_por_produto", db.vendas_por_produto),
+        ("vendas_por_produto(mes)", lambda: db.vendas_por_produto(c["mes_ini"], c["mes_fim"])),
+        ("vendas_por_categoria", db.vendas_por_categoria),
+        ("exportar_linhas_encomendas(mes)", lambda: db.exportar_linhas_encomendas(c["mes_ini"], c["mes_fim"])),
+    ]
+
+
+def escritas(db, c, escala, repeticoes):
+    # Cada grupo cria, altera e apaga o que criou: a BD fica como estava
+    resultados = []
+
+    def cronometrar(metodo, chamadas):
+        tempos = []
+        for chamada in chamadas:
+            t0 = time.perf_counter()
+            chamada()
+            tempos.append(time.perf_counter() - t0)
+        resultados.append(resumo(metodo, escala, tempos, None))
+
+    rnd = c["rnd"]
+    hoje = c["mes_fim"]
+    conn = db.connect()
+    ultima = conn.execute("SELECT IFNULL(MAX(NEnc), 0) FROM Encomendas").fetchone()[0]
+    carrinhos = [[(p[0], 1, p[2]) for p in rnd.sample(c["vendaveis"], min(3, len(c["vendaveis"])))]
+                 for _ in range(repeticoes * 2)]
+    cronometrar("adicionar_encomenda", [lambda it=it: db.adicionar_encomenda(hoje, c["cod_cli"], it, c["vendedor"])
+                                        for it in carrinhos[:repeticoes]])
+    cronometrar("registar_venda", [lambda it=it: db.registar_venda(hoje, c["cod_cli"], it, c["vendedor"])
+                                   for it in carrinhos[repeticoes:]])
+    novas = [r[0] for r in conn.execute("SELECT NEnc FROM Encomendas WHERE NEnc > ? ORDER BY NEnc", (ultima,))]
+    cronometrar("excluir_encomenda", [lambda n=n: db.excluir_encomenda(n) for n in novas[:repeticoes]])
+    cronometrar("excluir_encomendas", [lambda: db.excluir_encomendas(novas[repeticoes:])])
+
+    cronometrar("adicionar_cliente", [lambda i=i: db.adicionar_cliente(f"Bench {i}", "912345678", f"bench{i}@teste.pt")
+                                      for i in range(repeticoes)])
+    clientes = [r[0] for r in conn.execute("SELECT CodCli FROM Clientes WHERE Email LIKE 'bench%@teste.pt'")]
+    cronometrar("atualizar_cliente", [lambda cod=cod: db.atualizar_cliente(cod, "Bench", "919999999", f"b{cod}@teste.pt")
+                                      for cod in clientes])
+    cronometrar("excluir_clientes", [lambda: db.excluir_clientes(clientes)])
+    lote = [(f"Importado {i}", "912345678", f"importado{i}@teste.pt") for i in range(1000)]
+    cronometrar("importar_clientes(1000)", [lambda: db.importar_clientes(lote)])
+    importados = [r[0] for r in conn.execute("SELECT CodCli FROM Clientes WHERE Email LIKE 'importado%@teste.pt'")]
+    db.excluir_clientes(importados)
+
+    cronometrar("adicionar_produto", [lambda i=i: db.adicionar_produto(f"Bench {i}", "Base", "Bench", 9.99, 10)
+                                      for i in range(repeticoes)])
+    produtos = [r[0] for r in conn.execute("SELECT CodProd FROM Produtos WHERE Marca = 'Bench'")]
+    cronometrar("atualizar_produto", [lambda cod=cod: db.atualizar_produto(cod, f"Bench {cod}", "Base", "Bench", 8.5, 5)
+                                      for cod in produtos])
+    cronometrar("excluir_produtos", [lambda: db.excluir_produtos(produtos)])
+    return resultados
+
+
+def versao_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def comparar(resultados, caminho_base, limiar):
+    # Devolve as regressões: p50 acima de limiar x o da base, para a mesma escala e método
+    with open(caminho_base, encoding="utf-8") as f:
+        base = {(r["escala"], r["metodo"]): r for r in json.load(f)["resultados"]}
+    regressoes = []
+    print(f"\nComparação com {caminho_base} (p50, regressão acima de x{limiar}):")
+    for r in resultados:
+        anterior = base.get((r["escala"], r["metodo"]))
+        if not anterior:
+            continue
+        razao = r["p50_ms"] / max(anterior["p50_ms"], 0.001)
+        marca = "  REGRESSÃO" if razao > limiar else ""
+        print(f"{r['escala']:>9} {r['metodo']:<38}{anterior['p50_ms']:>10.2f} -> {r['p50_ms']:>10.2f} ms"
+              f"  x{razao:.2f}{marca}")
+        if marca:
+            regressoes.append(r)
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos métodos do MaquilhagemDB")
+    parser.add_argument("--escalas", default=ESCALAS, help="Encomendas por BD, separadas por vírgulas")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--tempo-max", type=float, default=10.0, help="Segundos máximos por método e escala")
+    parser.add_argument("--pasta", default=os.path.join(tempfile.gettempdir(), "bench_maquilhagem"),
+                        help="Onde ficam (e se reutilizam) as BDs geradas")
+    parser.add_argument("--saida", default="benchmark_bd.json", help="Resultados em JSON")
+    parser.add_argument("--comparar", help="JSON de uma corrida anterior")
+    parser.add_argument("--limiar", type=float, default=1.25)
+    args = parser.parse_args()
+
+    os.makedirs(args.pasta, exist_ok=True)
+    resultados = []
+    for escala in (int(e) for e in args.escalas.split(",")):
+        print(f"Escala: {escala} encomendas")
+        db = MaquilhagemDB(preparar_bd(args.pasta, args.semente, escala))
+        c = contexto(db, args.semente)
+        for metodo, funcao in leituras(db, c):
+            tempos, linhas = medir(funcao, args.repeticoes, args.tempo_max)
+            resultados.append(resumo(metodo, escala, tempos, linhas))
+        resultados.extend(escritas(db, c, escala, args.repeticoes))
+        db.fechar()
+        for r in (r for r in resultados if r["escala"] == escala):
+            print(f"  {r['metodo']:<38}p50 {r['p50_ms']:>10.2f} ms  p95 {r['p95_ms']:>10.2f} ms"
+                  f"  {'' if r['linhas'] is None else r['linhas']:>8}")
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({"versao_git": versao_git(), "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                   "python": sys.version.split()[0], "sqlite": sqlite3.sqlite_version,
+                   "plataforma": platform.platform(), "semente": args.semente, "repeticoes": args.repeticoes,
+                   "resultados": resultados}, f, ensure_ascii=False, indent=1)
+    print(f"\nResultados em {args.saida}")
+    if args.comparar and comparar(resultados, args.comparar, args.limiar):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
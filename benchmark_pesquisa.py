@@ -0,0 +1,72 @@
+# ARQUIVO: benchmark_pesquisa.py
+# Compara a pesquisa antiga de MainApp.filtrar (ler a tabela toda e procurar em Python)
+# com a pesquisa FTS5 (pesquisar_clientes), numa BD temporária com muitos clientes.
+#
+#   python benchmark_pesquisa.py --clientes 100000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from gestao_de_maquilhagem import MaquilhagemDB
+
+NOMES = ["Ana", "Beatriz", "Carla", "Débora", "Inês", "Joana", "José", "Luís", "Márcia", "Patrícia",
+         "Rita", "Sónia", "Tânia", "Vítor", "João", "Conceição", "Helena", "Fátima", "Rúben", "Mónica"]
+APELIDOS = ["Silva", "Santos", "Ferreira", "Pereira", "Oliveira", "Costa", "Rodrigues", "Martins",
+            "Gonçalves", "Sousa", "Simões", "Lourenço", "Magalhães", "Brandão", "Araújo", "Damásio"]
+TERMOS = ["jo", "conceicao", "ana silva", "magalh", "mon", "91234", "rita@"]
+
+
+def filtrar_antigo(db, termo):
+    # Igual ao ciclo que MainApp.filtrar fazia em cada tecla
+    termo = termo.lower()
+    resultado = []
+    for row in db.consultar_clientes():
+        full_str = " ".join([str(x).lower() for x in row if x is not None])
+        if termo in full_str:
+            resultado.append(row)
+    return resultado
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        n = len(funcao())
+        tempos.append(time.perf_counter() - t0)
+    tempos.sort()
+    return tempos[len(tempos) // 2], n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pesquisa antiga vs FTS5")
+    parser.add_argument("--clientes", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.semente)
+    caminho = os.path.join(tempfile.mkdtemp(prefix="bench_pesquisa_"), "bench.db")
+    db = MaquilhagemDB(caminho)
+    t0 = time.perf_counter()
+    with db.transacao() as conn:
+        conn.executemany("INSERT INTO Clientes (NomeCli, Telefone, Email) VALUES (?, ?, ?)",
+                         ((f"{rnd.choice(NOMES)} {rnd.choice(APELIDOS)} {rnd.choice(APELIDOS)}",
+                           f"9{rnd.randint(10000000, 99999999)}",
+                           f"{rnd.choice(NOMES).lower()}{i}@exemplo.pt") for i in range(args.clientes)))
+    print(f"{args.clientes} clientes inseridos (com índice FTS) em {time.perf_counter() - t0:.1f} s\n")
+
+    print(f"{'termo':<12}{'antigo (ms)':>14}{'FTS5 (ms)':>12}{'x':>8}{'linhas':>16}")
+    for termo in TERMOS:
+        t_antigo, n_antigo = medir(lambda: filtrar_antigo(db, termo), args.repeticoes)
+        t_fts, n_fts = medir(lambda: db.pesquisar_clientes(termo), args.repeticoes)
+        print(f"{termo:<12}{t_antigo * 1000:>14.1f}{t_fts * 1000:>12.2f}{t_antigo / t_fts:>8.0f}"
+              f"{n_antigo:>8}/{n_fts:<7}")
+    print("\nlinhas = antigo/FTS5: a FTS5 procura palavras por prefixo e ignora acentos,\n"
+          "a pesquisa antiga procurava substrings com acentos.")
+    db.fechar()
+
+
+if __name__ == "__main__":
+    main()
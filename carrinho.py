@@ -0,0 +1,53 @@
+# ARQUIVO: carrinho.py
+# Carrinho do POS: uma linha por produto, acesso direto pelo CodProd e total mantido a cada
+# alteração (em cêntimos, para não acumular erros de arredondamento).
+
+
+def cents(preco) -> int:
+    return int(round(preco * 100))
+
+
+class Carrinho:
+    def __init__(self):
+        self.linhas = {}  # CodProd -> [quantidade, preço unitário], pela ordem em que entraram
+        self.total_cents = 0
+        self.num_itens = 0
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def quantidade(self, cod_prod) -> int:
+        linha = self.linhas.get(cod_prod)
+        return linha[0] if linha else 0
+
+    def subtotal(self, cod_prod) -> float:
+        qtd, preco = self.linhas[cod_prod]
+        return cents(preco) * qtd / 100
+
+    @property
+    def total(self) -> float:
+        return self.total_cents / 100
+
+    def definir(self, cod_prod, quantidade, preco=None):
+        # Quantidade final da linha; 0 (ou menos) tira a linha do carrinho
+        atual = self.linhas.get(cod_prod)
+        if atual:
+            self.total_cents -= cents(atual[1]) * atual[0]
+            self.num_itens -= atual[0]
+            preco = atual[1] if preco is None else preco
+        if quantidade <= 0:
+            self.linhas.pop(cod_prod, None)
+            return
+        self.linhas[cod_prod] = [quantidade, preco]
+        self.total_cents += cents(preco) * quantidade
+        self.num_itens += quantidade
+
+    def adicionar(self, cod_prod, quantidade, preco):
+        self.definir(cod_prod, self.quantidade(cod_prod) + quantidade, preco)
+
+    def remover(self, cod_prod):
+        self.definir(cod_prod, 0)
+
+    def itens(self):
+        # Formato de registar_venda: [(CodProd, Quant, PrecoUnitario)]
+        return [(cod, qtd, preco) for cod, (qtd, preco) in self.linhas.items()]
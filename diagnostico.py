@@ -0,0 +1,230 @@
+# ARQUIVO: diagnostico.py
+# Instrumentação do MaquilhagemDB (ligada com --diagnostico ou no ecrã Diagnóstico):
+#   - tempo, nº de chamadas e linhas devolvidas de cada método público;
+#   - tempo de cada instrução SQL, medido pelos callbacks do sqlite3 (trace marca o início de
+#     cada instrução, o progress handler conta os passos da VM que ela custou);
+#   - instruções acima do limite vão para um log rotativo com o SQL, os parâmetros e o plano.
+#
+# Desligada não custa nada: os métodos só são envolvidos e os callbacks só são instalados
+# quando MaquilhagemDB.instrumentar() é chamado.
+import inspect
+import logging
+import logging.handlers
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+
+# Passos da VM entre chamadas do progress handler
+PASSOS = 1000
+# Tempos guardados por método/consulta para os percentis (os mais recentes)
+AMOSTRA = 2048
+# Controlo de transações: mede-se (o COMMIT pode ser o mais lento), mas não tem plano
+SEM_PLANO = ("BEGIN", "COMMIT", "ROLLBACK", "END", "SAVEPOINT", "RELEASE", "PRAGMA", "CREATE", "DROP")
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))] if ordenados else 0.0
+
+
+def normalizar_sql(sql):
+    # O trace dá o SQL já com os valores; para agrupar trocam-se os literais por "?"
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])", "?", sql)
+    return " ".join(sql.split())
+
+
+def contar_linhas(resultado):
+    # fetchall -> nº de linhas; fetchone -> 0 ou 1; relatórios de lote ({id: estado}) -> nº de ids
+    if isinstance(resultado, (list, dict)):
+        return len(resultado)
+    return 1 if isinstance(resultado, tuple) else 0
+
+
+class Contador:
+    __slots__ = ("chamadas", "linhas", "total", "passos", "tempos")
+
+    def __init__(self):
+        self.chamadas = 0
+        self.linhas = 0
+        self.total = 0.0
+        self.passos = 0
+        self.tempos = deque(maxlen=AMOSTRA)
+
+    def registar(self, segundos, linhas=0, passos=0):
+        self.chamadas += 1
+        self.linhas += linhas
+        self.total += segundos
+        self.passos += passos
+        self.tempos.append(segundos)
+
+    def resumo(self, nome):
+        tempos = sorted(self.tempos)
+        return {"nome": nome, "chamadas": self.chamadas, "linhas": self.linhas, "passos": self.passos,
+                "total_ms": self.total * 1000, "p50_ms": percentil(tempos, 0.5) * 1000,
+                "p95_ms": percentil(tempos, 0.95) * 1000, "p99_ms": percentil(tempos, 0.99) * 1000}
+
+
+class Instrumentacao:
+    def __init__(self, limite_lento_ms=200, log_lento="consultas_lentas.log", tamanho_log=1024 * 1024, copias=3):
+        self.limite_lento_ms = limite_lento_ms
+        self.log_lento = log_lento
+        self.metodos = defaultdict(Contador)
+        self.consultas = defaultdict(Contador)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Ligação da thread atual, para o EXPLAIN QUERY PLAN (definida por MaquilhagemDB.instrumentar)
+        self.ligacao = None
+        self._registo = logging.Logger("maquilhagem.lentas")
+        if log_lento:
+            saida = logging.handlers.RotatingFileHandler(log_lento, maxBytes=tamanho_log, backupCount=copias,
+                                                         encoding="utf-8", delay=True)
+            saida.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self._registo.addHandler(saida)
+
+    # Callbacks do sqlite3 (correm na thread da ligação, dentro do sqlite3_step)
+    def ligar(self, conn):
+        conn.set_trace_callback(self._ao_executar)
+        conn.set_progress_handler(self._ao_progredir, PASSOS)
+
+    def desligar(self, conn):
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+
+    def _ao_executar(self, sql):
+        local = self._local
+        # Só dentro de um método medido: uma instrução solta (versao_dados, por exemplo) ficaria aberta
+        # até à seguinte e o tempo parado contava como consulta lenta do método que viesse depois
+        if not getattr(local, "nivel", 0):
+            return
+        atual = getattr(local, "atual", None)
+        # Instruções de triggers ("-- ..." ou o SQL do pai repetido), leituras internas do FTS5
+        # e os nossos próprios EXPLAIN fazem parte da instrução em curso
+        if getattr(local, "a_explicar", False) or sql.startswith("--") or "'main'." in sql \
+                or (atual and atual[0] == sql):
+            return
+        agora = time.perf_counter()
+        self._fechar_instrucao(local, agora)
+        local.atual = [sql, agora, 0]
+
+    def _ao_progredir(self):
+        atual = getattr(self._local, "atual", None)
+        if atual:
+            atual[2] += 1
+
+    def _fechar_instrucao(self, local, agora):
+        # A instrução em curso acaba quando começa a seguinte ou quando o método termina
+        atual = getattr(local, "atual", None)
+        if not atual:
+            return
+        local.atual = None
+        sql, inicio, progresso = atual
+        segundos = agora - inicio
+        with self._lock:
+            self.consultas[normalizar_sql(sql)].registar(segundos, passos=progresso * PASSOS)
+        if segundos * 1000 >= self.limite_lento_ms:
+            if not hasattr(local, "lentas"):
+                local.lentas = []
+            local.lentas.append((sql, segundos, progresso * PASSOS, getattr(local, "chamada", None)))
+
+    # Métodos do MaquilhagemDB
+    def envolver(self, nome, metodo):
+        def medido(*args, **kwargs):
+            local = self._local
+            nivel = getattr(local, "nivel", 0)
+            local.nivel = nivel + 1
+            if nivel == 0:
+                local.chamada = (nome, args, kwargs)
+            inicio = time.perf_counter()
+            resultado = None
+            try:
+                resultado = metodo(*args, **kwargs)
+                if inspect.isgenerator(resultado):
+                    # exportar_linhas_encomendas: conta até o gerador acabar
+                    return self._medir_gerador(nome, resultado, inicio)
+                return resultado
+            finally:
+                local.nivel = nivel
+                if not inspect.isgenerator(resultado):
+                    self._terminar(local, nome, inicio, contar_linhas(resultado), nivel)
+        medido.__name__ = nome
+        medido.__wrapped__ = metodo
+        return medido
+
+    def _medir_gerador(self, nome, gerador, inicio):
+        local = self._local
+        linhas = 0
+        try:
+            while True:
+                # O SQL do gerador corre dentro de next(): conta como parte do método
+                local.nivel = getattr(local, "nivel", 0) + 1
+                try:
+                    linha = next(gerador)
+                except StopIteration:
+                    break
+                finally:
+                    local.nivel -= 1
+                linhas += 1
+                yield linha
+        finally:
+            self._terminar(local, nome, inicio, linhas, getattr(local, "nivel", 0))
+
+    def _terminar(self, local, nome, inicio, linhas, nivel):
+        agora = time.perf_counter()
+        with self._lock:
+            self.metodos[nome].registar(agora - inicio, linhas)
+        if nivel == 0:
+            self._fechar_instrucao(local, agora)
+            lentas = getattr(local, "lentas", None)
+            if lentas:
+                local.lentas = []
+                self._escrever_lentas(local, lentas)
+
+    def _escrever_lentas(self, local, lentas):
+        local.a_explicar = True
+        try:
+            for sql, segundos, passos, chamada in lentas:
+                nome, args, kwargs = chamada or ("?", (), {})
+                parametros = ", ".join([repr(a)[:80] for a in args] + [f"{k}={v!r}"[:80] for k, v in kwargs.items()])
+                linhas = [f"{segundos * 1000:.1f} ms | ~{passos} passos VM | {nome}({parametros})",
+                          f"  SQL: {' '.join(sql.split())}"]
+                linhas += [f"  PLANO: {d}" for d in self.plano(sql)]
+                self._registo.warning("\n".join(linhas))
+        finally:
+            local.a_explicar = False
+
+    def plano(self, sql):
+        if sql.split(None, 1)[0].upper() in SEM_PLANO or self.ligacao is None:
+            return []
+        try:
+            return [detalhe for _, _, _, detalhe in self.ligacao().execute("EXPLAIN QUERY PLAN " + sql)]
+        except sqlite3.Error as e:
+            return [f"(sem plano: {e})"]
+
+    # Leitura (ecrã Diagnóstico, relatório da linha de comandos)
+    def top_metodos(self, n=30):
+        with self._lock:
+            resumos = [c.resumo(nome) for nome, c in self.metodos.items()]
+        return sorted(resumos, key=lambda r: r["total_ms"], reverse=True)[:n]
+
+    def top_consultas(self, n=30):
+        with self._lock:
+            resumos = [c.resumo(sql) for sql, c in self.consultas.items()]
+        return sorted(resumos, key=lambda r: r["total_ms"], reverse=True)[:n]
+
+    def limpar(self):
+        with self._lock:
+            self.metodos.clear()
+            self.consultas.clear()
+
+    def relatorio(self, n=15):
+        linhas = [f"{'método':<36}{'chamadas':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'total ms':>11}{'linhas':>10}"]
+        for r in self.top_metodos(n):
+            linhas.append(f"{r['nome']:<36}{r['chamadas']:>9}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                          f"{r['p99_ms']:>10.2f}{r['total_ms']:>11.1f}{r['linhas']:>10}")
+        linhas.append("")
+        linhas.append(f"{'SQL':<70}{'chamadas':>9}{'p95 ms':>10}{'total ms':>11}")
+        for r in self.top_consultas(n):
+            linhas.append(f"{r['nome'][:68]:<70}{r['chamadas']:>9}{r['p95_ms']:>10.2f}{r['total_ms']:>11.1f}")
+        return "\n".join(linhas)
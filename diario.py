@@ -0,0 +1,177 @@
+# ARQUIVO: diario.py
+# Modo offline do POS: cada venda fechada no posto vai primeiro para um diário local (um
+# ficheiro SQLite só deste posto, com synchronous=FULL, ou seja fsync em cada venda) e o
+# caixa fica logo livre. Uma thread de sincronização envia as vendas pendentes para a BD
+# central em lotes (escrever_lote: uma transação, ou um pedido HTTP com --servidor).
+#
+# Cada venda leva um IdVenda gerado aqui: reenviar um lote que já tinha sido gravado (a
+# ligação caiu antes da resposta) devolve as mesmas encomendas em vez de as duplicar.
+# Vendas sem stock na BD central ou recusadas (cliente apagado, ...) ficam para revisão.
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+PENDENTE = "pendente"
+SINCRONIZADA = "sincronizada"
+CONFLITO = "conflito"  # stock insuficiente na BD central
+ERRO = "erro"  # recusada pela BD central por outro motivo
+DESCARTADA = "descartada"
+POR_REVER = (CONFLITO, ERRO)
+
+
+class DiarioVendas:
+    def __init__(self, caminho="vendas_pendentes.db"):
+        self.caminho = caminho
+        # Uma ligação partilhada pela thread do Tk e pela de sincronização
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS Vendas (
+                                Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                IdVenda TEXT NOT NULL UNIQUE,
+                                Criada TEXT NOT NULL,
+                                DataEnc TEXT NOT NULL,
+                                CodCli INTEGER NOT NULL,
+                                CodFunc INTEGER NOT NULL,
+                                Itens TEXT NOT NULL,
+                                Total REAL NOT NULL,
+                                Estado TEXT NOT NULL DEFAULT 'pendente',
+                                NEnc INTEGER,
+                                Detalhe TEXT,
+                                Tentativas INTEGER NOT NULL DEFAULT 0)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_vendas_estado ON Vendas (Estado, Seq)")
+
+    def acrescentar(self, data, cod_cli, itens, cod_func):
+        # Grava a venda (com fsync) e devolve o IdVenda; os dados da venda nunca mais mudam
+        id_venda = uuid.uuid4().hex
+        itens = [(int(cod), int(q), float(preco)) for cod, q, preco in itens]
+        with self._lock:
+            self._conn.execute("INSERT INTO Vendas (IdVenda, Criada, DataEnc, CodCli, CodFunc, Itens, Total) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (id_venda, datetime.now().isoformat(timespec="seconds"), data, cod_cli, cod_func,
+                                json.dumps(itens), sum(q * p for _, q, p in itens)))
+        return id_venda
+
+    def pendentes(self, n=50, cod_func=None):
+        # [(IdVenda, DataEnc, CodCli, itens, CodFunc), ...] pela ordem em que foram feitas;
+        # com cod_func só as vendas desse funcionário
+        with self._lock:
+            linhas = self._conn.execute("SELECT IdVenda, DataEnc, CodCli, Itens, CodFunc FROM Vendas "
+                                        "WHERE Estado=? AND (? IS NULL OR CodFunc=?) ORDER BY Seq LIMIT ?",
+                                        (PENDENTE, cod_func, cod_func, n)).fetchall()
+        return [(id_venda, data, cli, [tuple(i) for i in json.loads(itens)], func)
+                for id_venda, data, cli, itens, func in linhas]
+
+    def marcar(self, estados):
+        # estados: [(IdVenda, estado, NEnc, detalhe), ...] numa só transação
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE Vendas SET Estado=?, NEnc=?, Detalhe=?, Tentativas=Tentativas + 1 "
+                                   "WHERE IdVenda=?", [(e, nenc, d, i) for i, e, nenc, d in estados])
+
+    def contagens(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT Estado, COUNT(*) FROM Vendas GROUP BY Estado").fetchall())
+
+    def por_rever(self):
+        # Fila de revisão: IdVenda, Criada, DataEnc, CodCli, CodFunc, Total, Estado, Detalhe
+        with self._lock:
+            return self._conn.execute(f"""SELECT IdVenda, Criada, DataEnc, CodCli, CodFunc, Total, Estado, Detalhe
+                                          FROM Vendas WHERE Estado IN ({', '.join('?' * len(POR_REVER))})
+                                          ORDER BY Seq""", POR_REVER).fetchall()
+
+    def repetir(self, ids):
+        # Volta a pôr na fila (depois de repor o stock, por exemplo)
+        self._mudar_revistas(ids, PENDENTE)
+
+    def descartar(self, ids):
+        self._mudar_revistas(ids, DESCARTADA)
+
+    def _mudar_revistas(self, ids, estado):
+        with self._lock:
+            self._conn.executemany(f"UPDATE Vendas SET Estado=? WHERE IdVenda=? AND Estado IN ('{CONFLITO}', '{ERRO}')",
+                                   [(estado, i) for i in ids])
+
+    def limpar(self, dias=30):
+        # As vendas já gravadas na BD central só servem de histórico
+        with self._lock:
+            return self._conn.execute("DELETE FROM Vendas WHERE Estado IN (?, ?) AND Criada < datetime('now', 'localtime', ?)",
+                                      (SINCRONIZADA, DESCARTADA, f"-{int(dias)} days")).rowcount
+
+    def fechar(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Sincronizador:
+    # Thread que esvazia o diário para a BD central (MaquilhagemDB ou ClienteBD).
+    # Sem ligação, espera cada vez mais (até espera_max) e tenta de novo; acordar() antecipa.
+    # cod_func: só envia as vendas desse funcionário (o servidor recusa vendas em nome de outro);
+    # as dos outros ficam no diário até eles entrarem no posto. None (Admin) envia todas.
+    def __init__(self, diario, db, lote=50, intervalo=5.0, espera_max=60.0, cod_func=None):
+        self.diario = diario
+        self.db = db
+        self.cod_func = cod_func
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+        # Último erro de ligação (None quando a última tentativa correu bem)
+        self.erro = None
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._correr, name="SincronizadorVendas", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def acordar(self):
+        self._acordar.set()
+
+    def parar(self, espera=5.0):
+        self._parar.set()
+        self._acordar.set()
+        self._thread.join(espera)
+
+    def _correr(self):
+        espera = 0
+        self.diario.limpar()
+        while not self._parar.is_set():
+            self._acordar.wait(espera)
+            self._acordar.clear()
+            if self._parar.is_set():
+                return
+            try:
+                while self.sincronizar() == self.lote and not self._parar.is_set():
+                    pass
+                self.erro = None
+                espera = self.intervalo
+            except Exception as e:
+                self.erro = e
+                espera = min(self.espera_max, max(self.intervalo, espera * 2))
+
+    def sincronizar(self):
+        # Envia um lote; devolve quantas vendas foram tratadas. Erros de ligação e BD ocupada
+        # sobem (o lote fica pendente e é repetido); as recusas vão para a fila de revisão.
+        vendas = self.diario.pendentes(self.lote, self.cod_func)
+        if not vendas:
+            return 0
+        chamadas = [("registar_venda", (data, cli, itens, func), {"id_venda": id_venda})
+                    for id_venda, data, cli, itens, func in vendas]
+        estados = []
+        temporario = None
+        for (id_venda, *_), (resultado, erro) in zip(vendas, self.db.escrever_lote(chamadas)):
+            if isinstance(erro, sqlite3.OperationalError):
+                temporario = erro
+            elif erro is not None:
+                estados.append((id_venda, ERRO, None, f"{type(erro).__name__}: {erro}"))
+            elif resultado["ok"]:
+                estados.append((id_venda, SINCRONIZADA, resultado["nenc"], None))
+            else:
+                estados.append((id_venda, CONFLITO, None, json.dumps(resultado["em_falta"])))
+        self.diario.marcar(estados)
+        if temporario is not None:
+            raise temporario
+        return len(vendas)
@@ -0,0 +1,65 @@
+# ARQUIVO: exportacao.py
+# Exportação das linhas de encomenda para a contabilidade (CSV ou JSON Lines, opcionalmente gzip).
+#
+#   python gestao_de_maquilhagem.py exportar vendas_2025_03.csv.gz --de 2025-03-01 --ate 2025-03-31
+#   python gestao_de_maquilhagem.py exportar novas.jsonl --estado exportacao.json   (só o que é novo)
+#
+# As linhas vêm da BD aos poucos e são escritas logo, por isso a memória usada não depende
+# do número de linhas exportadas.
+import csv
+import gzip
+import json
+import os
+
+COLUNAS = ["NEnc", "Data", "CodCli", "Cliente", "CodFunc", "Vendedor", "NItem", "CodProd",
+           "Produto", "Categoria", "Marca", "Quantidade", "PrecoUnitario", "Subtotal"]
+
+
+def formato_de(caminho):
+    # "vendas.jsonl.gz" -> ("jsonl", True)
+    comprimido = caminho.endswith(".gz")
+    base = caminho[:-3] if comprimido else caminho
+    return ("jsonl" if base.endswith((".jsonl", ".json")) else "csv"), comprimido
+
+
+def ler_estado(caminho):
+    # Última NEnc exportada numa exportação incremental anterior
+    if not caminho or not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f).get("ultima_nenc")
+
+
+def gravar_estado(caminho, ultima_nenc):
+    # Escreve num ficheiro temporário e troca, para nunca ficar um estado a meio
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump({"ultima_nenc": ultima_nenc}, f)
+    os.replace(temporario, caminho)
+
+
+def exportar_encomendas(db, caminho, formato=None, comprimir=None, data_ini=None, data_fim=None,
+                        cod_func=None, apos_nenc=None, progresso=None, a_cada=10000):
+    # Devolve {"linhas", "ultima_nenc"}; progresso(n_linhas) é chamado a cada `a_cada` linhas
+    formato_ficheiro, comprimido_ficheiro = formato_de(caminho)
+    formato = formato or formato_ficheiro
+    comprimir = comprimido_ficheiro if comprimir is None else comprimir
+    abrir = gzip.open if comprimir else open
+
+    n = 0
+    ultima_nenc = apos_nenc
+    linhas = db.exportar_linhas_encomendas(data_ini, data_fim, cod_func, apos_nenc)
+    with abrir(caminho, "wt", newline="", encoding="utf-8") as f:
+        if formato == "csv":
+            escritor = csv.writer(f)
+            escritor.writerow(COLUNAS)
+        for linha in linhas:
+            if formato == "csv":
+                escritor.writerow(linha)
+            else:
+                f.write(json.dumps(dict(zip(COLUNAS, linha)), ensure_ascii=False) + "\n")
+            n += 1
+            ultima_nenc = linha[0]
+            if progresso and n % a_cada == 0:
+                progresso(n)
+    return {"linhas": n, "ultima_nenc": ultima_nenc}
@@ -0,0 +1,126 @@
+# ARQUIVO: gerar_dados.py
+# Gerador de dados sintéticos (sempre os mesmos para a mesma semente e tamanhos):
+# clientes, produtos das categorias do ProdutoPopup, funcionários e anos de encomendas.
+#
+#   python gerar_dados.py loja.db --clientes 10000 --produtos 2000 --encomendas 1000000 --anos 3
+#   python gestao_de_maquilhagem.py --db loja.db
+#
+# Tudo passa pela API do MaquilhagemDB (importar_*, adicionar_funcionario, registar_venda), por
+# isso stock, totais e agregados dos relatórios ficam como ficariam com vendas reais.
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+
+from gestao_de_maquilhagem import MaquilhagemDB
+from benchmark_pesquisa import NOMES, APELIDOS
+from popups import CATEGORIAS_PADRAO
+
+MARCAS = ["Lumière", "Rosa Brava", "Atlântica", "Bella Vita", "Nácar", "Orquídea", "Pétala", "Sardinha Chic",
+          "Alfama Beauty", "Douro Glow", "Maré", "Vitória"]
+ACABAMENTOS = ["Matte", "Acetinado", "Glow", "Cremoso", "Líquido", "Compacto", "Longa Duração", "Natural"]
+TONS = ["Nude", "Rosa", "Coral", "Bordeaux", "Bege Claro", "Bege Médio", "Caramelo", "Cacau", "Preto",
+        "Castanho", "Dourado", "Pérola", "Transparente", "Ameixa", "Pêssego"]
+# Linhas por encomenda (1 a 8) e unidades por linha, com os pesos de um talão típico
+PESOS_LINHAS = list(accumulate([35, 25, 15, 10, 6, 4, 3, 2]))
+PESOS_QUANT = list(accumulate([70, 20, 7, 3]))
+LOTE = 1000
+
+
+def codigo_ean(n):
+    # EAN-13 com o prefixo de Portugal (560) e dígito de controlo
+    base = f"560{n:09d}"
+    soma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(base))
+    return base + str((10 - soma % 10) % 10)
+
+
+def gerar(db, semente=42, clientes=1000, produtos=200, funcionarios=5, encomendas=10000, anos=3,
+          ate="2025-12-31", progresso=None):
+    # Devolve o número de linhas criadas por tabela; progresso(feitas, total) a cada lote de encomendas
+    rnd = random.Random(semente)
+
+    linhas = [(f"{rnd.choice(NOMES)} {rnd.choice(APELIDOS)} {rnd.choice(APELIDOS)}",
+               f"9{rnd.randint(10000000, 99999999)}", f"cliente{i}@exemplo.pt") for i in range(clientes)]
+    for i in range(0, len(linhas), LOTE):
+        db.importar_clientes(linhas[i:i + LOTE])
+
+    # Popularidade desigual (alguns produtos vendem muito mais) e stock que chega para as vendas
+    popularidade = [rnd.paretovariate(1.2) for _ in range(produtos)]
+    soma = sum(popularidade)
+    unidades = encomendas * 2.4 * 1.45
+    catalogo = []
+    for i in range(produtos):
+        categoria = CATEGORIAS_PADRAO[i % len(CATEGORIAS_PADRAO)]
+        nome = f"{categoria} {rnd.choice(ACABAMENTOS)} {rnd.choice(TONS)} {i + 1}"
+        preco = round(rnd.uniform(3, 60), 2)
+        stock = int(popularidade[i] / soma * unidades * 2) + rnd.randint(5, 200)
+        catalogo.append((nome, categoria, rnd.choice(MARCAS), preco, stock, codigo_ean(i + 1)))
+    for i in range(0, len(catalogo), LOTE):
+        db.importar_produtos(catalogo[i:i + LOTE])
+
+    existentes = {r[0] for r in db.connect().execute("SELECT Username FROM Funcionarios")}
+    for i in range(funcionarios):
+        nome = f"{rnd.choice(NOMES)} {rnd.choice(APELIDOS)}"
+        if f"vendedor{i + 1}" not in existentes:
+            db.adicionar_funcionario(nome, f"vendedor{i + 1}", f"vendedor{i + 1}",
+                                     "Admin" if i == 0 else "Funcionario")
+
+    conn = db.connect()
+    cod_clientes = [r[0] for r in conn.execute("SELECT CodCli FROM Clientes ORDER BY CodCli")]
+    cod_funcs = [r[0] for r in conn.execute("SELECT CodFunc FROM Funcionarios ORDER BY CodFunc")]
+    # CodProd de cada produto do catálogo (a BD pode já ter outros produtos)
+    por_codigo = {codigo: (cod, preco) for cod, codigo, preco in conn.execute(
+        "SELECT CodProd, CodigoBarras, Preco FROM Produtos WHERE CodigoBarras IN (SELECT value FROM json_each(?))",
+        (json.dumps([p[5] for p in catalogo]),))}
+    cod_produtos = [por_codigo[p[5]][0] for p in catalogo]
+    precos = dict(por_codigo.values())
+    pesos_produtos = list(accumulate(popularidade))
+
+    # Datas por ordem crescente de NEnc, como numa loja real
+    fim = date.fromisoformat(ate)
+    dias = max(1, int(anos * 365))
+    inicio = fim - timedelta(days=dias - 1)
+    datas = sorted(rnd.randrange(dias) for _ in range(encomendas))
+    vendas = 0
+    for lote in range(0, encomendas, LOTE):
+        # Um lote de vendas por transação; cada venda é um SAVEPOINT dentro dela
+        with db.transacao(imediata=True):
+            for d in datas[lote:lote + LOTE]:
+                n_linhas = rnd.choices(range(1, 9), cum_weights=PESOS_LINHAS)[0]
+                escolhidos = set(rnd.choices(cod_produtos, cum_weights=pesos_produtos, k=n_linhas))
+                itens = [(p, rnd.choices(range(1, 5), cum_weights=PESOS_QUANT)[0], precos[p]) for p in escolhidos]
+                if db.registar_venda((inicio + timedelta(days=d)).isoformat(), rnd.choice(cod_clientes),
+                                     itens, rnd.choice(cod_funcs))["ok"]:
+                    vendas += 1
+        if progresso:
+            progresso(min(lote + LOTE, encomendas), encomendas)
+    return {"clientes": clientes, "produtos": produtos, "funcionarios": funcionarios, "encomendas": vendas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos para o MaquilhagemDB")
+    parser.add_argument("db", help="Ficheiro da base de dados (criado se não existir)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--clientes", type=int, default=1000)
+    parser.add_argument("--produtos", type=int, default=200)
+    parser.add_argument("--funcionarios", type=int, default=5)
+    parser.add_argument("--encomendas", type=int, default=10000)
+    parser.add_argument("--anos", type=float, default=3, help="Anos de vendas, a terminar em --ate")
+    parser.add_argument("--ate", default="2025-12-31", help="Data da última encomenda (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    db = MaquilhagemDB(args.db)
+    t0 = time.perf_counter()
+    try:
+        r = gerar(db, args.semente, args.clientes, args.produtos, args.funcionarios, args.encomendas, args.anos,
+                  args.ate, progresso=lambda n, total: print(f"\r{n}/{total} encomendas...", end="", flush=True))
+    finally:
+        db.fechar()
+    print(f"\n{r['clientes']} clientes, {r['produtos']} produtos, {r['funcionarios']} funcionários e "
+          f"{r['encomendas']} encomendas em {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
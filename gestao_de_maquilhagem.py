@@ -1,14 +1,27 @@
+import time
+INICIO_PROCESSO = time.perf_counter()  # antes dos restantes imports, para o --startup-profile
 import sqlite3
 import tkinter as tk
-from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
-import matplotlib.pyplot as plt
+from tkinter import ttk, messagebox, filedialog, simpledialog
 from collections import defaultdict
 from datetime import datetime
 import functools  # Importante para os botões funcionarem
+import threading
+import random
+import argparse
+from contextlib import contextmanager
 import re
 import hashlib
+import json
 from popups import FuncionarioPopup, ClientePopup, EncomendaPopup, ProdutoPopup
+from pesquisa import InstantaneoPesquisa
+from importacao import importar_csv
+from exportacao import exportar_encomendas, ler_estado, gravar_estado
+from tarefas import TrabalhadorBD
+from icones import carregar_icone
+from graficos import GraficoVendas, SeriesVendas, PERIODOS, intervalo_periodo, montar_series
+from diario import DiarioVendas, Sincronizador, PENDENTE, POR_REVER, CONFLITO
+from migracoes import aplicar_migracoes, relatorio_planos, SQL_RECALCULAR_TOTAIS, SQL_RECONSTRUIR_AGREGADOS, SQL_STOCK_LIVRO
 
 # ------------------- CONFIGURAÇÕES -------------------
 PRIMARY_COLOR = "#5D1B8B"
@@ -19,137 +32,392 @@ BG_COLOR = "#E6D9E0"
 CARD_COLOR = "#FFFFFF"
 BUTTON_HOVER = "#7A3E80"
 ACCENT_COLOR = "#2C1F8C"
+# Espera depois da última tecla antes de pesquisar (ms)
+ATRASO_PESQUISA_MS = 150
+# Separadores do ecrã Relatórios; os que não são o Resumo vêm de analise.RELATORIOS
+SEPARADORES_RELATORIOS = ("Resumo", "Top produtos", "Top categorias", "ABC", "Receita 7/30 dias", "Cesto",
+                          "Funcionários")
 #base
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
+def bd_ocupada(erro) -> bool:
+    # SQLITE_BUSY / SQLITE_LOCKED: outro terminal tem o lock de escrita
+    msg = str(erro).lower()
+    return "locked" in msg or "busy" in msg
+
+class StockInsuficiente(ValueError):
+    # Venda recusada; em_falta = [(CodProd, pedido, disponível), ...] com todas as linhas sem stock
+    def __init__(self, em_falta):
+        self.em_falta = em_falta
+        detalhe = "; ".join(f"produto ID {cod}: pedido {q}, disponível {disp}" for cod, q, disp in em_falta)
+        super().__init__(f"Stock insuficiente. {detalhe}")
+
+def consulta_fts(termo: str) -> str:
+    # Texto da caixa de pesquisa -> consulta FTS5: todas as palavras, por prefixo.
+    # 'Pó Rím' -> '"Pó"* "Rím"*' (os acentos são ignorados pelo tokenizer)
+    return " ".join(f'"{p}"*' for p in re.findall(r"\w+", termo))
+
 class MaquilhagemDB:
-    def __init__(self, db_name="maquilhagem.db"):
+    # Tamanho da cache de instruções preparadas de cada ligação
+    CACHE_INSTRUCOES = 256
+    # Linhas por página nas consultas paginadas (consultar_*_pagina)
+    TAMANHO_PAGINA = 200
+    # Modo multi-terminal: tentativas de BEGIN IMMEDIATE e espera entre elas (segundos)
+    MAX_TENTATIVAS = 8
+    ESPERA_BASE = 0.02
+    ESPERA_MAX = 1.0
+    # Limite do ficheiro -wal depois de cada checkpoint (bytes)
+    LIMITE_WAL = 16 * 1024 * 1024
+    # Métodos de ligação/transação: não são consultas e ficam fora da instrumentação
+    NAO_INSTRUMENTADOS = {"connect", "configurar_ligacao", "transacao", "versao_dados", "fechar", "init_db",
+                          "instrumentar", "desinstrumentar"}
+
+    def __init__(self, db_name="maquilhagem.db", multi_terminal=False, busy_timeout=5.0, checkpoint_cada=500,
+                 instrumentacao=None):
         self.db_name = db_name
+        # Modo multi-terminal (opcional): WAL, busy timeout e escritas com BEGIN IMMEDIATE
+        self.multi_terminal = multi_terminal
+        self.busy_timeout = busy_timeout
+        self.checkpoint_cada = checkpoint_cada
+        self._escritas = 0
+        # Conta os commits deste processo (ver versao_dados)
+        self._versao_escritas = 0
+        # Uma ligação persistente por thread, aberta na primeira utilização
+        self._local = threading.local()
+        self._ligacoes = []
+        self._geracao = 0
+        self._lock = threading.Lock()
+        # Instrumentação (diagnostico.py), desligada por omissão
+        self.instrumentacao = None
+        self._instrumentados = []
         self.init_db()
+        if instrumentacao:
+            self.instrumentar(instrumentacao)
 
     def connect(self):
-        conn = sqlite3.connect(self.db_name)
-        conn.execute("PRAGMA foreign_keys = ON")
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.geracao != self._geracao:
+            # isolation_level=None: as transações são abertas explicitamente em transacao()
+            conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=self.CACHE_INSTRUCOES)
+            self.configurar_ligacao(conn)
+            with self._lock:
+                self._ligacoes.append(conn)
+                self._local.conn = conn
+                self._local.geracao = self._geracao
         return conn
 
-    def init_db(self):
+    def configurar_ligacao(self, conn):
+        # PRAGMAs aplicados uma única vez por ligação
+        conn.execute("PRAGMA foreign_keys = ON")
+        if self.multi_terminal:
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+            # Em WAL, NORMAL continua seguro contra corrupção e poupa um fsync por commit
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA journal_size_limit = {self.LIMITE_WAL}")
+        # Tabelas temporárias (só desta ligação) por onde passam os lotes da importação
+        conn.execute("""CREATE TEMP TABLE IF NOT EXISTS ImportarProdutos (
+                            Produto TEXT, Categoria TEXT, Marca TEXT, Preco REAL, Quantidade INTEGER,
+                            CodigoBarras TEXT)""")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ImportarClientes (NomeCli TEXT, Telefone TEXT, Email TEXT)")
+        if self.instrumentacao:
+            self.instrumentacao.ligar(conn)
+
+    def instrumentar(self, instrumentacao):
+        # Envolve os métodos públicos desta instância e liga os callbacks do sqlite3 a todas as ligações
+        self.desinstrumentar()
+        self.instrumentacao = instrumentacao
+        instrumentacao.ligacao = self.connect
+        for nome in dir(type(self)):
+            if nome.startswith("_") or nome in self.NAO_INSTRUMENTADOS or not callable(getattr(type(self), nome)):
+                continue
+            setattr(self, nome, instrumentacao.envolver(nome, getattr(self, nome)))
+            self._instrumentados.append(nome)
+        with self._lock:
+            for conn in self._ligacoes:
+                instrumentacao.ligar(conn)
+
+    def desinstrumentar(self):
+        # Volta aos métodos originais, sem custo nenhum
+        if not self.instrumentacao:
+            return
+        for nome in self._instrumentados:
+            delattr(self, nome)
+        self._instrumentados = []
+        with self._lock:
+            for conn in self._ligacoes:
+                self.instrumentacao.desligar(conn)
+        self.instrumentacao = None
+
+    @contextmanager
+    def transacao(self, imediata=False):
+        # Commit no fim do bloco, rollback se houver exceção.
+        # Chamadas encadeadas juntam-se à transação já aberta com um SAVEPOINT,
+        # para um erro só desfazer o bloco interior.
+        # imediata=True reserva o lock de escrita logo no início (BEGIN IMMEDIATE).
         conn = self.connect()
-        c = conn.cursor()
-        c.execute("""CREATE TABLE IF NOT EXISTS Clientes (
-                        CodCli INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        NomeCli TEXT NOT NULL, 
-                        Telefone TEXT, 
-                        Email TEXT)""")
-        c.execute("""CREATE TABLE IF NOT EXISTS Produtos (
-                        CodProd INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        Produto TEXT NOT NULL, 
-                        Categoria TEXT, Marca TEXT, 
-                        Preco REAL NOT NULL, 
-                        Quantidade INTEGER NOT NULL)""")
-        c.execute("""CREATE TABLE IF NOT EXISTS Funcionarios (
-                        CodFunc INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        Nome TEXT NOT NULL, 
-                        Username TEXT UNIQUE NOT NULL, 
-                        Password TEXT NOT NULL, 
-                        Cargo TEXT)""")
-        c.execute("""CREATE TABLE IF NOT EXISTS Encomendas (
-                        NEnc INTEGER PRIMARY KEY AUTOINCREMENT,
-                        DataEnc DATE NOT NULL,
-                        CodCli INTEGER,
-                        CodFunc INTEGER,
-                        FOREIGN KEY (CodCli) REFERENCES Clientes(CodCli) ON DELETE RESTRICT,
-                        FOREIGN KEY (CodFunc) REFERENCES Funcionarios(CodFunc) ON DELETE RESTRICT)""")
-        c.execute("""CREATE TABLE IF NOT EXISTS ItensEncomenda (
-                        NItem INTEGER PRIMARY KEY AUTOINCREMENT,
-                        NEnc INTEGER,
-                        CodProd INTEGER,
-                        Quant INTEGER,
-                        PrecoUnitario REAL,
-                        FOREIGN KEY (NEnc) REFERENCES Encomendas(NEnc) ON DELETE CASCADE,
-                        FOREIGN KEY (CodProd) REFERENCES Produtos(CodProd) ON DELETE RESTRICT)""")
+        if conn.in_transaction:
+            nivel = getattr(self._local, "nivel", 0) + 1
+            self._local.nivel = nivel
+            conn.execute(f"SAVEPOINT sp{nivel}")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f"ROLLBACK TO sp{nivel}")
+                conn.execute(f"RELEASE sp{nivel}")
+                raise
+            finally:
+                self._local.nivel = nivel - 1
+            conn.execute(f"RELEASE sp{nivel}")
+            return
+        self._iniciar_escrita(conn, imediata)
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
         conn.commit()
+        self._versao_escritas += 1
+        if self.multi_terminal:
+            self._checkpoint_periodico(conn)
+
+    def versao_dados(self):
+        # Muda sempre que há escritas: as deste processo (transacao) e as de outras
+        # ligações ou terminais (PRAGMA data_version). Serve para invalidar caches.
+        return self._versao_escritas, self.connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def _iniciar_escrita(self, conn, imediata=False):
+        if not self.multi_terminal:
+            conn.execute("BEGIN IMMEDIATE" if imediata else "BEGIN")
+            return
+        # BEGIN IMMEDIATE reserva já o lock de escrita: se a BD estiver ocupada falha aqui,
+        # antes de executar qualquer instrução, e pode ser repetido em segurança.
+        for tentativa in range(self.MAX_TENTATIVAS):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if not bd_ocupada(e) or tentativa == self.MAX_TENTATIVAS - 1:
+                    raise
+                espera = min(self.ESPERA_MAX, self.ESPERA_BASE * 2 ** tentativa)
+                time.sleep(espera * random.uniform(0.5, 1.0))
+
+    def _checkpoint_periodico(self, conn):
+        # Sem checkpoints regulares o ficheiro -wal cresce sem limite quando há sempre leitores
+        with self._lock:
+            self._escritas += 1
+            if self._escritas < self.checkpoint_cada:
+                return
+            self._escritas = 0
+        try:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        except sqlite3.OperationalError:
+            pass  # Fica para o próximo
+
+    def fechar(self):
+        # Fecha todas as ligações (logout / saída). Reabrem-se sozinhas se forem precisas.
+        with self._lock:
+            ligacoes, self._ligacoes = self._ligacoes, []
+            self._geracao += 1
+        for conn in ligacoes:
+            try:
+                if self.multi_terminal:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            except sqlite3.Error:
+                pass
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
 
-        # Utilizador inicial (admin)
-        c.execute("SELECT COUNT(*) FROM Funcionarios")
-        if c.fetchone()[0] == 0:
-            c.execute("INSERT INTO Funcionarios (Nome, Username, Password, Cargo) VALUES (?, ?, ?, ?)",
-                      ("Administrador", "admin", hash_password("admin123"), "Admin"))
-            conn.commit()
-        conn.close()
+    def init_db(self):
+        if self.multi_terminal:
+            # O modo WAL fica gravado no ficheiro: leitores deixam de bloquear escritores
+            self.connect().execute("PRAGMA journal_mode = WAL").fetchone()
+        with self.transacao() as conn:
+            c = conn.cursor()
+            c.execute("""CREATE TABLE IF NOT EXISTS Clientes (
+                            CodCli INTEGER PRIMARY KEY AUTOINCREMENT, 
+                            NomeCli TEXT NOT NULL, 
+                            Telefone TEXT, 
+                            Email TEXT)""")
+            c.execute("""CREATE TABLE IF NOT EXISTS Produtos (
+                            CodProd INTEGER PRIMARY KEY AUTOINCREMENT, 
+                            Produto TEXT NOT NULL, 
+                            Categoria TEXT, Marca TEXT, 
+                            Preco REAL NOT NULL, 
+                            Quantidade INTEGER NOT NULL)""")
+            c.execute("""CREATE TABLE IF NOT EXISTS Funcionarios (
+                            CodFunc INTEGER PRIMARY KEY AUTOINCREMENT, 
+                            Nome TEXT NOT NULL, 
+                            Username TEXT UNIQUE NOT NULL, 
+                            Password TEXT NOT NULL, 
+                            Cargo TEXT)""")
+            c.execute("""CREATE TABLE IF NOT EXISTS Encomendas (
+                            NEnc INTEGER PRIMARY KEY AUTOINCREMENT,
+                            DataEnc DATE NOT NULL,
+                            CodCli INTEGER,
+                            CodFunc INTEGER,
+                            FOREIGN KEY (CodCli) REFERENCES Clientes(CodCli) ON DELETE RESTRICT,
+                            FOREIGN KEY (CodFunc) REFERENCES Funcionarios(CodFunc) ON DELETE RESTRICT)""")
+            c.execute("""CREATE TABLE IF NOT EXISTS ItensEncomenda (
+                            NItem INTEGER PRIMARY KEY AUTOINCREMENT,
+                            NEnc INTEGER,
+                            CodProd INTEGER,
+                            Quant INTEGER,
+                            PrecoUnitario REAL,
+                            FOREIGN KEY (NEnc) REFERENCES Encomendas(NEnc) ON DELETE CASCADE,
+                            FOREIGN KEY (CodProd) REFERENCES Produtos(CodProd) ON DELETE RESTRICT)""")
+
+            # Utilizador inicial (admin)
+            c.execute("SELECT COUNT(*) FROM Funcionarios")
+            if c.fetchone()[0] == 0:
+                c.execute("INSERT INTO Funcionarios (Nome, Username, Password, Cargo) VALUES (?, ?, ?, ?)",
+                          ("Administrador", "admin", hash_password("admin123"), "Admin"))
+
+        # Índices e restantes alterações do esquema (ver migracoes.py)
+        aplicar_migracoes(self)
 
     # Métodos
     def efetuar_login(self, username, password):
-        conn = self.connect()
-        c = conn.cursor()
-        c.execute("SELECT CodFunc, Nome, Cargo, Password FROM Funcionarios WHERE Username=?", (username,))
-        row = c.fetchone()
-        conn.close()
+        row = self.connect().execute("SELECT CodFunc, Nome, Cargo, Password FROM Funcionarios WHERE Username=?",
+                                     (username,)).fetchone()
         if row and row[3] == hash_password(password):
             return {"id": row[0], "nome": row[1], "cargo": row[2], "username": username}
         return None
 
     # Clientes
     def consultar_clientes(self):
-        with self.connect() as conn:
-            return conn.execute("SELECT * FROM Clientes").fetchall()
+        return self.connect().execute("SELECT * FROM Clientes").fetchall()
+    def consultar_clientes_pagina(self, apos=None, tamanho=None):
+        # Paginação por chave: a página seguinte começa depois do último CodCli recebido
+        return self.connect().execute("SELECT * FROM Clientes WHERE CodCli > ? ORDER BY CodCli LIMIT ?",
+                                      (apos or 0, tamanho or self.TAMANHO_PAGINA)).fetchall()
     def adicionar_cliente(self, nome, telefone, email):
-        with self.connect() as conn:
+        with self.transacao() as conn:
             conn.execute("INSERT INTO Clientes (NomeCli, Telefone, Email) VALUES (?, ?, ?)",
                          (nome, telefone, email))
     def atualizar_cliente(self, cod, nome, telefone, email):
-        with self.connect() as conn:
+        with self.transacao() as conn:
             conn.execute("UPDATE Clientes SET NomeCli=?, Telefone=?, Email=? WHERE CodCli=?",
                          (nome, telefone, email, cod))
     def excluir_cliente(self, cod):
-        with self.connect() as conn:
+        with self.transacao() as conn:
             conn.execute("DELETE FROM Clientes WHERE CodCli=?", (cod,))
 
     # Produtos
     def consultar_produtos(self):
-        with self.connect() as conn:
-            return conn.execute("SELECT * FROM Produtos").fetchall()
+        return self.connect().execute("SELECT * FROM Produtos").fetchall()
+    def consultar_produtos_pagina(self, apos=None, tamanho=None):
+        return self.connect().execute("SELECT * FROM Produtos WHERE CodProd > ? ORDER BY CodProd LIMIT ?",
+                                      (apos or 0, tamanho or self.TAMANHO_PAGINA)).fetchall()
     def obter_produto_por_id(self, cod_prod):
-        with self.connect() as conn:
-            return conn.execute("SELECT CodProd, Produto, Preco, Quantidade FROM Produtos WHERE CodProd=?",
-                                (cod_prod,)).fetchone()
-    def adicionar_produto(self, produto, categoria, marca, preco, quantidade):
-        with self.connect() as conn:
-            conn.execute("INSERT INTO Produtos (Produto, Categoria, Marca, Preco, Quantidade) VALUES (?, ?, ?, ?, ?)",
-                         (produto, categoria, marca, float(preco), int(quantidade)))
-    def atualizar_produto(self, cod, produto, categoria, marca, preco, quantidade):
-        with self.connect() as conn:
-            conn.execute("UPDATE Produtos SET Produto=?, Categoria=?, Marca=?, Preco=?, Quantidade=? WHERE CodProd=?",
-                         (produto, categoria, marca, float(preco), int(quantidade), cod))
-
-        # Na classe Database
+        return self.connect().execute("SELECT CodProd, Produto, Preco, Quantidade FROM Produtos WHERE CodProd=?",
+                                      (cod_prod,)).fetchone()
+    def obter_produto_por_codigo(self, codigo):
+        # Leitor de código de barras do POS (índice único idx_produtos_codbarras)
+        return self.connect().execute("SELECT * FROM Produtos WHERE CodigoBarras=?", (codigo,)).fetchone()
+    def codigos_em_uso(self, codigos):
+        # {código: (Produto, Marca)} dos códigos que já pertencem a algum produto
+        return {c: (nome, marca) for c, nome, marca in self.connect().execute(
+            "SELECT CodigoBarras, Produto, Marca FROM Produtos WHERE CodigoBarras IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(codigos)),))}
+    def adicionar_produto(self, produto, categoria, marca, preco, quantidade, codigo_barras=None):
+        with self.transacao() as conn:
+            cod = conn.execute("""INSERT INTO Produtos (Produto, Categoria, Marca, Preco, Quantidade, CodigoBarras)
+                                  VALUES (?, ?, ?, ?, ?, ?)""",
+                               (produto, categoria, marca, float(preco), int(quantidade), codigo_barras or None)).lastrowid
+            self._movimentar(conn, [(cod, "entrada", int(quantidade), None, "produto novo")])
+    def atualizar_produto(self, cod, produto, categoria, marca, preco, quantidade, codigo_barras=None,
+                          quantidade_anterior=None):
+        # quantidade_anterior (a que o ecrã mostrava): aplica-se só a diferença, e as vendas feitas
+        # entretanto não se perdem; sem ela a quantidade é substituída. Fica um "ajuste" no livro.
+        with self.transacao(imediata=True) as conn:
+            atual = conn.execute("SELECT Quantidade FROM Produtos WHERE CodProd=?", (cod,)).fetchone()
+            if atual is None:
+                return
+            nova = int(quantidade) if quantidade_anterior is None \
+                else atual[0] + int(quantidade) - int(quantidade_anterior)
+            if nova < 0:
+                # Vendeu-se entretanto mais do que a edição tira: recusa em vez de gravar outro valor
+                raise StockInsuficiente([(cod, int(quantidade_anterior) - int(quantidade), atual[0])])
+            conn.execute("""UPDATE Produtos SET Produto=?, Categoria=?, Marca=?, Preco=?, Quantidade=?, CodigoBarras=?
+                            WHERE CodProd=?""",
+                         (produto, categoria, marca, float(preco), nova, codigo_barras or None, cod))
+            self._movimentar(conn, [(cod, "ajuste", nova - atual[0], None, "edição do produto")])
 
     def excluir_produto(self, cod):
-        conn = sqlite3.connect("maquilhagem.db")
-        cursor = conn.cursor()
         try:
-            cursor.execute("PRAGMA foreign_keys = ON")
-
             # Tenta apagar
-            cursor.execute("DELETE FROM Produtos WHERE CodProd=?", (cod,))
-            conn.commit()
-            conn.close()
+            with self.transacao() as conn:
+                conn.execute("DELETE FROM Produtos WHERE CodProd=?", (cod,))
             return True
         except sqlite3.IntegrityError:
-            # Se der erro (produto já vendido), fecha e retorna False
-            conn.close()
+            # Se der erro (produto já vendido), retorna False
             return False
 
+    # Importação em lote (importacao.py): upsert pela chave natural, um lote por transação.
+    # Devolve (inseridos, atualizados); o lote passa por uma tabela temporária (configurar_ligacao)
+    # para que o UPDATE e o INSERT sejam duas instruções sobre o lote inteiro.
+    def importar_produtos(self, linhas):
+        with self.transacao(imediata=True) as conn:
+            conn.execute("DELETE FROM temp.ImportarProdutos")
+            conn.executemany("INSERT INTO temp.ImportarProdutos VALUES (?, ?, ?, ?, ?, ?)", linhas)
+            # Produto repetido no lote: fica a última linha (um só movimento e um só produto por chave)
+            conn.execute("""DELETE FROM temp.ImportarProdutos AS I WHERE I.rowid NOT IN
+                            (SELECT MAX(rowid) FROM temp.ImportarProdutos I GROUP BY Produto, Marca)""")
+            # Livro de stock: diferenças dos produtos que já existem (antes do UPDATE, que as apaga) e
+            # o stock inicial dos novos (CodProd acima do maior antes do INSERT)
+            conn.execute("""INSERT INTO MovimentosStock (CodProd, Tipo, Delta, Nota)
+                            SELECT P.CodProd, 'ajuste', I.Quantidade - P.Quantidade, 'importação'
+                            FROM temp.ImportarProdutos I
+                            JOIN Produtos P ON P.Produto = I.Produto AND P.Marca IS I.Marca
+                            WHERE I.Quantidade != P.Quantidade""")
+            ultimo = conn.execute("SELECT IFNULL(MAX(CodProd), 0) FROM Produtos").fetchone()[0]
+            # Sem código no ficheiro, o código que o produto já tem fica
+            atualizados = conn.execute("""UPDATE Produtos SET Categoria = I.Categoria, Preco = I.Preco,
+                                                 Quantidade = I.Quantidade,
+                                                 CodigoBarras = IFNULL(I.CodigoBarras, Produtos.CodigoBarras)
+                                          FROM temp.ImportarProdutos I
+                                          WHERE Produtos.Produto = I.Produto AND Produtos.Marca IS I.Marca""").rowcount
+            inseridos = conn.execute("""INSERT INTO Produtos (Produto, Categoria, Marca, Preco, Quantidade,
+                                                          CodigoBarras)
+                                        SELECT Produto, Categoria, Marca, Preco, Quantidade, CodigoBarras
+                                        FROM temp.ImportarProdutos I
+                                        WHERE NOT EXISTS (SELECT 1 FROM Produtos P
+                                                          WHERE P.Produto = I.Produto AND P.Marca IS I.Marca)""").rowcount
+            conn.execute("""INSERT INTO MovimentosStock (CodProd, Tipo, Delta, Nota)
+                            SELECT CodProd, 'entrada', Quantidade, 'importação' FROM Produtos
+                            WHERE CodProd > ? AND Quantidade != 0""", (ultimo,))
+        return inseridos, atualizados
+
+    def importar_clientes(self, linhas):
+        with self.transacao(imediata=True) as conn:
+            conn.execute("DELETE FROM temp.ImportarClientes")
+            conn.executemany("INSERT INTO temp.ImportarClientes VALUES (?, ?, ?)", linhas)
+            atualizados = conn.execute("""UPDATE Clientes SET NomeCli = I.NomeCli, Telefone = I.Telefone
+                                          FROM temp.ImportarClientes I
+                                          WHERE Clientes.Email = I.Email COLLATE NOCASE""").rowcount
+            inseridos = conn.execute("""INSERT INTO Clientes (NomeCli, Telefone, Email)
+                                        SELECT NomeCli, Telefone, Email FROM temp.ImportarClientes I
+                                        WHERE NOT EXISTS (SELECT 1 FROM Clientes C
+                                                          WHERE C.Email = I.Email COLLATE NOCASE)""").rowcount
+        return inseridos, atualizados
+
     # Funcionários
     def consultar_funcionarios(self):
-        with self.connect() as conn:
-            return conn.execute("SELECT CodFunc, Nome, Username, Cargo FROM Funcionarios").fetchall()
+        return self.connect().execute("SELECT CodFunc, Nome, Username, Cargo FROM Funcionarios").fetchall()
+    def consultar_funcionarios_pagina(self, apos=None, tamanho=None):
+        return self.connect().execute("""SELECT CodFunc, Nome, Username, Cargo FROM Funcionarios
+                                         WHERE CodFunc > ? ORDER BY CodFunc LIMIT ?""",
+                                      (apos or 0, tamanho or self.TAMANHO_PAGINA)).fetchall()
     def adicionar_funcionario(self, nome, username, password, cargo):
-        with self.connect() as conn:
+        with self.transacao() as conn:
             conn.execute("INSERT INTO Funcionarios (Nome, Username, Password, Cargo) VALUES (?, ?, ?, ?)",
                          (nome, username, hash_password(password), cargo))
     def atualizar_funcionario(self, cod, nome, username, password, cargo):
-        with self.connect() as conn:
+        with self.transacao() as conn:
             if password:
                 conn.execute("UPDATE Funcionarios SET Nome=?, Username=?, Password=?, Cargo=? WHERE CodFunc=?",
                              (nome, username, hash_password(password), cargo, cod))
@@ -157,110 +425,527 @@ class MaquilhagemDB:
                 conn.execute("UPDATE Funcionarios SET Nome=?, Username=?, Cargo=? WHERE CodFunc=?",
                              (nome, username, cargo, cod))
     def excluir_funcionario(self, cod):
-        with self.connect() as conn:
+        with self.transacao() as conn:
             conn.execute("DELETE FROM Funcionarios WHERE CodFunc=?", (cod,))
 
     # Encomendas
-    def adicionar_encomenda(self, data, cod_cli, itens: list, cod_func):
-        conn = self.connect()
-        c = conn.cursor()
-        c.execute("INSERT INTO Encomendas (DataEnc, CodCli, CodFunc) VALUES (?, ?, ?)",
-                  (data, cod_cli, cod_func))
-        nenc = c.lastrowid
-        for item in itens:
-            cod_prod, quant, preco_unitario = item
-            c.execute("SELECT Quantidade FROM Produtos WHERE CodProd=?", (cod_prod,))
-            stock = c.fetchone()[0]
-            if stock < quant:
-                conn.rollback()
-                conn.close()
-                raise ValueError(f"Stock insuficiente para o produto ID {cod_prod}. Disponível: {stock}")
-            c.execute("INSERT INTO ItensEncomenda (NEnc, CodProd, Quant, PrecoUnitario) VALUES (?, ?, ?, ?)",
-                      (nenc, cod_prod, quant, preco_unitario))
-            c.execute("UPDATE Produtos SET Quantidade = Quantidade - ? WHERE CodProd=?", (quant, cod_prod))
-        conn.commit()
-        conn.close()
+    def registar_venda(self, data, cod_cli, itens: list, cod_func, id_venda=None):
+        # Regista o carrinho inteiro numa só transação BEGIN IMMEDIATE:
+        #   1. baixa o stock de todos os produtos com um UPDATE condicional (Quantidade >= pedido);
+        #   2. se o rowcount não bater certo, desfaz tudo e devolve todas as linhas sem stock;
+        #   3. senão grava o cabeçalho e as linhas (executemany).
+        # Devolve {"ok": bool, "nenc": NEnc ou None, "em_falta": [(CodProd, pedido, disponível), ...]}
+        # id_venda (gerado no posto) torna a chamada repetível: se já foi gravada, devolve a mesma
+        # encomenda com "repetida": True
+        if not itens:
+            # Sem isto ficava gravado um cabeçalho sem linhas
+            raise ValueError("Venda sem itens")
+        pedidos = defaultdict(int)
+        for cod_prod, quant, _ in itens:
+            pedidos[int(cod_prod)] += int(quant)
+        try:
+            with self.transacao(imediata=True) as conn:
+                c = conn.cursor()
+                if id_venda is not None:
+                    ja_gravada = c.execute("SELECT NEnc FROM Encomendas WHERE IdVenda=?", (id_venda,)).fetchone()
+                    if ja_gravada:
+                        return {"ok": True, "nenc": ja_gravada[0], "em_falta": [], "repetida": True}
+                c.executemany("UPDATE Produtos SET Quantidade = Quantidade - ? WHERE CodProd = ? AND Quantidade >= ?",
+                              [(q, cod, q) for cod, q in pedidos.items()])
+                if c.rowcount != len(pedidos):
+                    raise StockInsuficiente([])
+                c.execute("INSERT INTO Encomendas (DataEnc, CodCli, CodFunc, IdVenda) VALUES (?, ?, ?, ?)",
+                          (data, cod_cli, cod_func, id_venda))
+                nenc = c.lastrowid
+                c.executemany("INSERT INTO ItensEncomenda (NEnc, CodProd, Quant, PrecoUnitario) VALUES (?, ?, ?, ?)",
+                              [(nenc, cod_prod, quant, preco) for cod_prod, quant, preco in itens])
+                self._movimentar(c, [(cod, "venda", -q, nenc, None) for cod, q in pedidos.items()])
+        except StockInsuficiente:
+            return {"ok": False, "nenc": None, "em_falta": self._linhas_sem_stock(pedidos)}
+        return {"ok": True, "nenc": nenc, "em_falta": []}
+
+    def _linhas_sem_stock(self, pedidos):
+        # Todas as linhas do carrinho sem stock suficiente (produtos inexistentes contam com 0)
+        marcas = ", ".join("(?, ?)" for _ in pedidos)
+        params = [v for cod, q in pedidos.items() for v in (cod, q)]
+        return self.connect().execute(f"""
+            WITH Carrinho(CodProd, Quant) AS (VALUES {marcas})
+            SELECT C.CodProd, C.Quant, IFNULL(P.Quantidade, 0)
+            FROM Carrinho C LEFT JOIN Produtos P ON P.CodProd = C.CodProd
+            WHERE IFNULL(P.Quantidade, 0) < C.Quant""", params).fetchall()
+
+    def adicionar_encomenda(self, data, cod_cli, itens: list, cod_func, id_venda=None):
+        # Qualquer falta de stock desfaz a encomenda inteira (cabeçalho incluído)
+        resultado = self.registar_venda(data, cod_cli, itens, cod_func, id_venda)
+        if not resultado["ok"]:
+            raise StockInsuficiente(resultado["em_falta"])
         return True
 
+    def escrever_lote(self, chamadas):
+        # [(método, args, kwargs), ...] numa só transação, com um SAVEPOINT por chamada para um erro
+        # só desfazer a sua. Devolve [(resultado, erro), ...]; se o commit falhar, a exceção sobe e
+        # nada do lote ficou gravado.
+        resultados = []
+        with self.transacao(imediata=True):
+            for nome, args, kwargs in chamadas:
+                try:
+                    with self.transacao():
+                        resultados.append((getattr(self, nome)(*args, **kwargs), None))
+                except Exception as e:
+                    resultados.append((None, e))
+        return resultados
+
     def consultar_encomendas(self, cod_func_filter=None):
-        conn = self.connect()
-        c = conn.cursor()
+        # Total vem já calculado em Encomendas (mantido pelos triggers de ItensEncomenda)
         sql = """SELECT 
                     E.NEnc, 
                     E.DataEnc, 
                     C.NomeCli, 
                     F.Nome,
-                    SUM(I.Quant * I.PrecoUnitario) AS Total
+                    E.Total
                  FROM Encomendas E
                  JOIN Clientes C ON E.CodCli=C.CodCli
                  JOIN Funcionarios F ON E.CodFunc=F.CodFunc
-                 JOIN ItensEncomenda I ON E.NEnc=I.NEnc"""
+                 WHERE E.NumLinhas > 0"""
         params = []
         if cod_func_filter:
-            sql += " WHERE E.CodFunc = ?"
+            sql += " AND E.CodFunc = ?"
             params.append(cod_func_filter)
-        sql += " GROUP BY E.NEnc, E.DataEnc, C.NomeCli, F.Nome ORDER BY E.NEnc DESC"
-        rows = c.execute(sql, params).fetchall()
-        conn.close()
-        return rows
+        sql += " ORDER BY E.NEnc DESC"
+        return self.connect().execute(sql, params).fetchall()
 
-    def excluir_encomenda(self, nenc):
-        conn = self.connect()
-        c = conn.cursor()
-        c.execute("SELECT CodProd, Quant FROM ItensEncomenda WHERE NEnc=?", (nenc,))
-        itens = c.fetchall()
-        for cod_prod, quant in itens:
-            c.execute("UPDATE Produtos SET Quantidade = Quantidade + ? WHERE CodProd=?", (quant, cod_prod))
-
-        c.execute("DELETE FROM ItensEncomenda WHERE NEnc=?", (nenc,))
+    def consultar_encomendas_pagina(self, cod_func_filter=None, apos=None, tamanho=None):
+        # Mais recentes primeiro: a página seguinte são as encomendas com NEnc menor que o último recebido
+        sql = """SELECT E.NEnc, E.DataEnc, C.NomeCli, F.Nome, E.Total
+                 FROM Encomendas E
+                 JOIN Clientes C ON E.CodCli=C.CodCli
+                 JOIN Funcionarios F ON E.CodFunc=F.CodFunc
+                 WHERE E.NumLinhas > 0 AND E.NEnc < ?"""
+        params = [apos if apos is not None else 2 ** 63 - 1]
+        if cod_func_filter:
+            sql += " AND E.CodFunc = ?"
+            params.append(cod_func_filter)
+        sql += " ORDER BY E.NEnc DESC LIMIT ?"
+        params.append(tamanho or self.TAMANHO_PAGINA)
+        return self.connect().execute(sql, params).fetchall()
+
+    def verificar_totais_encomendas(self, corrigir=False):
+        # Compara os totais guardados com os calculados a partir de ItensEncomenda.
+        # Devolve [(NEnc, total guardado, total real), ...]; com corrigir=True recalcula tudo.
+        divergentes = self.connect().execute("""
+            SELECT E.NEnc, E.Total, R.Total
+            FROM Encomendas E
+            JOIN (SELECT E2.NEnc,
+                         IFNULL(SUM(I.Quant * I.PrecoUnitario), 0) AS Total,
+                         IFNULL(SUM(I.Quant), 0) AS NumItens,
+                         COUNT(I.NItem) AS NumLinhas
+                  FROM Encomendas E2
+                  LEFT JOIN ItensEncomenda I ON I.NEnc = E2.NEnc
+                  GROUP BY E2.NEnc) R ON R.NEnc = E.NEnc
+            WHERE ABS(E.Total - R.Total) > 0.005 OR E.NumItens != R.NumItens OR E.NumLinhas != R.NumLinhas
+        """).fetchall()
+        if corrigir:
+            with self.transacao() as conn:
+                conn.execute(SQL_RECALCULAR_TOTAIS)
+        return divergentes
+
+    def obter_encomenda(self, nenc):
+        # Cabeçalho da encomenda: (CodCli, DataEnc, NomeCli)
+        return self.connect().execute("""SELECT E.CodCli, E.DataEnc, C.NomeCli
+                                         FROM Encomendas E
+                                         JOIN Clientes C ON E.CodCli = C.CodCli
+                                         WHERE E.NEnc=?""", (nenc,)).fetchone()
+
+    def consultar_itens_encomenda(self, nenc):
+        return self.connect().execute("""SELECT I.CodProd, P.Produto, I.Quant, I.PrecoUnitario
+                                         FROM ItensEncomenda I
+                                         JOIN Produtos P ON I.CodProd = P.CodProd
+                                         WHERE I.NEnc=?""", (nenc,)).fetchall()
 
-        c.execute("DELETE FROM Encomendas WHERE NEnc=?", (nenc,))
-        conn.commit()
-        conn.close()
+    def excluir_encomenda(self, nenc):
+        self.excluir_encomendas([nenc])
+
+    # Remoção em lote: uma só transação e um relatório {id: estado} com
+    # "apagado", "bloqueado" (tem encomendas/vendas associadas) ou "inexistente".
+    # Os ids vão num só parâmetro JSON (json_each), sem limite de variáveis.
+    def excluir_encomendas(self, ids):
+        ids = [int(i) for i in ids]
+        lista = json.dumps(ids)
+        with self.transacao() as conn:
+            existentes = {r[0] for r in conn.execute(
+                "SELECT NEnc FROM Encomendas WHERE NEnc IN (SELECT value FROM json_each(?))", (lista,))}
+            # Devolução ao stock no livro, por encomenda e produto
+            conn.execute("""INSERT INTO MovimentosStock (CodProd, Tipo, Delta, NEnc)
+                            SELECT CodProd, 'devolucao', SUM(Quant), NEnc FROM ItensEncomenda
+                            WHERE NEnc IN (SELECT value FROM json_each(?))
+                            GROUP BY NEnc, CodProd""", (lista,))
+            # Repõe o stock de todos os produtos afetados com um só UPDATE agrupado
+            conn.execute("""UPDATE Produtos SET Quantidade = Quantidade + T.Quant
+                            FROM (SELECT CodProd, SUM(Quant) AS Quant FROM ItensEncomenda
+                                  WHERE NEnc IN (SELECT value FROM json_each(?))
+                                  GROUP BY CodProd) AS T
+                            WHERE Produtos.CodProd = T.CodProd""", (lista,))
+            # As linhas saem pelo trigger de Encomendas (ver migracoes.py)
+            conn.execute("DELETE FROM Encomendas WHERE NEnc IN (SELECT value FROM json_each(?))", (lista,))
+        return {i: "apagado" if i in existentes else "inexistente" for i in ids}
+
+    def excluir_clientes(self, ids):
+        return self._excluir_em_lote("Clientes", "CodCli", ids,
+                                     "SELECT DISTINCT CodCli FROM Encomendas WHERE CodCli IN (SELECT value FROM json_each(?))")
+
+    def excluir_produtos(self, ids):
+        return self._excluir_em_lote("Produtos", "CodProd", ids,
+                                     "SELECT DISTINCT CodProd FROM ItensEncomenda WHERE CodProd IN (SELECT value FROM json_each(?))")
+
+    def excluir_funcionarios(self, ids):
+        return self._excluir_em_lote("Funcionarios", "CodFunc", ids,
+                                     "SELECT DISTINCT CodFunc FROM Encomendas WHERE CodFunc IN (SELECT value FROM json_each(?))")
+
+    def _excluir_em_lote(self, tabela, chave, ids, sql_bloqueados):
+        # sql_bloqueados devolve os ids que a FK (ON DELETE RESTRICT) não deixa apagar
+        ids = [int(i) for i in ids]
+        lista = json.dumps(ids)
+        with self.transacao() as conn:
+            existentes = {r[0] for r in conn.execute(
+                f"SELECT {chave} FROM {tabela} WHERE {chave} IN (SELECT value FROM json_each(?))", (lista,))}
+            bloqueados = {r[0] for r in conn.execute(sql_bloqueados, (lista,))}
+            apagar = json.dumps(sorted(existentes - bloqueados))
+            conn.execute(f"DELETE FROM {tabela} WHERE {chave} IN (SELECT value FROM json_each(?))", (apagar,))
+        return {i: "inexistente" if i not in existentes else "bloqueado" if i in bloqueados else "apagado"
+                for i in ids}
+
+    # Exportação (exportacao.py): linhas de encomenda por ordem de NEnc, lidas aos poucos com
+    # fetchmany. Os filtros usam os índices de Encomendas (data, vendedor) e a chave primária
+    # (apos_nenc, para exportações incrementais). Os CROSS JOIN deixam Encomendas por fora, pela
+    # ordem de NEnc, para não haver uma ordenação de todas as linhas antes da primeira sair.
+    def _sql_linhas_encomendas(self, data_ini, data_fim, cod_func, apos_nenc, apos_item=None):
+        sql = """SELECT E.NEnc, E.DataEnc, E.CodCli, C.NomeCli, E.CodFunc, F.Nome, I.NItem, I.CodProd,
+                        P.Produto, P.Categoria, P.Marca, I.Quant, I.PrecoUnitario, I.Quant * I.PrecoUnitario
+                 FROM Encomendas E
+                 CROSS JOIN ItensEncomenda I ON I.NEnc = E.NEnc
+                 CROSS JOIN Clientes C ON C.CodCli = E.CodCli
+                 CROSS JOIN Funcionarios F ON F.CodFunc = E.CodFunc
+                 CROSS JOIN Produtos P ON P.CodProd = I.CodProd"""
+        if apos_item is None:
+            sql += " WHERE E.NEnc > ?"
+            params = [apos_nenc or 0]
+        else:
+            # Continua a meio da encomenda apos_nenc, depois do item apos_item
+            sql += " WHERE E.NEnc >= ? AND (E.NEnc > ? OR I.NItem > ?)"
+            params = [apos_nenc, apos_nenc, apos_item]
+        if data_ini:
+            sql += " AND E.DataEnc >= ?"
+            params.append(data_ini)
+        if data_fim:
+            sql += " AND E.DataEnc <= ?"
+            params.append(data_fim)
+        if cod_func:
+            sql += " AND E.CodFunc = ?"
+            params.append(cod_func)
+        return sql + " ORDER BY E.NEnc, I.NItem", params
+
+    # Gerador (interface e linha de comandos): tudo é lido no mesmo snapshot da BD
+    def exportar_linhas_encomendas(self, data_ini=None, data_fim=None, cod_func=None, apos_nenc=None, lote=1000):
+        sql, params = self._sql_linhas_encomendas(data_ini, data_fim, cod_func, apos_nenc)
+
+        # Ligação só desta exportação: a transação de leitura (um instantâneo coerente) fica aberta até
+        # ao fim sem apanhar as escritas que esta thread faça entretanto (interface a meio da exportação)
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False)
+        try:
+            conn.execute("PRAGMA query_only = ON")
+            if self.instrumentacao:
+                self.instrumentacao.ligar(conn)
+            conn.execute("BEGIN")
+            cur = conn.execute(sql, params)
+            while True:
+                linhas = cur.fetchmany(lote)
+                if not linhas:
+                    break
+                yield from linhas
+        finally:
+            conn.close()
 
+    def exportar_linhas_encomendas_pagina(self, data_ini=None, data_fim=None, cod_func=None, apos=None,
+                                          tamanho=None):
+        # Para o serviço HTTP (ClienteBD): páginas pela chave (NEnc, NItem) da última linha recebida;
+        # (NEnc, None) começa depois da encomenda inteira
+        apos_nenc, apos_item = apos or (0, None)
+        sql, params = self._sql_linhas_encomendas(data_ini, data_fim, cod_func, apos_nenc, apos_item)
+        return self.connect().execute(sql + " LIMIT ?", params + [tamanho or self.TAMANHO_PAGINA]).fetchall()
+
+    # Pesquisa (índices FTS5 mantidos por triggers, ver migracoes.py).
+    # Termo vazio devolve a listagem completa; senão só as linhas que correspondem, por relevância.
+    def pesquisar_clientes(self, termo):
+        consulta = consulta_fts(termo)
+        if not consulta:
+            return self.consultar_clientes()
+        return self.connect().execute("""SELECT C.* FROM PesquisaClientes S
+                                         JOIN Clientes C ON C.CodCli = S.rowid
+                                         WHERE PesquisaClientes MATCH ? ORDER BY S.rank""", (consulta,)).fetchall()
+
+    def pesquisar_produtos(self, termo):
+        consulta = consulta_fts(termo)
+        if not consulta:
+            return self.consultar_produtos()
+        return self.connect().execute("""SELECT P.* FROM PesquisaProdutos S
+                                         JOIN Produtos P ON P.CodProd = S.rowid
+                                         WHERE PesquisaProdutos MATCH ? ORDER BY S.rank""", (consulta,)).fetchall()
+
+    def pesquisar_funcionarios(self, termo):
+        consulta = consulta_fts(termo)
+        if not consulta:
+            return self.consultar_funcionarios()
+        return self.connect().execute("""SELECT F.CodFunc, F.Nome, F.Username, F.Cargo FROM PesquisaFuncionarios S
+                                         JOIN Funcionarios F ON F.CodFunc = S.rowid
+                                         WHERE PesquisaFuncionarios MATCH ? ORDER BY S.rank""", (consulta,)).fetchall()
+
+    def pesquisar_encomendas(self, termo, cod_func_filter=None):
+        consulta = consulta_fts(termo)
+        if not consulta:
+            return self.consultar_encomendas(cod_func_filter)
+        sql = """SELECT E.NEnc, E.DataEnc, C.NomeCli, F.Nome, E.Total
+                 FROM PesquisaEncomendas S
+                 JOIN Encomendas E ON E.NEnc = S.rowid
+                 JOIN Clientes C ON E.CodCli=C.CodCli
+                 JOIN Funcionarios F ON E.CodFunc=F.CodFunc
+                 WHERE PesquisaEncomendas MATCH ? AND E.NumLinhas > 0"""
+        params = [consulta]
+        if cod_func_filter:
+            sql += " AND E.CodFunc = ?"
+            params.append(cod_func_filter)
+        sql += " ORDER BY S.rank"
+        return self.connect().execute(sql, params).fetchall()
 
+    # Relatórios (lidos dos agregados diários mantidos por triggers, ver migracoes.py)
     def resumo_vendas_funcionarios(self, cod_func=None):
-        with self.connect() as conn:
-            sql = """
-                SELECT 
-                    F.Nome,
-                    COUNT(DISTINCT E.NEnc) AS NumEncomendas,
-                    IFNULL(SUM(I.Quant * I.PrecoUnitario), 0) AS TotalVendas
-                FROM Funcionarios F
-                LEFT JOIN Encomendas E ON F.CodFunc = E.CodFunc
-                LEFT JOIN ItensEncomenda I ON E.NEnc = I.NEnc
-            """
-            params = []
+        sql = """
+            SELECT 
+                F.Nome,
+                IFNULL(SUM(R.NumEncomendas), 0) AS NumEncomendas,
+                IFNULL(SUM(R.Total), 0) AS TotalVendas
+            FROM Funcionarios F
+            LEFT JOIN VendasDiaFuncionario R ON F.CodFunc = R.CodFunc
+        """
+        params = []
 
-            if cod_func:
-                sql += " WHERE F.CodFunc = ?"
-                params.append(cod_func)
+        if cod_func:
+            sql += " WHERE F.CodFunc = ?"
+            params.append(cod_func)
 
-            sql += " GROUP BY F.CodFunc, F.Nome"
+        sql += " GROUP BY F.CodFunc, F.Nome"
 
-            return conn.execute(sql, params).fetchall()
+        return self.connect().execute(sql, params).fetchall()
 
     def vendas_por_funcionario_mes(self, cod_func):
-        with self.connect() as conn:
-            # Seleciona o Mês (YYYY-MM) e a Soma Total das vendas desse mês
-            sql = """
-            SELECT 
-                strftime('%Y-%m', E.DataEnc) AS Mes,
-                SUM(I.Quant * I.PrecoUnitario) AS Total
+        # Seleciona o Mês (YYYY-MM) e a Soma Total das vendas desse mês
+        sql = """
+        SELECT 
+            substr(R.Dia, 1, 7) AS Mes,
+            SUM(R.Total) AS Total
+        FROM VendasDiaFuncionario R
+        WHERE R.CodFunc = ?
+        GROUP BY Mes
+        HAVING SUM(R.NumLinhas) > 0
+        ORDER BY Mes
+        """
+        return self.connect().execute(sql, (cod_func,)).fetchall()
+
+    def vendas_mensais_funcionarios(self, cod_funcs=None, data_ini=None, data_fim=None):
+        # (CodFunc, Mês, Total) de vários funcionários numa só consulta (cod_funcs None = todos),
+        # para as séries de comparação do gráfico dos Relatórios
+        sql = """
+        SELECT R.CodFunc, substr(R.Dia, 1, 7) AS Mes, SUM(R.Total) AS Total
+        FROM VendasDiaFuncionario R
+        WHERE R.Dia BETWEEN ? AND ?"""
+        params = [data_ini or "0000-00-00", data_fim or "9999-99-99"]
+        if cod_funcs is not None:
+            sql += " AND R.CodFunc IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(cod_funcs)))
+        sql += """
+        GROUP BY R.CodFunc, Mes
+        HAVING SUM(R.NumLinhas) > 0
+        ORDER BY R.CodFunc, Mes"""
+        return self.connect().execute(sql, params).fetchall()
+
+    def contar_encomendas(self, ate_nenc=None):
+        # (nº de encomendas, maior NEnc) até ate_nenc; a análise (analise.py) compara o nº com o
+        # que já carregou para saber se foram apagadas encomendas
+        return self.connect().execute("SELECT COUNT(*), MAX(NEnc) FROM Encomendas WHERE NEnc <= ?",
+                                      (ate_nenc if ate_nenc is not None else 2 ** 63 - 1,)).fetchone()
+
+    def linhas_analise(self, de_nenc, ate_nenc):
+        # Linhas das encomendas de_nenc..ate_nenc só com números, para os arrays da análise:
+        # (NEnc, dia desde 1970-01-01, CodCli, CodFunc, CodProd, Quant, PrecoUnitario); cliente ou
+        # funcionário apagado = 0
+        return self.connect().execute("""
+            SELECT E.NEnc, CAST(julianday(E.DataEnc) - 2440587.5 AS INTEGER), IFNULL(E.CodCli, 0), IFNULL(E.CodFunc, 0),
+                   I.CodProd, I.Quant, I.PrecoUnitario
             FROM Encomendas E
-            JOIN ItensEncomenda I ON E.NEnc = I.NEnc
-            WHERE E.CodFunc = ?
-            GROUP BY Mes
-            ORDER BY Mes
-            """
-            return conn.execute(sql, (cod_func,)).fetchall()
+            CROSS JOIN ItensEncomenda I ON I.NEnc = E.NEnc
+            WHERE E.NEnc BETWEEN ? AND ?
+            ORDER BY E.NEnc""", (de_nenc, ate_nenc)).fetchall()
+
+    def vendas_por_produto(self, data_ini=None, data_fim=None):
+        # (CodProd, Produto, Quant, Total) no intervalo de datas, do mais vendido para o menos vendido
+        sql = """
+        SELECT R.CodProd, P.Produto, SUM(R.Quant) AS Quant, SUM(R.Total) AS Total
+        FROM VendasDiaProduto R
+        JOIN Produtos P ON P.CodProd = R.CodProd
+        WHERE R.Dia BETWEEN ? AND ?
+        GROUP BY R.CodProd
+        ORDER BY Total DESC
+        """
+        return self.connect().execute(sql, (data_ini or "0000-00-00", data_fim or "9999-99-99")).fetchall()
+
+    def vendas_por_categoria(self, data_ini=None, data_fim=None):
+        # (Categoria, Quant, Total) no intervalo de datas
+        sql = """
+        SELECT R.Categoria, SUM(R.Quant) AS Quant, SUM(R.Total) AS Total
+        FROM VendasDiaCategoria R
+        WHERE R.Dia BETWEEN ? AND ?
+        GROUP BY R.Categoria
+        ORDER BY Total DESC
+        """
+        return self.connect().execute(sql, (data_ini or "0000-00-00", data_fim or "9999-99-99")).fetchall()
+
+    # Livro de stock (MovimentosStock, ver migracoes.py). Produtos.Quantidade continua a ser o stock
+    # atual (é ela que trava as vendas sem stock); cada mudança fica também como movimento, na
+    # mesma transação, e reconciliar_stock confirma que as duas coisas batem certo.
+    def _movimentar(self, conn, movimentos):
+        # [(CodProd, Tipo, Delta, NEnc, Nota), ...]; movimentos de 0 não se registam
+        conn.executemany("INSERT INTO MovimentosStock (CodProd, Tipo, Delta, NEnc, Nota) VALUES (?, ?, ?, ?, ?)",
+                         [m for m in movimentos if m[2]])
+
+    def movimentar_stock(self, cod_prod, delta, tipo="entrada", nota=None):
+        # Entrada de mercadoria ou acerto manual: soma delta ao stock (nunca abaixo de 0) e devolve o novo
+        if tipo not in ("entrada", "ajuste"):
+            raise ValueError(f"Tipo de movimento inválido: {tipo}")
+        with self.transacao(imediata=True) as conn:
+            atual = conn.execute("SELECT Quantidade FROM Produtos WHERE CodProd=?", (cod_prod,)).fetchone()
+            if atual is None:
+                raise ValueError(f"Produto {cod_prod} não existe")
+            if atual[0] + int(delta) < 0:
+                raise ValueError(f"Stock insuficiente: {atual[0]} em stock")
+            conn.execute("UPDATE Produtos SET Quantidade = Quantidade + ? WHERE CodProd=?", (int(delta), cod_prod))
+            self._movimentar(conn, [(cod_prod, tipo, int(delta), None, nota)])
+        return atual[0] + int(delta)
+
+    def movimentos_stock(self, cod_prod, apos=None, tamanho=None):
+        # Histórico de um produto, do mais recente para o mais antigo (páginas por IdMov)
+        return self.connect().execute("""SELECT IdMov, datetime(Data, 'localtime'), Tipo, Delta, NEnc, Nota
+                                         FROM MovimentosStock
+                                         WHERE CodProd=? AND IdMov < ? ORDER BY IdMov DESC LIMIT ?""",
+                                      (cod_prod, apos or 2 ** 63 - 1, tamanho or self.TAMANHO_PAGINA)).fetchall()
+
+    def stock_em(self, data, apos=None, tamanho=None):
+        # Página de (CodProd, Produto, Marca, stock no fim do dia data AAAA-MM-DD), pelo livro.
+        # Os movimentos de um dia são os até ao maior IdMov registado antes da meia-noite local seguinte
+        # (ou num corte). Data está em UTC; MAX(IdMov) não depende da ordem de movimentos com a mesma Data.
+        datetime.strptime(data, "%Y-%m-%d")
+        conn = self.connect()
+        cortes = [conn.execute(f"SELECT MAX(IdMov) FROM {tabela} WHERE Data < datetime(date(?, '+1 day'), 'utc')",
+                               (data,)).fetchone()[0] for tabela in ("MovimentosStock", "CortesStock")]
+        cortes = [c for c in cortes if c is not None]
+        if not cortes:
+            inicio = conn.execute("SELECT date(Data, 'localtime') FROM CortesStock ORDER BY IdMov LIMIT 1").fetchone()
+            raise ValueError(f"O livro de stock só começa em {inicio[0] if inicio else '?'}")
+        return conn.execute(f"""SELECT P.CodProd, P.Produto, P.Marca, {SQL_STOCK_LIVRO} AS Stock
+                                FROM Produtos P WHERE P.CodProd > :apos ORDER BY P.CodProd LIMIT :tamanho""",
+                            {"corte": max(cortes), "apos": apos or 0,
+                             "tamanho": tamanho or self.TAMANHO_PAGINA}).fetchall()
+
+    def reconciliar_stock(self, acertar=False):
+        # Produtos em que Quantidade e o livro não batem certo: [(CodProd, Produto, Quantidade, Livro), ...].
+        # Com acertar=True regista um "ajuste" que põe o livro igual a Quantidade.
+        sql = f"""SELECT CodProd, Produto, Quantidade, Livro
+                  FROM (SELECT P.CodProd, P.Produto, P.Quantidade, {SQL_STOCK_LIVRO} AS Livro FROM Produtos P)
+                  WHERE Quantidade != Livro"""
+        if not acertar:
+            return self.connect().execute(sql, {"corte": 2 ** 63 - 1}).fetchall()
+        with self.transacao(imediata=True) as conn:
+            divergentes = conn.execute(sql, {"corte": 2 ** 63 - 1}).fetchall()
+            self._movimentar(conn, [(cod, "ajuste", qtd - livro, None, "reconciliação")
+                                    for cod, _, qtd, livro in divergentes])
+        return divergentes
+
+    def compactar_stock(self, manter_dias=None):
+        # Novo corte: um saldo por produto movimentado desde o corte anterior. Com manter_dias apaga os
+        # movimentos já incluídos num corte com mais de manter_dias dias (o stock numa data anterior
+        # passa a ser o do corte). Devolve (movimentos no corte, movimentos apagados).
+        with self.transacao(imediata=True) as conn:
+            anterior = conn.execute("SELECT IFNULL(MAX(IdMov), 0) FROM CortesStock").fetchone()[0]
+            ultimo = conn.execute("SELECT IFNULL(MAX(IdMov), 0) FROM MovimentosStock").fetchone()[0]
+            resumidos = apagados = 0
+            if ultimo > anterior:
+                resumidos = conn.execute("SELECT COUNT(*) FROM MovimentosStock WHERE IdMov > ?",
+                                         (anterior,)).fetchone()[0]
+                # NOT INDEXED: só os movimentos desde o corte anterior (intervalo de IdMov), em vez de
+                # percorrer o índice por produto inteiro para evitar a ordenação do GROUP BY
+                conn.execute("""INSERT INTO SaldosStock (CodProd, IdMov, Quantidade)
+                                SELECT M.CodProd, :ultimo,
+                                       IFNULL((SELECT S.Quantidade FROM SaldosStock S WHERE S.CodProd = M.CodProd
+                                               ORDER BY S.IdMov DESC LIMIT 1), 0) + SUM(M.Delta)
+                                FROM MovimentosStock M NOT INDEXED WHERE M.IdMov > :anterior
+                                GROUP BY M.CodProd""", {"ultimo": ultimo, "anterior": anterior})
+                conn.execute("INSERT INTO CortesStock (IdMov, Data, Movimentos) VALUES (?, datetime('now'), ?)",
+                             (ultimo, resumidos))
+            if manter_dias is not None:
+                corte = conn.execute("SELECT MAX(IdMov) FROM CortesStock WHERE Data < datetime('now', ?)",
+                                     (f"-{int(manter_dias)} days",)).fetchone()[0]
+                if corte is not None:
+                    apagados = conn.execute("DELETE FROM MovimentosStock WHERE IdMov <= ?", (corte,)).rowcount
+        return resumidos, apagados
+
+    def reconstruir_agregados(self):
+        # Recalcula todos os agregados a partir de Encomendas/ItensEncomenda (recuperação)
+        with self.transacao() as conn:
+            for sql in SQL_RECONSTRUIR_AGREGADOS:
+                conn.execute(sql)
 
 
 # ------------------- INTERFACE GRÁFICA -------------------
-class LoginWindow(tk.Tk):
+perfil_arranque = False
+_raiz = None
+
+
+def marcar_arranque(etapa, inicio=None):
+    # --startup-profile: milissegundos desde o arranque do processo (ou desde `inicio`)
+    if perfil_arranque:
+        print(f"[arranque] {etapa}: {(time.perf_counter() - (inicio or INICIO_PROCESSO)) * 1000:.0f} ms", flush=True)
+
+
+def raiz_tk():
+    # Raiz do Tk escondida, a mesma durante todo o programa: o login e a janela principal são
+    # Toplevels dela, por isso as imagens carregadas (ver icones.py) sobrevivem aos logouts
+    global _raiz
+    if _raiz is None:
+        _raiz = tk.Tk()
+        _raiz.withdraw()
+    return _raiz
+
+
+def ao_pintar(janela, acao, limite_ms=500):
+    # acao() uma só vez, quando a janela já está desenhada (ou ao fim de limite_ms, se
+    # estiver minimizada e o Expose não chegar)
+    feito = []
+
+    def correr(_evento=None):
+        if feito or not janela.winfo_exists():
+            return
+        feito.append(True)
+        janela.unbind("<Expose>")
+        janela.update_idletasks()
+        acao()
+    janela.bind("<Expose>", correr)
+    janela.after(limite_ms, correr)
+
+
+class LoginWindow(tk.Toplevel):
     def __init__(self, db):
-        super().__init__()
+        super().__init__(raiz_tk())
         self.db = db
+        self.protocol("WM_DELETE_WINDOW", self.master.destroy)
         self.title("Login")
         self.geometry("500x600")
         self.configure(bg=BG_COLOR)
@@ -270,8 +955,7 @@ class LoginWindow(tk.Tk):
         frame.pack(expand=True, fill="both")
 
         # Logo
-        img = Image.open("icons/logo.png").resize((200,200))
-        self.logo_img = ImageTk.PhotoImage(img)
+        self.logo_img = carregar_icone(self, "icons/logo.png", (200, 200))
         tk.Label(frame, image=self.logo_img, bg=BG_COLOR).pack(pady=20)
 
         tk.Label(frame, text="Bem-vindo ao Sistema de Gestão de Maquilhagem!",
@@ -291,32 +975,65 @@ class LoginWindow(tk.Tk):
                   cursor="hand2").pack(fill="x", padx=40)
 
         tk.Label(frame, text="© 2025 Sistema Maquilhagem", bg=BG_COLOR, fg=PRIMARY_COLOR, font=("Arial",10)).pack(pady=20)
+        ao_pintar(self, lambda: marcar_arranque("primeira pintura (login)"))
 
     def login(self):
         res = self.db.efetuar_login(self.user.get(), self.pwd.get())
         if res:
             self.destroy()
-            MainApp(self.db, res).mainloop()
+            # O mainloop da raiz já está a correr
+            MainApp(self.db, res)
         else:
             messagebox.showerror("Erro", "Login inválido")
 
 # ------------------- MAIN APP -------------------
-class MainApp(tk.Tk):
+class MainApp(tk.Toplevel):
+    # "fts": índice FTS5 na BD; "memoria": cópia dos dados em memória (lojas pequenas)
+    modo_pesquisa = "fts"
+    # DiarioVendas do posto (modo offline, ver diario.py); None grava as vendas diretamente
+    diario = None
+
     def __init__(self, db, user):
-        super().__init__()
+        super().__init__(raiz_tk())
+        # Para o --startup-profile: tempos da janela principal contados a partir do login
+        self._inicio = time.perf_counter()
         self.db = db
         self.user = user
         self.title(f"Sistema - {user['nome']} ({user['cargo']})")
         self.geometry("1100x650")
         self.configure(bg=BG_COLOR)
         self.relatorio_frame = None
+        # Gráfico dos Relatórios: criado na primeira visita e reutilizado; séries até à próxima escrita
+        self.grafico = None
+        self.series_vendas = SeriesVendas()
+        # Separadores dos Relatórios e os arrays da análise (analise.py, criados no primeiro separador
+        # analítico e atualizados só com as encomendas novas)
+        self.separadores = None
+        self.analise = None
+        # Carregamento da tabela por páginas (ver populate_tree)
+        self._paginas = None
+        self._ultima_chave = None
+        self._fim_paginas = True
+        self._pagina_pedida = False
+        # Pesquisa: tecla agendada (debounce) e cópias em memória por ecrã
+        self._pesquisa_agendada = None
+        self.instantaneos = {}
+        # Consultas numa thread à parte; os resultados chegam por after() (ver tarefas.py)
+        self.trabalhador = TrabalhadorBD(self, self.mostrar_ocupado)
+        self.protocol("WM_DELETE_WINDOW", self.sair)
+        # Envio das vendas do diário para a BD central, enquanto a sessão estiver aberta
+        self.sincronizador = None
+        if self.diario:
+            self.sincronizador = Sincronizador(self.diario, self.db,
+                                               cod_func=None if user['cargo'] == "Admin" else user['id'])
+            self.sincronizador.iniciar()
 
         # Sidebar
         self.sidebar = tk.Frame(self, bg=PRIMARY_COLOR, width=160)
         self.sidebar.pack(side="left", fill="y")
 
 
-        # carregar ícones
+        # carregar ícones (já redimensionados e em cache, ver icones.py)
         self.icons = {}
         icon_files = {
             "clientes": "icons/clientes.png",
@@ -328,22 +1045,28 @@ class MainApp(tk.Tk):
 
         }
         for key, file in icon_files.items():
-            img = Image.open(file).resize((50,50))
-            self.icons[key] = ImageTk.PhotoImage(img)
+            self.icons[key] = carregar_icone(self, file, (50, 50))
 
         self.btn_frame_top = tk.Frame(self.sidebar, bg=PRIMARY_COLOR)
         self.btn_frame_top.pack(side="top", fill="y", pady=20)
-        self.add_menu_btn(self.btn_frame_top, self.icons["clientes"], self.open_clientes)
-        self.add_menu_btn(self.btn_frame_top, self.icons["produtos"], self.open_produtos)
-        self.add_menu_btn(self.btn_frame_top, self.icons["encomendas"], self.open_encomendas)
+        self.add_menu_btn(self.btn_frame_top, self.icons["clientes"], self.open_clientes, "Clientes")
+        self.add_menu_btn(self.btn_frame_top, self.icons["produtos"], self.open_produtos, "Produtos")
+        self.add_menu_btn(self.btn_frame_top, self.icons["encomendas"], self.open_encomendas, "Encomendas")
 
         if self.user['cargo'] == "Admin":
-            self.add_menu_btn(self.btn_frame_top, self.icons["funcionarios"], self.open_funcionarios)
-            self.add_menu_btn(self.btn_frame_top, self.icons["relatorios"], self.open_relatorios)
+            self.add_menu_btn(self.btn_frame_top, self.icons["funcionarios"], self.open_funcionarios, "Funcionários")
+            self.add_menu_btn(self.btn_frame_top, self.icons["relatorios"], self.open_relatorios, "Relatórios")
+            self.add_menu_btn(self.btn_frame_top, None, self.open_diagnostico, "Diagnóstico")
+        if self.diario:
+            self.add_menu_btn(self.btn_frame_top, None, self.open_vendas_offline, "Vendas offline")
 
         self.btn_frame_bottom = tk.Frame(self.sidebar, bg=PRIMARY_COLOR)
         self.btn_frame_bottom.pack(side="bottom", fill="x", pady=20)
-        tk.Button(self.btn_frame_bottom, image=self.icons["logout"], command=self.logout,
+        self.lbl_diario = tk.Label(self.btn_frame_bottom, text="", bg=PRIMARY_COLOR, fg=TEXT_COLOR, font=("Arial", 10))
+        self.lbl_diario.pack()
+        if self.diario:
+            self.atualizar_estado_diario()
+        tk.Button(self.btn_frame_bottom, image=self.icons["logout"] or "", text="Sair", command=self.logout,
                   bg="red", relief="flat").pack(pady=10)
 
         self.main = tk.Frame(self, bg=BG_COLOR)
@@ -351,6 +1074,8 @@ class MainApp(tk.Tk):
 
         self.lbl_title = tk.Label(self.main, text="", font=("Arial",18,"bold"), bg=BG_COLOR)
         self.lbl_title.pack(anchor="w")
+        self.lbl_ocupado = tk.Label(self.main, text="", font=("Arial",11,"italic"), bg=BG_COLOR, fg=SECONDARY_COLOR)
+        self.lbl_ocupado.place(relx=1.0, y=6, anchor="ne")
 
         # Busca
         self.search_frame = tk.Frame(self.main, bg=BG_COLOR)
@@ -361,56 +1086,176 @@ class MainApp(tk.Tk):
         self.search.bind("<KeyRelease>", self.filtrar)
 
         # Treeview
-        self.tree = ttk.Treeview(self.main, show="headings")
-        self.tree.pack(fill="both", expand=True)
+        tree_frame = tk.Frame(self.main, bg=BG_COLOR)
+        tree_frame.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(tree_frame, show="headings")
+        self.tree_scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        # Ao chegar perto do fim da lista carrega a página seguinte
+        self.tree.configure(yscrollcommand=self.ao_rolar_tree)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree_scroll.pack(side="right", fill="y")
 
         # Botões funcionalidades
         self.btn_frame = tk.Frame(self.main, bg=BG_COLOR)
         self.btn_frame.pack(fill="x", pady=10)
 
+        # Os dados do primeiro ecrã só se pedem depois de a janela aparecer
+        ao_pintar(self, self.primeiro_ecra)
+
+    def primeiro_ecra(self):
+        marcar_arranque("janela principal pintada (desde o login)", self._inicio)
         self.open_clientes()
 
     def limpar_tela_extra(self):
+        if self._pesquisa_agendada is not None:
+            self.after_cancel(self._pesquisa_agendada)
+            self._pesquisa_agendada = None
         if self.relatorio_frame:
             self.relatorio_frame.destroy()
             self.relatorio_frame = None
-
-    def add_menu_btn(self, parent_frame, image, cmd):
-        tk.Button(parent_frame, image=image, command=cmd,
-                  bg=PRIMARY_COLOR, relief="flat").pack(pady=20)
-
-    def set_buttons(self, cad, alt, exc):
+        if self.grafico:
+            self.grafico.widget.pack_forget()
+        if self.separadores:
+            self.separadores.destroy()
+            self.separadores = None
+
+    def mostrar_ocupado(self, ocupado):
+        self.lbl_ocupado.config(text="A carregar..." if ocupado else "")
+        self.config(cursor="watch" if ocupado else "")
+
+    def add_menu_btn(self, parent_frame, image, cmd, texto=""):
+        # Sem o ficheiro do ícone fica o texto
+        tk.Button(parent_frame, image=image or "", text=texto, command=cmd,
+                  bg=PRIMARY_COLOR, fg=TEXT_COLOR, relief="flat").pack(pady=20)
+
+    def set_buttons(self, cad, alt, exc, *extras):
+        # extras: (texto, comando) de botões próprios do ecrã
         for w in self.btn_frame.winfo_children(): w.destroy()
         b_style = {"bg": BUTTON_BG, "fg": TEXT_COLOR, "width":12, "font":("Arial",12,"bold"), "relief":"flat"}
         tk.Button(self.btn_frame, text="Novo", command=cad, **b_style).pack(side="left", padx=10)
         tk.Button(self.btn_frame, text="Editar" if self.lbl_title["text"]!="Encomendas" else "Detalhes",
                   command=alt, **b_style).pack(side="left", padx=10)
         tk.Button(self.btn_frame, text="Apagar", command=exc, **b_style).pack(side="left", padx=10)
+        for texto, comando in extras:
+            tk.Button(self.btn_frame, text=texto, command=comando, **b_style).pack(side="left", padx=10)
 
     # Popups
 
 
     # Filtrar (busca)
-    def filtrar(self, event):
-        termo = self.search.get().lower()
+    def filtrar(self, event=None):
+        # Uma rajada de teclas dá uma só pesquisa, ATRASO_PESQUISA_MS depois da última
+        if self._pesquisa_agendada is not None:
+            self.after_cancel(self._pesquisa_agendada)
+        self._pesquisa_agendada = self.after(ATRASO_PESQUISA_MS, self.aplicar_filtro)
+
+    def aplicar_filtro(self):
+        self._pesquisa_agendada = None
+        termo = self.search.get()
         tela = self.lbl_title["text"]
-        data = []
-        if tela=="Clientes": data = self.db.consultar_clientes()
-        elif tela=="Produtos": data = self.db.consultar_produtos()
-        elif tela=="Funcionários": data = self.db.consultar_funcionarios()
-        elif tela=="Encomendas":
+        if not termo.strip():
+            # Sem termo volta à listagem por páginas
+            return self.populate_tree(self.tree["columns"], self.fonte_paginas(tela))
+        self._paginas = None
+        if self.modo_pesquisa == "memoria": pesquisar = self.instantaneo(tela).filtrar
+        # Uma só consulta MATCH ao índice de pesquisa do ecrã atual
+        elif tela=="Clientes": pesquisar = self.db.pesquisar_clientes
+        elif tela=="Produtos": pesquisar = self.db.pesquisar_produtos
+        elif tela=="Funcionários": pesquisar = self.db.pesquisar_funcionarios
+        else:
             filtro = None if self.user['cargo']=="Admin" else self.user['id']
-            data = self.db.consultar_encomendas(filtro)
-        clean_data = []
-        for row in data:
-            full_str = " ".join([str(x).lower() for x in row if x is not None])
-            if termo in full_str: clean_data.append(row)
+            pesquisar = functools.partial(self.db.pesquisar_encomendas, cod_func_filter=filtro)
+        # No canal "tabela": uma tecla nova ou outro ecrã descartam esta pesquisa
+        self.trabalhador.pedir(pesquisar, termo, canal="tabela", ao_terminar=self.mostrar_pesquisa)
+
+    def mostrar_pesquisa(self, data):
         self.tree.delete(*self.tree.get_children())
-        for row in clean_data:
-            if tela=="Encomendas":
-                row_list = list(row); row_list[4] = f"{row_list[4]:.2f} €"
-                self.tree.insert("", "end", values=tuple(row_list))
-            else: self.tree.insert("", "end", values=row)
+        self.inserir_linhas(data)
+
+    def instantaneo(self, tela):
+        if tela not in self.instantaneos:
+            if tela=="Clientes": carregar = self.db.consultar_clientes
+            elif tela=="Produtos": carregar = self.db.consultar_produtos
+            elif tela=="Funcionários": carregar = self.db.consultar_funcionarios
+            else:
+                filtro = None if self.user['cargo']=="Admin" else self.user['id']
+                carregar = functools.partial(self.db.consultar_encomendas, filtro)
+            self.instantaneos[tela] = InstantaneoPesquisa(self.db, carregar)
+        return self.instantaneos[tela]
+
+    def fonte_paginas(self, tela):
+        # Função apos -> página seguinte de cada ecrã
+        if tela=="Clientes": return self.db.consultar_clientes_pagina
+        if tela=="Produtos": return self.db.consultar_produtos_pagina
+        if tela=="Funcionários": return self.db.consultar_funcionarios_pagina
+        filtro = None if self.user['cargo']=="Admin" else self.user['id']
+        return functools.partial(self.db.consultar_encomendas_pagina, filtro)
+
+    def janela_progresso(self, titulo, texto):
+        # Janela modal de uma tarefa longa no TrabalhadorBD. A tarefa só guarda o progresso em
+        # estado["texto"] (está noutra thread); um after() na thread do Tk mostra-o até a janela fechar
+        janela = tk.Toplevel(self)
+        janela.title(titulo)
+        janela.configure(bg=BG_COLOR)
+        janela.protocol("WM_DELETE_WINDOW", lambda: None)
+        lbl = tk.Label(janela, text=texto, bg=BG_COLOR, font=("Arial", 12), padx=30, pady=20)
+        lbl.pack()
+        janela.grab_set()
+        estado = {"texto": texto}
+
+        def mostrar():
+            if janela.winfo_exists():
+                lbl.config(text=estado["texto"])
+                janela.after(100, mostrar)
+        mostrar()
+        return janela, estado
+
+    def importar(self, tipo):
+        caminho = filedialog.askopenfilename(title=f"Importar {tipo}", filetypes=[("CSV", "*.csv"), ("Todos", "*.*")])
+        if not caminho:
+            return
+        janela, estado = self.janela_progresso("Importação", "A importar...")
+
+        def progresso(r):
+            estado["texto"] = (f"{r['lidas']} linhas lidas\n{r['inseridos']} novos, {r['atualizados']} atualizados, "
+                               f"{r['rejeitadas']} rejeitadas")
+
+        def terminou(r):
+            janela.destroy()
+            self.open_produtos() if tipo == "produtos" else self.open_clientes()
+            msg = f"{r['inseridos']} novo(s), {r['atualizados']} atualizado(s)."
+            if r["rejeitadas"]:
+                messagebox.showwarning("Importação", f"{msg}\n\n{r['rejeitadas']} linha(s) rejeitada(s), ver:\n"
+                                                     f"{r['ficheiro_rejeitados']}")
+            else:
+                messagebox.showinfo("Importação", msg)
+
+        def falhou(e):
+            janela.destroy()
+            messagebox.showerror("Erro", f"Erro na importação:\n{e}")
+
+        self.trabalhador.pedir(importar_csv, self.db, tipo, caminho, progresso=progresso,
+                               ao_terminar=terminou, ao_falhar=falhou)
+
+    def exportar(self):
+        caminho = filedialog.asksaveasfilename(title="Exportar linhas de encomenda", defaultextension=".csv",
+                                               filetypes=[("CSV", "*.csv"), ("CSV comprimido", "*.csv.gz"),
+                                                          ("JSON Lines", "*.jsonl"), ("JSON Lines comprimido", "*.jsonl.gz")])
+        if not caminho:
+            return
+        janela, estado = self.janela_progresso("Exportação", "A exportar...")
+
+        def terminou(r):
+            janela.destroy()
+            messagebox.showinfo("Exportação", f"{r['linhas']} linha(s) exportada(s) para:\n{caminho}")
+
+        def falhou(e):
+            janela.destroy()
+            messagebox.showerror("Erro", f"Erro na exportação:\n{e}")
+
+        self.trabalhador.pedir(exportar_encomendas, self.db, caminho,
+                               progresso=lambda n: estado.update(texto=f"{n} linhas exportadas"),
+                               ao_terminar=terminou, ao_falhar=falhou)
 
     def get_sel(self):
         sel = self.tree.selection()
@@ -420,8 +1265,40 @@ class MainApp(tk.Tk):
     # Logout
     def logout(self):
         if messagebox.askyesno("Logout","Deseja realmente sair do sistema?"):
+            self.trabalhador.parar()
+            self.parar_sincronizacao()
             self.destroy()
-            LoginWindow(self.db).mainloop()
+            # Fecha as ligações desta sessão; o próximo login reabre-as
+            self.db.fechar()
+            LoginWindow(self.db)
+
+    def sair(self):
+        # Fechar a janela principal termina o programa (e o mainloop da raiz)
+        self.trabalhador.parar()
+        self.parar_sincronizacao()
+        self.master.destroy()
+
+    # Vendas offline (diário do posto)
+    def parar_sincronizacao(self):
+        # As vendas ainda por enviar ficam no diário para a próxima sessão
+        if self.sincronizador:
+            self.sincronizador.parar()
+            self.sincronizador = None
+
+    def atualizar_estado_diario(self):
+        if not self.winfo_exists() or not self.sincronizador:
+            return
+        contagens = self.diario.contagens()
+        linhas = []
+        if contagens.get(PENDENTE):
+            linhas.append(f"{contagens[PENDENTE]} venda(s) por enviar")
+        por_rever = sum(contagens.get(e, 0) for e in POR_REVER)
+        if por_rever:
+            linhas.append(f"{por_rever} por rever")
+        if self.sincronizador.erro:
+            linhas.append("Sem ligação à BD")
+        self.lbl_diario.config(text="\n".join(linhas))
+        self.after(2000, self.atualizar_estado_diario)
 
     # Telas
     def open_clientes(self):
@@ -430,8 +1307,8 @@ class MainApp(tk.Tk):
 
         self.lbl_title.config(text="Clientes")
         self.search.delete(0,tk.END)
-        self.populate_tree(("ID","Nome","Telefone","Email"), self.db.consultar_clientes())
-        self.set_buttons(self.cad_cli, self.alt_cli, self.exc_cli)
+        self.populate_tree(("ID","Nome","Telefone","Email"), self.fonte_paginas("Clientes"))
+        self.set_buttons(self.cad_cli, self.alt_cli, self.exc_cli, ("Importar CSV", functools.partial(self.importar, "clientes")))
 
     def open_produtos(self):
         self.limpar_tela_extra()
@@ -439,8 +1316,9 @@ class MainApp(tk.Tk):
 
         self.lbl_title.config(text="Produtos")
         self.search.delete(0,tk.END)
-        self.populate_tree(("ID","Produto","Categoria","Marca","Preço","Qtd"), self.db.consultar_produtos())
-        self.set_buttons(self.cad_prod, self.alt_prod, self.exc_prod)
+        self.populate_tree(("ID","Produto","Categoria","Marca","Preço","Qtd","Código"), self.fonte_paginas("Produtos"))
+        self.set_buttons(self.cad_prod, self.alt_prod, self.exc_prod, ("Importar CSV", functools.partial(self.importar, "produtos")),
+                         ("Entrada", self.entrada_stock), ("Stock", self.open_stock))
 
     def open_funcionarios(self):
         self.limpar_tela_extra()
@@ -448,7 +1326,7 @@ class MainApp(tk.Tk):
 
         self.lbl_title.config(text="Funcionários")
         self.search.delete(0,tk.END)
-        self.populate_tree(("ID","Nome","User","Cargo"), self.db.consultar_funcionarios())
+        self.populate_tree(("ID","Nome","User","Cargo"), self.fonte_paginas("Funcionários"))
         self.set_buttons(self.cad_func, self.alt_func, self.exc_func)
 
     def open_encomendas(self):
@@ -457,10 +1335,9 @@ class MainApp(tk.Tk):
 
         self.lbl_title.config(text="Encomendas")
         self.search.delete(0,tk.END)
-        filtro = None if self.user['cargo']=="Admin" else self.user['id']
-        data = self.db.consultar_encomendas(filtro)
-        self.populate_tree(("ID","Data","Cliente","Vendedor","Total"), data)
-        self.set_buttons(self.cad_enc, self.alt_enc, self.exc_enc)
+        self.populate_tree(("ID","Data","Cliente","Vendedor","Total"), self.fonte_paginas("Encomendas"))
+        extras = [("Exportar", self.exportar)] if self.user['cargo'] == "Admin" else []
+        self.set_buttons(self.cad_enc, self.alt_enc, self.exc_enc, *extras)
 
     def open_relatorios(self):
         self.limpar_tela_extra()
@@ -485,59 +1362,152 @@ class MainApp(tk.Tk):
             font=("Arial", 12, "bold")
         ).pack(side="left", padx=5)
 
-        funcionarios = self.db.consultar_funcionarios()
-        # Mapeia Nome -> ID
-        self.func_map = {f[1]: f[0] for f in funcionarios}
+        # Mapeia Nome -> ID (preenchido quando a lista de funcionários chegar)
+        self.func_map = {}
 
         self.cb_func = ttk.Combobox(
             self.relatorio_frame,
-            values=["Todos"] + list(self.func_map.keys()),
+            values=["Todos"],
             state="readonly",
             width=30
         )
         self.cb_func.set("Todos")
         self.cb_func.pack(side="left", padx=5)
+        self.trabalhador.pedir(self.db.consultar_funcionarios, canal="funcionarios",
+                               ao_terminar=self.preencher_funcionarios_relatorio)
 
         # Evento: Quando mudar o funcionário na combobox, atualiza a tabela automaticamente
         self.cb_func.bind("<<ComboboxSelected>>", lambda e: self.atualizar_relatorio_funcionario())
 
-        # Botão para Gerar Gráfico
-        tk.Button(
-            self.relatorio_frame,
-            text="📊 Ver Gráfico Mensal",
-            command=self.open_grafico_vendas,
-            bg=SECONDARY_COLOR,
-            fg=TEXT_COLOR,
-            font=("Arial", 11, "bold"),
-            relief="flat"
-        ).pack(side="left", padx=10)
-
-        # Configurar a Tabela (Treeview) para mostrar Resumo
-        self.tree.delete(*self.tree.get_children())
-        columns = ("Funcionário", "Qtd Encomendas", "Total Vendido (€)")
-        self.tree["columns"] = columns
-        self.tree["displaycolumns"] = "#all"
+        # Período e funcionários do gráfico (Ctrl/Shift para comparar vários)
+        tk.Label(self.relatorio_frame, text="Período:", bg=BG_COLOR, fg=PRIMARY_COLOR,
+                 font=("Arial", 12, "bold")).pack(side="left", padx=5)
+        self.cb_periodo = ttk.Combobox(self.relatorio_frame, values=PERIODOS, state="readonly", width=16)
+        self.cb_periodo.set(PERIODOS[0])
+        self.cb_periodo.pack(side="left", padx=5)
+        self.cb_periodo.bind("<<ComboboxSelected>>", lambda e: self.mudar_periodo_relatorio())
+        tk.Label(self.relatorio_frame, text="Comparar:", bg=BG_COLOR, fg=PRIMARY_COLOR,
+                 font=("Arial", 12, "bold")).pack(side="left", padx=5)
+        self.lb_comparar = tk.Listbox(self.relatorio_frame, selectmode="extended", height=4, width=24,
+                                      exportselection=False)
+        self.lb_comparar.pack(side="left", padx=5)
+        self.lb_comparar.bind("<<ListboxSelect>>", lambda e: self.atualizar_grafico())
+        # CodFunc de cada linha da lista (None = total de todos)
+        self.opcoes_comparar = [None]
+        self.lb_comparar.insert("end", "Todos")
+
+        if self.grafico is None:
+            self.grafico = GraficoVendas(self.main)
+        self.grafico.widget.pack(after=self.relatorio_frame, fill="x", pady=(0, 10))
+
+        # Separadores da tabela: Resumo (por funcionário) e os relatórios da análise
+        self.separadores = ttk.Notebook(self.main)
+        for nome in SEPARADORES_RELATORIOS:
+            self.separadores.add(tk.Frame(self.separadores, height=0, bg=BG_COLOR), text=nome)
+        self.separadores.pack(after=self.grafico.widget, fill="x")
+        self.separadores.bind("<<NotebookTabChanged>>", lambda e: self.atualizar_tabela_relatorio())
         self.tree["show"] = "headings"
 
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=200, anchor=tk.CENTER)
-
         # Carrega os dados iniciais
         self.atualizar_relatorio_funcionario()
 
-    def atualizar_relatorio_funcionario(self):
-        # Limpa a tabela atual
-        self.tree.delete(*self.tree.get_children())
+    def preencher_funcionarios_relatorio(self, funcionarios):
+        if self.lbl_title["text"] != "Relatórios de Vendas":
+            return
+        self.func_map = {f[1]: f[0] for f in funcionarios}
+        self.cb_func["values"] = ["Todos"] + list(self.func_map.keys())
+        self.opcoes_comparar = [None] + list(self.func_map.values())
+        self.lb_comparar.insert("end", *self.func_map.keys())
+        self.atualizar_grafico()
 
+    def atualizar_relatorio_funcionario(self):
         escolha = self.cb_func.get()
         cod_func = None
 
         if escolha != "Todos" and escolha in self.func_map:
             cod_func = self.func_map[escolha]
 
-        # Busca dados no banco (Resumo total por funcionário)
-        dados = self.db.resumo_vendas_funcionarios(cod_func)
+        if self.separador_relatorio() == "Resumo":
+            self.atualizar_tabela_relatorio()
+
+        # O gráfico passa a mostrar só o funcionário escolhido
+        self.lb_comparar.selection_clear(0, "end")
+        self.lb_comparar.selection_set(self.opcoes_comparar.index(cod_func) if cod_func in self.opcoes_comparar else 0)
+        self.atualizar_grafico()
+
+    def separador_relatorio(self):
+        return self.separadores.tab("current", "text") if self.separadores else None
+
+    def mudar_periodo_relatorio(self):
+        self.atualizar_grafico()
+        if self.separador_relatorio() != "Resumo":
+            self.atualizar_tabela_relatorio()
+
+    def atualizar_tabela_relatorio(self):
+        separador = self.separador_relatorio()
+        if separador is None:
+            return
+        self._paginas = None
+        self.tree.delete(*self.tree.get_children())
+        if separador == "Resumo":
+            # Configurar a Tabela (Treeview) para mostrar Resumo
+            columns = ("Funcionário", "Qtd Encomendas", "Total Vendido (€)")
+            self.tree["columns"] = columns
+            self.tree["displaycolumns"] = "#all"
+            for col in columns:
+                self.tree.heading(col, text=col)
+                self.tree.column(col, width=200, anchor=tk.CENTER)
+            escolha = self.cb_func.get()
+            # Busca dados no banco (Resumo total por funcionário)
+            self.trabalhador.pedir(self.db.resumo_vendas_funcionarios, self.func_map.get(escolha), canal="tabela",
+                                   ao_terminar=functools.partial(self.mostrar_relatorio_funcionario, escolha))
+            return
+        inicio, fim = intervalo_periodo(self.cb_periodo.get())
+        self.trabalhador.pedir(self.calcular_analise, separador, inicio, fim, canal="tabela",
+                               ao_terminar=functools.partial(self.mostrar_analise, separador))
+
+    def calcular_analise(self, separador, inicio, fim):
+        # Corre na thread da BD. O numpy só se importa aqui, no primeiro separador analítico.
+        if self.analise is None:
+            from analise import AnaliseVendas
+            self.analise = AnaliseVendas(self.db)
+        return self.analise.relatorio(separador, inicio, fim)
+
+    def mostrar_analise(self, separador, resultado):
+        if self.separador_relatorio() != separador:
+            return
+        columns, linhas = resultado
+        self.populate_tree(columns, linhas)
+
+    def atualizar_grafico(self):
+        selecionados = [self.opcoes_comparar[i] for i in self.lb_comparar.curselection()] or [None]
+        inicio, fim = intervalo_periodo(self.cb_periodo.get())
+        # Uma só consulta para todas as séries; com "Todos" vêm todos os funcionários
+        cods = None if None in selecionados else tuple(sorted(selecionados))
+        self.trabalhador.pedir(self.ler_series, cods, inicio, fim, canal="grafico",
+                               ao_terminar=functools.partial(self.desenhar_grafico, selecionados))
+
+    def ler_series(self, cods, inicio, fim):
+        # Na thread da BD: com o ClienteBD até a versão dos dados é um pedido ao servidor.
+        # A cache das séries só é usada aqui, por isso fica sempre na mesma thread.
+        versao = self.db.versao_dados()
+        linhas = self.series_vendas.obter(cods, inicio, fim, versao)
+        if linhas is None:
+            linhas = self.db.vendas_mensais_funcionarios(cods, inicio, fim)
+            self.series_vendas.guardar(cods, inicio, fim, versao, linhas)
+        return linhas
+
+    def desenhar_grafico(self, selecionados, linhas):
+        if self.lbl_title["text"] != "Relatórios de Vendas":
+            return
+        nomes = {cod: nome for nome, cod in self.func_map.items()}
+        meses, series = montar_series(linhas, nomes, selecionados)
+        titulo = "Evolução de Vendas" if len(series) > 1 else f"Evolução de Vendas - {series[0][0]}"
+        self.grafico.mostrar(titulo, meses, series)
+
+    def mostrar_relatorio_funcionario(self, escolha, dados):
+        # Limpa a tabela atual
+        self.tree.delete(*self.tree.get_children())
 
         total_geral = 0
         for nome, qtd, total in dados:
@@ -548,50 +1518,174 @@ class MainApp(tk.Tk):
         if escolha == "Todos" and dados:
             self.tree.insert("", "end", values=("TOTAL GERAL", "", f"{total_geral:.2f} €"))
 
-    def open_grafico_vendas(self):
-        escolha = self.cb_func.get()
-
-        if escolha == "Todos":
-            messagebox.showwarning("Aviso",
-                                   "Por favor, selecione um funcionário específico para ver a evolução mensal.")
-            return
-
-        cod_func = self.func_map[escolha]
+    # Diagnóstico (só Admin): métodos e consultas que mais tempo gastaram, ver diagnostico.py
+    def open_diagnostico(self):
+        self.limpar_tela_extra()
+        self.search_frame.pack_forget()
+        for widget in self.btn_frame.winfo_children():
+            widget.destroy()
+        self.lbl_title.config(text="Diagnóstico")
 
-        # Busca dados cronológicos (Mês a Mês)
-        dados = self.db.vendas_por_funcionario_mes(cod_func)
+        self.relatorio_frame = tk.Frame(self.main, bg=BG_COLOR)
+        self.relatorio_frame.pack(fill="x", pady=10)
+        self.cb_diag = ttk.Combobox(self.relatorio_frame, values=["Métodos", "Consultas SQL"], state="readonly", width=20)
+        self.cb_diag.set("Métodos")
+        self.cb_diag.pack(side="left", padx=5)
+        self.cb_diag.bind("<<ComboboxSelected>>", lambda e: self.atualizar_diagnostico())
+        self.lbl_diag = tk.Label(self.relatorio_frame, text="", bg=BG_COLOR, fg=PRIMARY_COLOR, font=("Arial", 11))
+        self.lbl_diag.pack(side="left", padx=10)
+
+        b_style = {"bg": BUTTON_BG, "fg": TEXT_COLOR, "width": 12, "font": ("Arial", 12, "bold"), "relief": "flat"}
+        tk.Button(self.btn_frame, text="Atualizar", command=self.atualizar_diagnostico, **b_style).pack(side="left", padx=10)
+        tk.Button(self.btn_frame, text="Limpar", command=self.limpar_diagnostico, **b_style).pack(side="left", padx=10)
+        tk.Button(self.btn_frame, text="Ligar/Desligar", command=self.alternar_diagnostico, **b_style).pack(side="left", padx=10)
+
+        self._paginas = None
+        self.trabalhador.cancelar("tabela")
+        columns = ("Nome", "Chamadas", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Total (ms)", "Linhas")
+        self.tree["columns"] = columns
+        self.tree["displaycolumns"] = "#all"
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=90, anchor=tk.CENTER)
+        self.tree.column("Nome", width=420, anchor="w")
+        self.atualizar_diagnostico()
 
-        if not dados:
-            messagebox.showinfo("Informação", f"O funcionário {escolha} não possui vendas registadas.")
+    def atualizar_diagnostico(self):
+        self.tree.delete(*self.tree.get_children())
+        instr = self.db.instrumentacao
+        if not instr:
+            self.lbl_diag.config(text="Instrumentação desligada (arranque com --diagnostico ou Ligar/Desligar)")
             return
+        self.lbl_diag.config(text=f"Consultas acima de {instr.limite_lento_ms} ms em {instr.log_lento}")
+        metodos = self.cb_diag.get() == "Métodos"
+        for r in instr.top_metodos(100) if metodos else instr.top_consultas(100):
+            nome = r["nome"] if metodos else r["nome"][:150]
+            self.tree.insert("", "end", values=(nome, r["chamadas"], f"{r['p50_ms']:.2f}", f"{r['p95_ms']:.2f}",
+                                                f"{r['p99_ms']:.2f}", f"{r['total_ms']:.1f}",
+                                                r["linhas"] if metodos else r["passos"]))
+
+    def limpar_diagnostico(self):
+        if self.db.instrumentacao:
+            self.db.instrumentacao.limpar()
+        self.atualizar_diagnostico()
+
+    def alternar_diagnostico(self):
+        if self.db.instrumentacao:
+            self.db.desinstrumentar()
+        else:
+            from diagnostico import Instrumentacao
+            self.db.instrumentar(Instrumentacao())
+        self.atualizar_diagnostico()
 
-        # Prepara dados para o Matplotlib
-        meses = [row[0] for row in dados]  # Eixo X (2025-01, 2025-02...)
-        totais = [row[1] for row in dados]  # Eixo Y (Valores)
-
-        # Criação do Gráfico
-        plt.figure(figsize=(10, 6))
-
-        # Linha com marcadores
-        plt.plot(meses, totais, marker='o', linestyle='-', color='#5D1B8B', linewidth=2, label='Vendas (€)')
-
-        # Preencher área abaixo da linha (opcional, fica bonito)
-        plt.fill_between(meses, totais, color='#CCB4BE', alpha=0.4)
+    def open_vendas_offline(self):
+        self.limpar_tela_extra()
+        self.search_frame.pack_forget()
+        for widget in self.btn_frame.winfo_children():
+            widget.destroy()
+        self.lbl_title.config(text="Vendas offline")
+        b_style = {"bg": BUTTON_BG, "fg": TEXT_COLOR, "width": 12, "font": ("Arial", 12, "bold"), "relief": "flat"}
+        tk.Button(self.btn_frame, text="Sincronizar", command=self.sincronizar_agora, **b_style).pack(side="left", padx=10)
+        tk.Button(self.btn_frame, text="Tentar de novo", command=self.repetir_vendas_offline, **b_style).pack(side="left", padx=10)
+        if self.user['cargo'] == "Admin":
+            tk.Button(self.btn_frame, text="Descartar", command=self.descartar_vendas_offline, **b_style).pack(side="left", padx=10)
+
+        self._paginas = None
+        self.trabalhador.cancelar("tabela")
+        linhas = []
+        for id_venda, criada, data, cli, func, total, estado, detalhe in self.diario.por_rever():
+            if estado == CONFLITO:
+                detalhe = "; ".join(f"produto ID {cod}: pedido {q}, disponível {disp}"
+                                    for cod, q, disp in json.loads(detalhe))
+            linhas.append((id_venda, criada.replace("T", " "), data, cli, func, f"{total:.2f} €", estado, detalhe))
+        columns = ("IdVenda", "Feita em", "Data", "Cliente", "Funcionário", "Total", "Estado", "Detalhe")
+        self.populate_tree(columns, linhas, display_cols=columns[1:])
+        self.tree.column("Detalhe", width=360, anchor="w")
+
+    def vendas_offline_selecionadas(self):
+        # tree.set devolve o texto tal como foi inserido (os "values" convertem ids só com dígitos)
+        ids = [self.tree.set(i, "IdVenda") for i in self.tree.selection()]
+        if not ids:
+            messagebox.showwarning("Aviso", "Selecione uma ou mais vendas")
+        return ids
+
+    def sincronizar_agora(self):
+        self.sincronizador.acordar()
+        self.after(1000, lambda: self.lbl_title["text"] == "Vendas offline" and self.open_vendas_offline())
+
+    def repetir_vendas_offline(self):
+        ids = self.vendas_offline_selecionadas()
+        if ids:
+            self.diario.repetir(ids)
+            self.sincronizar_agora()
+
+    def descartar_vendas_offline(self):
+        ids = self.vendas_offline_selecionadas()
+        if ids and messagebox.askyesno("Descartar", f"Descartar {len(ids)} venda(s)? Não serão gravadas."):
+            self.diario.descartar(ids)
+            self.open_vendas_offline()
+
+    def open_stock(self):
+        self.limpar_tela_extra()
+        self.search_frame.pack_forget()
+        for widget in self.btn_frame.winfo_children():
+            widget.destroy()
+        self.lbl_title.config(text="Stock")
 
-        plt.title(f"Evolução de Vendas - {escolha}", fontsize=14, fontweight='bold')
-        plt.xlabel("Mês", fontsize=12)
-        plt.ylabel("Total Vendido (€)", fontsize=12)
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.xticks(rotation=45)  # Roda as datas para não sobrepor
-        plt.tight_layout()
+        self.relatorio_frame = tk.Frame(self.main, bg=BG_COLOR)
+        self.relatorio_frame.pack(fill="x", pady=10)
+        tk.Label(self.relatorio_frame, text="Stock no fim do dia (AAAA-MM-DD):", bg=BG_COLOR, fg=PRIMARY_COLOR,
+                 font=("Arial", 11)).pack(side="left", padx=5)
+        self.ent_data_stock = tk.Entry(self.relatorio_frame, width=12)
+        self.ent_data_stock.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        self.ent_data_stock.pack(side="left", padx=5)
+        self.ent_data_stock.bind("<Return>", lambda e: self.atualizar_stock())
+        self.lbl_stock = tk.Label(self.relatorio_frame, text="", bg=BG_COLOR, fg=PRIMARY_COLOR, font=("Arial", 11))
+        self.lbl_stock.pack(side="left", padx=10)
+
+        b_style = {"bg": BUTTON_BG, "fg": TEXT_COLOR, "width": 12, "font": ("Arial", 12, "bold"), "relief": "flat"}
+        tk.Button(self.btn_frame, text="Ver", command=self.atualizar_stock, **b_style).pack(side="left", padx=10)
+        tk.Button(self.btn_frame, text="Movimentos", command=self.movimentos_produto, **b_style).pack(side="left", padx=10)
+        if self.user['cargo'] == "Admin":
+            tk.Button(self.btn_frame, text="Reconciliar", command=self.reconciliar_stock, **b_style).pack(side="left", padx=10)
+        tk.Button(self.btn_frame, text="Produtos", command=self.open_produtos, **b_style).pack(side="left", padx=10)
+        self.atualizar_stock()
 
-        # Adiciona os valores em cima dos pontos
-        for i, txt in enumerate(totais):
-            plt.annotate(f"{txt:.0f}€", (meses[i], totais[i]), textcoords="offset points", xytext=(0, 10), ha='center')
+    def atualizar_stock(self):
+        data = self.ent_data_stock.get().strip()
+        try:
+            datetime.strptime(data, "%Y-%m-%d")
+        except ValueError:
+            return messagebox.showwarning("Aviso", "Data inválida (use AAAA-MM-DD).")
+        self.lbl_stock.config(text="")
+        self.populate_tree(("ID", "Produto", "Marca", "Stock"), functools.partial(self.db.stock_em, data))
 
-        plt.show()
+    def movimentos_produto(self):
+        sel = self.tree.selection()
+        if not sel or "Produto" not in self.tree["columns"]:
+            return messagebox.showwarning("Aviso", "Selecione um produto.")
+        cod, nome = self.tree.set(sel[0], "ID"), self.tree.set(sel[0], "Produto")
+        self.lbl_stock.config(text=f"Movimentos de {nome}")
+        self.populate_tree(("Mov", "Data", "Tipo", "Qtd", "Encomenda", "Nota"),
+                           functools.partial(self.db.movimentos_stock, int(cod)))
+        self.tree.column("Nota", width=200, anchor="w")
+
+    def reconciliar_stock(self):
+        self.trabalhador.pedir(self.db.reconciliar_stock, canal="tabela", ao_terminar=self.mostrar_reconciliacao)
+
+    def mostrar_reconciliacao(self, divergentes):
+        if not divergentes:
+            return messagebox.showinfo("Reconciliação", "O stock de todos os produtos coincide com o livro.")
+        self.lbl_stock.config(text=f"{len(divergentes)} produto(s) com stock diferente do livro")
+        self.populate_tree(("ID", "Produto", "Stock", "Livro"), divergentes)
+        if messagebox.askyesno("Reconciliação", f"{len(divergentes)} produto(s) com stock diferente do livro.\n\n"
+                                                "Registar ajustes para o livro ficar igual ao stock dos produtos?"):
+            self.trabalhador.pedir(self.db.reconciliar_stock, acertar=True, canal="tabela",
+                                   ao_terminar=lambda r: (messagebox.showinfo("Reconciliação", f"{len(r)} ajuste(s) registado(s)."),
+                                                          self.atualizar_stock()))
 
     def populate_tree(self, columns, data, display_cols=None):
+        # data: lista de linhas, ou função apos -> página seguinte (só se carrega o que se vê)
         self.tree.delete(*self.tree.get_children())
         self.tree["displaycolumns"] = "#all"
         self.tree["columns"] = columns
@@ -599,12 +1693,51 @@ class MainApp(tk.Tk):
         for c in columns:
             self.tree.heading(c, text=c)
             self.tree.column(c, width=120, anchor=tk.CENTER)
+        self.tree.yview_moveto(0)
+        if callable(data):
+            self._paginas = data
+            self._ultima_chave = None
+            self._fim_paginas = False
+            self.carregar_mais()
+        else:
+            self._paginas = None
+            self.trabalhador.cancelar("tabela")
+            self.inserir_linhas(data)
+
+    def inserir_linhas(self, data):
         for row in data:
             if self.lbl_title["text"]=="Encomendas":
                 row_list = list(row); row_list[4]=f"{row_list[4]:.2f} €"
                 self.tree.insert("", "end", values=tuple(row_list))
             else:
-                self.tree.insert("", "end", values=row)
+                # NULL (ex.: produto sem código de barras) aparece vazio e não como "None"
+                self.tree.insert("", "end", values=tuple("" if v is None else v for v in row))
+
+    def carregar_mais(self):
+        if self._paginas is None or self._fim_paginas:
+            self._pagina_pedida = False
+            return
+        # Fica pedida até chegar; um populate_tree novo cancela-a (canal "tabela")
+        self._pagina_pedida = True
+        self.trabalhador.pedir(self._paginas, apos=self._ultima_chave, canal="tabela",
+                               ao_terminar=self.receber_pagina)
+
+    def receber_pagina(self, rows):
+        if self._inicio is not None:
+            marcar_arranque("primeira página de dados (desde o login)", self._inicio)
+            self._inicio = None
+        self._pagina_pedida = False
+        if len(rows) < self.db.TAMANHO_PAGINA:
+            self._fim_paginas = True
+        if rows:
+            self._ultima_chave = rows[-1][0]
+        self.inserir_linhas(rows)
+
+    def ao_rolar_tree(self, first, last):
+        self.tree_scroll.set(first, last)
+        # Últimos 10% visíveis: pede a página seguinte assim que o Tk estiver livre
+        if self._paginas is not None and not self._fim_paginas and float(last) > 0.9 and not self._pagina_pedida:
+            self.carregar_mais()
 
     # Ações
         # Dentro da classe App:
@@ -635,18 +1768,22 @@ class MainApp(tk.Tk):
         if not messagebox.askyesno("Apagar", f"Tem a certeza que deseja apagar {len(selecionados)} cliente(s)?"):
             return
 
+        nomes = {self.tree.item(i, 'values')[0]: self.tree.item(i, 'values')[1] for i in selecionados}
         try:
-            for item_id in selecionados:
-                valores = self.tree.item(item_id, 'values')
-                id_cli = valores[0]
-                # Nota: Se o cliente tiver encomendas, o DB pode dar erro.
-                # O ideal é envolver num try/except ou garantir que apaga as encomendas antes.
-                self.db.excluir_cliente(id_cli)
-
-            self.open_clientes()
-            messagebox.showinfo("Sucesso", "Clientes apagados com sucesso!")
+            # Tudo numa só transação; clientes com encomendas não são apagados
+            relatorio = self.db.excluir_clientes(nomes.keys())
         except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao apagar (possivelmente o cliente tem encomendas):\n{e}")
+            return messagebox.showerror("Erro", f"Erro ao apagar:\n{e}")
+
+        self.open_clientes()
+        apagados = sum(1 for estado in relatorio.values() if estado == "apagado")
+        bloqueados = [nomes[str(cod)] for cod, estado in relatorio.items() if estado == "bloqueado"]
+        if not bloqueados:
+            messagebox.showinfo("Sucesso", f"{apagados} cliente(s) apagado(s) com sucesso!")
+        else:
+            messagebox.showwarning("Relatório de Exclusão",
+                                   f"{apagados} apagado(s).\n\n{len(bloqueados)} não puderam ser apagados "
+                                   f"(têm encomendas):\n" + ", ".join(bloqueados))
 
         # Procure onde está "def cad_prod(self):" dentro da classe App e substitua por:
 
@@ -658,10 +1795,27 @@ class MainApp(tk.Tk):
         if not sel:
             return messagebox.showwarning("Aviso", "Selecione um produto para editar.")
 
-        # Pega os dados da linha selecionada
-        dados = self.tree.item(sel[0], 'values')
+        # Pega os dados da linha selecionada como texto: os "values" convertem o que só tem dígitos em
+        # int e um código de barras como 0012345678905 perdia os zeros à esquerda ao gravar
+        dados = tuple(self.tree.set(sel[0], col) for col in self.tree["columns"])
         ProdutoPopup(self, self.db, dados)
 
+    def entrada_stock(self):
+        # Receção de mercadoria: fica no livro como movimento de entrada
+        sel = self.tree.selection()
+        if not sel:
+            return messagebox.showwarning("Aviso", "Selecione um produto.")
+        cod, nome = self.tree.item(sel[0], 'values')[:2]
+        quantidade = simpledialog.askinteger("Entrada de stock", f"Unidades recebidas de {nome}:", parent=self, minvalue=1)
+        if not quantidade:
+            return
+        try:
+            novo = self.db.movimentar_stock(int(cod), quantidade, "entrada", "receção")
+        except ValueError as e:
+            return messagebox.showerror("Erro", str(e))
+        self.open_produtos()
+        messagebox.showinfo("Sucesso", f"Stock de {nome}: {novo}")
+
     def exc_prod(self):
         # 1. Pega TODOS os itens selecionados
         sel = self.tree.selection()
@@ -676,25 +1830,11 @@ class MainApp(tk.Tk):
         if not resp:
             return
 
-        # Variáveis para relatório final
-        apagados = 0
-        nao_apagados = []
-
-        # 3. Loop para tentar apagar cada um
-        for item_id in sel:
-            # Pega os dados da linha
-            valores = self.tree.item(item_id, 'values')
-            cod_prod = valores[0]
-            nome_prod = valores[1]
-
-            # Tenta apagar no banco
-            sucesso = self.db.excluir_produto(cod_prod)
-
-            if sucesso:
-                apagados += 1
-            else:
-                # Se falhar (por ter vendas associadas), guarda o nome na lista
-                nao_apagados.append(nome_prod)
+        # 3. Apaga todos numa só transação (os que já têm vendas ficam)
+        nomes = {self.tree.item(i, 'values')[0]: self.tree.item(i, 'values')[1] for i in sel}
+        relatorio = self.db.excluir_produtos(nomes.keys())
+        apagados = sum(1 for estado in relatorio.values() if estado == "apagado")
+        nao_apagados = [nomes[str(cod)] for cod, estado in relatorio.items() if estado == "bloqueado"]
 
         # 4. Atualiza a tabela visualmente
         self.open_produtos()
@@ -734,26 +1874,22 @@ class MainApp(tk.Tk):
         if not resp:
             return
 
-        apagados_count = 0
-        erro_proprio = False
-
-        for item_id in selecionados:
-            valores = self.tree.item(item_id, 'values')
-            cod_func = valores[0]
-
-                # Proteção: Não apagar o próprio usuário logado
-            if int(cod_func) == self.user['id']:
-                erro_proprio = True
-                continue
-
-            self.db.excluir_funcionario(cod_func)
-            apagados_count += 1
+        ids = [self.tree.item(i, 'values')[0] for i in selecionados]
+        # Proteção: Não apagar o próprio usuário logado
+        erro_proprio = any(int(cod) == self.user['id'] for cod in ids)
+        relatorio = self.db.excluir_funcionarios([cod for cod in ids if int(cod) != self.user['id']])
+        apagados_count = sum(1 for estado in relatorio.values() if estado == "apagado")
+        bloqueados = sum(1 for estado in relatorio.values() if estado == "bloqueado")
 
             # Atualiza tabela
         self.open_funcionarios()
 
             # Mensagens finais
-        if erro_proprio:
+        if bloqueados:
+            messagebox.showwarning("Aviso",
+                                   f"{apagados_count} funcionário(s) apagado(s). {bloqueados} não puderam ser "
+                                   f"apagados porque têm encomendas registadas.")
+        elif erro_proprio:
             messagebox.showwarning("Aviso",
                                    "Alguns utilizadores foram apagados, mas você não pode apagar o seu próprio login!")
         elif apagados_count > 0:
@@ -769,18 +1905,11 @@ class MainApp(tk.Tk):
         nenc = d[0]
 
         # Buscar detalhes da encomenda
-        conn = self.db.connect()
-        c = conn.cursor()
-        c.execute("SELECT CodCli, DataEnc FROM Encomendas WHERE NEnc=?", (nenc,))
-        encomenda_info = c.fetchone()
-        cod_cli, data_enc = encomenda_info
-
-        c.execute("""SELECT I.CodProd, P.Produto, I.Quant, I.PrecoUnitario
-                     FROM ItensEncomenda I
-                     JOIN Produtos P ON I.CodProd = P.CodProd
-                     WHERE I.NEnc=?""", (nenc,))
-        itens = c.fetchall()
-        conn.close()
+        self.trabalhador.pedir(lambda: (self.db.obter_encomenda(nenc), self.db.consultar_itens_encomenda(nenc)),
+                               canal="detalhes", ao_terminar=functools.partial(self.mostrar_encomenda, nenc))
+
+    def mostrar_encomenda(self, nenc, dados):
+        (cod_cli, data_enc, cli_name), itens = dados
 
         # popup
         win = tk.Toplevel(self)
@@ -791,8 +1920,6 @@ class MainApp(tk.Tk):
         # Cliente e data
         tk.Label(win, text="Cliente:", bg=BG_COLOR, fg=PRIMARY_COLOR, font=("Arial", 12, "bold")).pack(anchor="w",
                                                                                                        padx=10, pady=5)
-        clientes = self.db.consultar_clientes()
-        cli_name = next(c[1] for c in clientes if c[0] == cod_cli)
         tk.Label(win, text=cli_name, bg=BG_COLOR, font=("Arial", 12)).pack(anchor="w", padx=20)
 
         tk.Label(win, text="Data:", bg=BG_COLOR, fg=PRIMARY_COLOR, font=("Arial", 12, "bold")).pack(anchor="w", padx=10,
@@ -831,15 +1958,10 @@ class MainApp(tk.Tk):
         if not messagebox.askyesno("Apagar", f"Tem a certeza que deseja apagar {qtd} encomenda(s)?"):
             return
 
-        # 4. Loop para apagar um por um
+        # 4. Apaga todas numa só transação (o stock é reposto de uma vez)
         try:
-            for item_id in selecionados:
-                # Pega os valores da linha (o ID geralmente é o primeiro item, índice 0)
-                valores = self.tree.item(item_id, 'values')
-                id_encomenda = valores[0]
-
-                # Chama a função de apagar do banco
-                self.db.excluir_encomenda(id_encomenda)
+            ids = [self.tree.item(item_id, 'values')[0] for item_id in selecionados]
+            self.db.excluir_encomendas(ids)
 
             # 5. Atualiza a tela
             messagebox.showinfo("Sucesso", "Encomendas apagadas com sucesso!")
@@ -851,5 +1973,141 @@ class MainApp(tk.Tk):
 
 # execução
 if __name__=="__main__":
-    db=MaquilhagemDB()
-    LoginWindow(db).mainloop()
+    parser = argparse.ArgumentParser(description="Sistema de Gestão de Maquilhagem")
+    parser.add_argument("--db", default="maquilhagem.db", help="Ficheiro da base de dados")
+    parser.add_argument("--multi-terminal", action="store_true",
+                        help="Vários postos de venda na mesma BD (WAL + retry em escritas)")
+    parser.add_argument("--busy-timeout", type=float, default=5.0,
+                        help="Segundos a esperar por um lock antes de desistir")
+    parser.add_argument("--pesquisa", choices=("fts", "memoria"), default="fts",
+                        help="Pesquisa pelo índice FTS5 ou por uma cópia em memória de cada ecrã")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Mostra os tempos de arranque até à primeira pintura da janela")
+    parser.add_argument("--diagnostico", action="store_true",
+                        help="Mede os métodos e as consultas (ecrã Diagnóstico; resumo no fim dos comandos)")
+    parser.add_argument("--lento-ms", type=float, default=200,
+                        help="Consultas acima deste tempo vão para o log de consultas lentas")
+    parser.add_argument("--log-lento", default="consultas_lentas.log", help="Log rotativo das consultas lentas")
+    parser.add_argument("--servidor", help="Usa o serviço (comando serve) em vez de abrir a BD, ex.: http://127.0.0.1:8765")
+    parser.add_argument("--diario", help="Diário local das vendas, enviadas à BD em segundo plano "
+                                         "(por omissão vendas_pendentes.db com --servidor)")
+    comandos = parser.add_subparsers(dest="comando")
+    comandos.add_parser("plano", help="Mostra o EXPLAIN QUERY PLAN de todas as consultas")
+    cmd_totais = comandos.add_parser("totais", help="Verifica os totais guardados nas encomendas")
+    cmd_totais.add_argument("--corrigir", action="store_true", help="Recalcula os totais a partir dos itens")
+    comandos.add_parser("agregados", help="Reconstrói os agregados de vendas dos relatórios")
+    cmd_stock = comandos.add_parser("stock", help="Livro de stock: reconciliar, compactar ou stock numa data")
+    cmd_stock.add_argument("acao", choices=("reconciliar", "compactar", "em"))
+    cmd_stock.add_argument("data", nargs="?", help="AAAA-MM-DD (para em)")
+    cmd_stock.add_argument("--acertar", action="store_true",
+                           help="Regista ajustes para o livro ficar igual ao stock dos produtos")
+    cmd_stock.add_argument("--manter-dias", type=int,
+                           help="Apaga os movimentos já incluídos num corte com mais destes dias")
+    cmd_importar = comandos.add_parser("importar", help="Importa produtos ou clientes de um CSV (upsert)")
+    cmd_importar.add_argument("tipo", choices=("produtos", "clientes"))
+    cmd_importar.add_argument("ficheiro")
+    cmd_importar.add_argument("--rejeitados", help="CSV para as linhas inválidas (por omissão <ficheiro>.rejeitados.csv)")
+    cmd_importar.add_argument("--lote", type=int, default=1000, help="Linhas por transação")
+    cmd_exportar = comandos.add_parser("exportar", help="Exporta as linhas de encomenda (CSV/JSON Lines, .gz)")
+    cmd_exportar.add_argument("ficheiro", help="Destino; o formato sai da extensão (.csv, .jsonl, + .gz)")
+    cmd_exportar.add_argument("--formato", choices=("csv", "jsonl"))
+    cmd_exportar.add_argument("--gzip", action="store_true", default=None, help="Comprime mesmo sem extensão .gz")
+    cmd_exportar.add_argument("--de", help="Data inicial (AAAA-MM-DD)")
+    cmd_exportar.add_argument("--ate", help="Data final (AAAA-MM-DD)")
+    cmd_exportar.add_argument("--funcionario", type=int, help="Só as vendas deste CodFunc")
+    cmd_exportar.add_argument("--apos", type=int, help="Só encomendas com NEnc maior do que este")
+    cmd_exportar.add_argument("--estado", help="Ficheiro com a última NEnc exportada (exportação incremental)")
+    cmd_servir = comandos.add_parser("serve", help="Serviço HTTP/JSON local para os postos partilharem esta BD")
+    cmd_servir.add_argument("--host", default="127.0.0.1", help="0.0.0.0 para aceitar postos de outras máquinas")
+    cmd_servir.add_argument("--porta", type=int, default=8765)
+    cmd_servir.add_argument("--leitores", type=int, default=4, help="Threads (e ligações) de leitura")
+    cmd_servir.add_argument("--lote", type=int, default=64, help="Máximo de escritas por transação")
+    args = parser.parse_args()
+
+    MainApp.modo_pesquisa = args.pesquisa
+    perfil_arranque = args.startup_profile
+    marcar_arranque("imports")
+    # diagnostico (logging, inspect) e servico (asyncio, http) só quando são usados: o arranque
+    # normal da interface não precisa deles
+    instrumentacao = None
+    if args.diagnostico:
+        from diagnostico import Instrumentacao
+        instrumentacao = Instrumentacao(args.lento_ms, args.log_lento)
+    if args.servidor:
+        from servico import ClienteBD
+        if args.comando:
+            parser.error("--servidor só se usa com a interface; os comandos correm no servidor")
+        db = ClienteBD(args.servidor)
+        if instrumentacao:
+            db.instrumentar(instrumentacao)
+    else:
+        # O serviço lê em várias threads enquanto o escritor grava: só em WAL os leitores não esperam
+        # pelos commits, por isso serve liga sempre o modo multi-terminal
+        db=MaquilhagemDB(args.db, multi_terminal=args.multi_terminal or args.comando == "serve",
+                         busy_timeout=args.busy_timeout, instrumentacao=instrumentacao)
+    marcar_arranque("base de dados aberta")
+    try:
+        if args.comando == "plano":
+            relatorio_planos(db)
+        elif args.comando == "totais":
+            divergentes = db.verificar_totais_encomendas(corrigir=args.corrigir)
+            for nenc, guardado, real in divergentes:
+                print(f"Encomenda {nenc}: guardado {guardado:.2f} € / real {real:.2f} €")
+            estado = "corrigidas" if args.corrigir else "divergentes"
+            print(f"{len(divergentes)} encomenda(s) {estado}.")
+        elif args.comando == "agregados":
+            db.reconstruir_agregados()
+            print("Agregados de vendas reconstruídos.")
+        elif args.comando == "stock":
+            if args.acao == "reconciliar":
+                divergentes = db.reconciliar_stock(acertar=args.acertar)
+                for cod, nome, quantidade, livro in divergentes:
+                    print(f"Produto {cod} ({nome}): stock {quantidade} / livro {livro}")
+                estado = "acertado(s)" if args.acertar else "divergente(s)"
+                print(f"{len(divergentes)} produto(s) {estado}.")
+            elif args.acao == "compactar":
+                resumidos, apagados = db.compactar_stock(args.manter_dias)
+                print(f"{resumidos} movimento(s) no novo corte, {apagados} apagado(s).")
+            else:
+                if not args.data:
+                    parser.error("stock em precisa de uma data (AAAA-MM-DD)")
+                apos = None
+                while True:
+                    try:
+                        pagina = db.stock_em(args.data, apos, 1000)
+                    except ValueError as e:
+                        parser.error(str(e))
+                    for cod, nome, marca, stock in pagina:
+                        print(f"{cod}\t{nome}\t{marca or ''}\t{stock}")
+                    if len(pagina) < 1000:
+                        break
+                    apos = pagina[-1][0]
+        elif args.comando == "exportar":
+            apos = args.apos if args.apos is not None else ler_estado(args.estado)
+            r = exportar_encomendas(db, args.ficheiro, args.formato, args.gzip, args.de, args.ate, args.funcionario,
+                                    apos, progresso=lambda n: print(f"\r{n} linhas...", end="", flush=True))
+            print(f"\r{r['linhas']} linha(s) exportada(s) para {args.ficheiro}")
+            if args.estado and r["ultima_nenc"] is not None:
+                gravar_estado(args.estado, r["ultima_nenc"])
+        elif args.comando == "serve":
+            from servico import servir
+            servir(db, args.host, args.porta, args.leitores, args.lote)
+        elif args.comando == "importar":
+            r = importar_csv(db, args.tipo, args.ficheiro, args.rejeitados, tamanho_lote=args.lote,
+                             progresso=lambda r: print(f"\r{r['lidas']} linhas lidas...", end="", flush=True))
+            print(f"\n{r['inseridos']} inserido(s), {r['atualizados']} atualizado(s), {r['rejeitadas']} rejeitada(s).")
+            if r["ficheiro_rejeitados"]:
+                print(f"Linhas rejeitadas em {r['ficheiro_rejeitados']}")
+        else:
+            caminho_diario = args.diario or ("vendas_pendentes.db" if args.servidor else None)
+            if caminho_diario:
+                MainApp.diario = DiarioVendas(caminho_diario)
+            LoginWindow(db)
+            marcar_arranque("janela de login criada")
+            raiz_tk().mainloop()
+        if instrumentacao and args.comando:
+            print("\n" + instrumentacao.relatorio())
+    finally:
+        if MainApp.diario:
+            MainApp.diario.fechar()
+        db.fechar()
@@ -0,0 +1,143 @@
+# ARQUIVO: graficos.py
+# Gráfico de vendas mensais embutido no ecrã Relatórios (matplotlib com o backend do Tk).
+#
+# A figura, o eixo e as linhas são criados uma vez e reutilizados: mudar de funcionário ou de
+# período só troca os dados das linhas e redesenha. Os resultados das consultas ficam em
+# SeriesVendas até à próxima escrita na BD (db.versao_dados()).
+from datetime import date
+
+CORES = ["#5D1B8B", "#C0392B", "#16A085", "#D68910", "#2E86C1", "#97589C", "#7F8C8D", "#2C1F8C"]
+PERIODOS = ["Tudo", "Últimos 12 meses", "Este ano", "Ano passado"]
+# Rótulos no eixo dos meses (os outros ficam só com a marca)
+MAX_ROTULOS = 12
+
+
+def intervalo_periodo(periodo, hoje=None):
+    # (data inicial, data final) AAAA-MM-DD; None = sem limite
+    hoje = hoje or date.today()
+    if periodo == "Últimos 12 meses":
+        # Do mês a seguir ao de há um ano até ao atual: 12 meses, contando com o corrente
+        ano, mes = (hoje.year, 1) if hoje.month == 12 else (hoje.year - 1, hoje.month + 1)
+        inicio = date(ano, mes, 1)
+        return inicio.isoformat(), hoje.isoformat()
+    if periodo == "Este ano":
+        return f"{hoje.year}-01-01", f"{hoje.year}-12-31"
+    if periodo == "Ano passado":
+        return f"{hoje.year - 1}-01-01", f"{hoje.year - 1}-12-31"
+    return None, None
+
+
+def meses_entre(primeiro, ultimo):
+    # "2025-11", "2026-02" -> ["2025-11", "2025-12", "2026-01", "2026-02"]
+    ano, mes = map(int, primeiro.split("-"))
+    meses = []
+    while f"{ano:04d}-{mes:02d}" <= ultimo:
+        meses.append(f"{ano:04d}-{mes:02d}")
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def montar_series(linhas, nomes, selecionados):
+    # linhas: (CodFunc, Mês, Total) de vendas_mensais_funcionarios; selecionados: CodFunc ou None
+    # (total de todos). Devolve (meses, [(nome, valores), ...]) com 0 nos meses sem vendas.
+    por_func = {}
+    for cod, mes, total in linhas:
+        por_func.setdefault(cod, {})[mes] = total
+    total_loja = {}
+    for valores in por_func.values():
+        for mes, total in valores.items():
+            total_loja[mes] = total_loja.get(mes, 0) + total
+    meses = meses_entre(min(total_loja), max(total_loja)) if total_loja else []
+    series = []
+    for cod in selecionados:
+        valores = total_loja if cod is None else por_func.get(cod, {})
+        series.append(("Todos" if cod is None else nomes.get(cod, f"ID {cod}"), [valores.get(m, 0) for m in meses]))
+    return meses, series
+
+
+def valor_curto(valor, _posicao=None):
+    # Marcas do eixo dos valores: 320000 -> "320k"
+    return f"{valor / 1000:g}k" if abs(valor) >= 1000 else f"{valor:g}"
+
+
+class SeriesVendas:
+    # (funcionários, início, fim) -> linhas, enquanto a versão dos dados for a mesma
+    def __init__(self, maximo=32):
+        self.maximo = maximo
+        self.versao = None
+        self._linhas = {}
+
+    def obter(self, cods, inicio, fim, versao):
+        if versao != self.versao:
+            self._linhas.clear()
+            self.versao = versao
+        # A consulta de todos os funcionários serve para qualquer seleção do mesmo período
+        linhas = self._linhas.get((cods, inicio, fim))
+        if linhas is None:
+            linhas = self._linhas.get((None, inicio, fim))
+        return linhas
+
+    def guardar(self, cods, inicio, fim, versao, linhas):
+        if versao != self.versao:
+            self._linhas.clear()
+            self.versao = versao
+        if len(self._linhas) >= self.maximo:
+            self._linhas.pop(next(iter(self._linhas)))
+        self._linhas[(cods, inicio, fim)] = linhas
+
+
+class GraficoVendas:
+    def __init__(self, master, altura=3.0):
+        # Só aqui: o matplotlib demora mais a importar do que o resto do programa a arrancar
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.ticker import MaxNLocator, FuncFormatter
+        # Margens fixas: o layout automático ("constrained") custava mais do que o resto do desenho
+        self.figura = Figure(figsize=(8, altura), dpi=100)
+        self.figura.subplots_adjust(left=0.1, right=0.98, top=0.9, bottom=0.25)
+        self.eixo = self.figura.add_subplot()
+        # Posições fixas do título e do rótulo do eixo, poucas marcas em y e grelha contínua:
+        # é nos textos e nas linhas da grelha que o desenho gasta o tempo
+        self.eixo.set_ylabel("Total Vendido (€)")
+        self.eixo.yaxis.set_label_coords(-0.08, 0.5)
+        self.eixo.xaxis.set_label_coords(0.5, -0.2)
+        self.eixo.yaxis.set_major_locator(MaxNLocator(5))
+        self.eixo.yaxis.set_major_formatter(FuncFormatter(valor_curto))
+        self.eixo.grid(True, color="#DDDDDD")
+        self.canvas = FigureCanvasTkAgg(self.figura, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        # Line2D reutilizadas entre atualizações (as que sobram ficam escondidas)
+        self.linhas = []
+        self._meses = None
+
+    def mostrar(self, titulo, meses, series):
+        eixo = self.eixo
+        while len(self.linhas) < len(series):
+            linha, = eixo.plot([], [], marker="o", markersize=3, linewidth=2,
+                               color=CORES[len(self.linhas) % len(CORES)])
+            self.linhas.append(linha)
+        x = list(range(len(meses)))
+        for i, linha in enumerate(self.linhas):
+            if i < len(series):
+                nome, valores = series[i]
+                linha.set_data(x, valores)
+                linha.set_label(nome)
+                linha.set_visible(True)
+            else:
+                linha.set_visible(False)
+                linha.set_label("_escondida")
+        if meses != self._meses:
+            # Os rótulos dos meses só mudam com o período
+            passo = max(1, -(-len(meses) // MAX_ROTULOS))
+            eixo.set_xticks(x[::passo], meses[::passo], rotation=45, ha="right")
+            eixo.set_xlim(-0.5, max(len(meses) - 0.5, 0.5))
+            self._meses = meses
+        topo = max((max(valores) for _, valores in series if valores), default=0)
+        # Com legenda fica espaço livre por cima das linhas para ela
+        eixo.set_ylim(0, topo * (1.35 if len(series) > 1 else 1.1) or 1)
+        eixo.set_title(titulo if meses else f"{titulo} (sem vendas)", fontsize=12, fontweight="bold", y=1.02)
+        if len(series) > 1:
+            eixo.legend(loc="upper left", fontsize=8)
+        elif eixo.get_legend():
+            eixo.get_legend().remove()
+        self.canvas.draw_idle()
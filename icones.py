@@ -0,0 +1,49 @@
+# ARQUIVO: icones.py
+# Ícones da interface já no tamanho em que são mostrados.
+#
+# A primeira vez que um ícone é pedido num tamanho, o PIL redimensiona-o e grava a cópia em
+# icons/.cache; nos arranques seguintes o Tk lê essa cópia diretamente e o PIL nem é importado.
+# A cópia fica com o mtime do original, por isso basta trocar o PNG original para ser refeita.
+import os
+import tkinter as tk
+
+PASTA_CACHE = os.path.join("icons", ".cache")
+
+# (caminho, tamanho) -> PhotoImage; as imagens pertencem à raiz do Tk, que dura o programa todo
+_fotos = {}
+
+
+def caminho_cache(caminho, tamanho):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return os.path.join(PASTA_CACHE, f"{nome}_{tamanho[0]}x{tamanho[1]}.png")
+
+
+def icone_redimensionado(caminho, tamanho):
+    # Caminho da cópia redimensionada, refeita se o original mudou desde que foi gravada
+    destino = caminho_cache(caminho, tamanho)
+    mtime = os.path.getmtime(caminho)
+    if not os.path.exists(destino) or os.path.getmtime(destino) != mtime:
+        from PIL import Image
+        os.makedirs(PASTA_CACHE, exist_ok=True)
+        temporario = destino + ".tmp"
+        Image.open(caminho).resize(tamanho).save(temporario, "PNG")
+        os.utime(temporario, (mtime, mtime))
+        os.replace(temporario, destino)
+    return destino
+
+
+def carregar_icone(master, caminho, tamanho):
+    # PhotoImage do ícone (None se o ficheiro não existir); reutilizado entre logouts
+    chave = (caminho, tamanho)
+    if chave in _fotos:
+        return _fotos[chave]
+    if not os.path.exists(caminho):
+        return None
+    try:
+        foto = tk.PhotoImage(master=master, file=icone_redimensionado(caminho, tamanho))
+    except OSError:
+        # Pasta só de leitura: redimensiona em memória, como antes
+        from PIL import Image, ImageTk
+        foto = ImageTk.PhotoImage(Image.open(caminho).resize(tamanho), master=master)
+    _fotos[chave] = foto
+    return foto
@@ -0,0 +1,143 @@
+# ARQUIVO: importacao.py
+# Importação em lote de produtos e clientes a partir de CSV (catálogos de fornecedores).
+#
+#   python gestao_de_maquilhagem.py importar produtos catalogo.csv
+#   python gestao_de_maquilhagem.py importar clientes clientes.csv --rejeitados erros.csv
+#
+# O ficheiro é lido linha a linha e gravado em lotes (uma transação por lote), por isso
+# a memória usada não depende do tamanho do ficheiro.
+import csv
+import re
+from itertools import islice
+
+from pesquisa import normalizar
+
+TAMANHO_LOTE = 1000
+# Mesmas regras do ClientePopup
+TELEFONE_VALIDO = re.compile(r"^(\+\d{1,3})?\s?\d{9}$")
+EMAIL_VALIDO = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
+
+# Nomes aceites no cabeçalho (sem acentos, minúsculas) -> campo
+COLUNAS = {
+    "produtos": {"produto": "Produto", "nome": "Produto", "categoria": "Categoria", "marca": "Marca",
+                 "preco": "Preco", "quantidade": "Quantidade", "qtd": "Quantidade", "stock": "Quantidade",
+                 "codigobarras": "CodigoBarras", "codigo de barras": "CodigoBarras", "codigo": "CodigoBarras",
+                 "ean": "CodigoBarras", "sku": "CodigoBarras"},
+    "clientes": {"nomecli": "NomeCli", "nome": "NomeCli", "cliente": "NomeCli",
+                 "telefone": "Telefone", "email": "Email"},
+}
+
+
+def ler_csv(ficheiro):
+    # Gerador de (nº da linha, linha original, {campo: valor}); aceita ";" ou "," como separador
+    amostra = ficheiro.read(4096)
+    ficheiro.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=";,\t")
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.reader(ficheiro, dialeto)
+    cabecalho = [normalizar(c).strip() for c in next(leitor, [])]
+    for n, linha in enumerate(leitor, start=2):
+        if not any(c.strip() for c in linha):
+            continue
+        yield n, linha, dict(zip(cabecalho, linha))
+
+
+def validar_produto(campos):
+    # Mesmas conversões do ProdutoPopup.salvar
+    nome = campos.get("Produto", "").strip()
+    cat = campos.get("Categoria", "").strip()
+    marca = campos.get("Marca", "").strip()
+    codigo = campos.get("CodigoBarras", "").strip() or None
+    if not nome or not cat:
+        raise ValueError("Nome e Categoria são obrigatórios")
+    preco_raw = campos.get("Preco", "").replace(",", ".").replace("€", "").strip() or "0"
+    qtd_raw = campos.get("Quantidade", "").strip() or "0"
+    try:
+        preco = float(preco_raw)
+        qtd = int(float(qtd_raw))
+    except ValueError:
+        raise ValueError("Preço e Quantidade devem ser números válidos")
+    return (nome, cat, marca, preco, qtd, codigo), (nome, marca)
+
+
+def validar_cliente(campos):
+    nome = campos.get("NomeCli", "").strip()
+    tel = campos.get("Telefone", "").strip()
+    email = campos.get("Email", "").strip()
+    if not nome:
+        raise ValueError("Nome obrigatório")
+    if not TELEFONE_VALIDO.match(tel):
+        raise ValueError("Telefone inválido")
+    if not EMAIL_VALIDO.match(email):
+        raise ValueError("Email inválido")
+    return (nome, tel, email), email.lower()
+
+
+def conflitos_produtos(db, lote):
+    # {chave: erro} das linhas cujo código de barras já é de outro produto (na BD ou no lote)
+    donos = db.codigos_em_uso([v[5] for _, _, v in lote.values() if v[5]])
+    erros = {}
+    for chave, (_, _, valores) in lote.items():
+        codigo = valores[5]
+        if not codigo:
+            continue
+        dono = donos.setdefault(codigo, chave)
+        if dono != chave:
+            erros[chave] = f"Código de barras {codigo} já pertence a {dono[0]} ({dono[1]})"
+    return erros
+
+
+def importar_csv(db, tipo, caminho, rejeitados=None, progresso=None, tamanho_lote=TAMANHO_LOTE):
+    # Devolve {"lidas", "inseridos", "atualizados", "rejeitadas"}.
+    # As linhas inválidas vão para `rejeitados` (CSV com a coluna Erro) e não param a importação;
+    # progresso(resumo) é chamado depois de cada lote gravado.
+    validar = validar_produto if tipo == "produtos" else validar_cliente
+    gravar = db.importar_produtos if tipo == "produtos" else db.importar_clientes
+    conflitos = conflitos_produtos if tipo == "produtos" else None
+    nomes = COLUNAS[tipo]
+    resumo = {"lidas": 0, "inseridos": 0, "atualizados": 0, "rejeitadas": 0}
+    saida_rej = escritor_rej = None
+
+    def rejeitar(n, erro, original):
+        nonlocal saida_rej, escritor_rej
+        if escritor_rej is None:
+            saida_rej = open(rejeitados or f"{caminho}.rejeitados.csv", "w", newline="", encoding="utf-8")
+            escritor_rej = csv.writer(saida_rej)
+            escritor_rej.writerow(["Linha", "Erro", "Dados"])
+        escritor_rej.writerow([n, erro, *original])
+        resumo["rejeitadas"] += 1
+
+    with open(caminho, newline="", encoding="utf-8-sig") as f:
+        linhas = ler_csv(f)
+        try:
+            while True:
+                bloco = list(islice(linhas, tamanho_lote))
+                if not bloco:
+                    break
+                # Chave natural repetida no mesmo lote: fica a última (como em lotes diferentes)
+                lote = {}
+                for n, original, linha in bloco:
+                    campos = {nomes[c]: v for c, v in linha.items() if c in nomes}
+                    try:
+                        valores, chave = validar(campos)
+                        lote[chave] = (n, original, valores)
+                    except ValueError as e:
+                        rejeitar(n, str(e), original)
+                if lote and conflitos:
+                    for chave, erro in conflitos(db, lote).items():
+                        n, original, _ = lote.pop(chave)
+                        rejeitar(n, erro, original)
+                if lote:
+                    inseridos, atualizados = gravar([valores for _, _, valores in lote.values()])
+                    resumo["inseridos"] += inseridos
+                    resumo["atualizados"] += atualizados
+                resumo["lidas"] += len(bloco)
+                if progresso:
+                    progresso(dict(resumo))
+        finally:
+            if saida_rej:
+                saida_rej.close()
+    resumo["ficheiro_rejeitados"] = saida_rej.name if saida_rej else None
+    return resumo
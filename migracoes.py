@@ -0,0 +1,560 @@
+# ARQUIVO: migracoes.py
+# Migrações do esquema da BD, versionadas com PRAGMA user_version.
+#
+# Cada migração é (versão, descrição, passos). Os passos são SQL ou funções que recebem
+# a ligação; têm de ser idempotentes (IF NOT EXISTS, etc.) para poderem ser repetidos.
+# As versões são aplicadas por ordem e só uma vez; nunca alterar uma migração já publicada,
+# acrescentar sempre uma nova no fim da lista.
+
+def colunas(conn, tabela):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+def _adicionar_coluna(conn, tabela, definicao):
+    # ALTER TABLE ADD COLUMN não tem IF NOT EXISTS
+    if definicao.split()[0] not in colunas(conn, tabela):
+        conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {definicao}")
+
+
+# Totais por encomenda mantidos por triggers em ItensEncomenda
+SQL_RECALCULAR_TOTAIS = """
+    UPDATE Encomendas SET
+        Total = IFNULL((SELECT SUM(I.Quant * I.PrecoUnitario) FROM ItensEncomenda I WHERE I.NEnc = Encomendas.NEnc), 0),
+        NumItens = IFNULL((SELECT SUM(I.Quant) FROM ItensEncomenda I WHERE I.NEnc = Encomendas.NEnc), 0),
+        NumLinhas = (SELECT COUNT(*) FROM ItensEncomenda I WHERE I.NEnc = Encomendas.NEnc)
+"""
+
+
+def _totais_encomendas(conn):
+    _adicionar_coluna(conn, "Encomendas", "Total REAL NOT NULL DEFAULT 0")
+    _adicionar_coluna(conn, "Encomendas", "NumItens INTEGER NOT NULL DEFAULT 0")
+    _adicionar_coluna(conn, "Encomendas", "NumLinhas INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_itens_totais_ins AFTER INSERT ON ItensEncomenda
+                    BEGIN
+                        UPDATE Encomendas SET Total = Total + NEW.Quant * NEW.PrecoUnitario,
+                                              NumItens = NumItens + NEW.Quant,
+                                              NumLinhas = NumLinhas + 1
+                        WHERE NEnc = NEW.NEnc;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_itens_totais_del AFTER DELETE ON ItensEncomenda
+                    BEGIN
+                        UPDATE Encomendas SET Total = Total - OLD.Quant * OLD.PrecoUnitario,
+                                              NumItens = NumItens - OLD.Quant,
+                                              NumLinhas = NumLinhas - 1
+                        WHERE NEnc = OLD.NEnc;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_itens_totais_upd
+                    AFTER UPDATE OF NEnc, Quant, PrecoUnitario ON ItensEncomenda
+                    BEGIN
+                        UPDATE Encomendas SET Total = Total - OLD.Quant * OLD.PrecoUnitario,
+                                              NumItens = NumItens - OLD.Quant,
+                                              NumLinhas = NumLinhas - 1
+                        WHERE NEnc = OLD.NEnc;
+                        UPDATE Encomendas SET Total = Total + NEW.Quant * NEW.PrecoUnitario,
+                                              NumItens = NumItens + NEW.Quant,
+                                              NumLinhas = NumLinhas + 1
+                        WHERE NEnc = NEW.NEnc;
+                    END""")
+    # Preenche as encomendas que já existiam
+    conn.execute(SQL_RECALCULAR_TOTAIS)
+
+
+# Agregados diários de vendas (por funcionário, produto e categoria) para os relatórios.
+# Mantidos por triggers; podem ser reconstruídos do zero com SQL_RECONSTRUIR_AGREGADOS.
+SQL_TABELAS_AGREGADOS = [
+    """CREATE TABLE IF NOT EXISTS VendasDiaFuncionario (
+            CodFunc INTEGER NOT NULL,
+            Dia TEXT NOT NULL,
+            NumEncomendas INTEGER NOT NULL DEFAULT 0,
+            NumLinhas INTEGER NOT NULL DEFAULT 0,
+            NumItens INTEGER NOT NULL DEFAULT 0,
+            Total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (CodFunc, Dia)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS VendasDiaProduto (
+            CodProd INTEGER NOT NULL,
+            Dia TEXT NOT NULL,
+            NumLinhas INTEGER NOT NULL DEFAULT 0,
+            Quant INTEGER NOT NULL DEFAULT 0,
+            Total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (CodProd, Dia)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS VendasDiaCategoria (
+            Categoria TEXT NOT NULL,
+            Dia TEXT NOT NULL,
+            NumLinhas INTEGER NOT NULL DEFAULT 0,
+            Quant INTEGER NOT NULL DEFAULT 0,
+            Total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (Categoria, Dia)) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_vendas_dia_func_dia ON VendasDiaFuncionario (Dia)",
+    "CREATE INDEX IF NOT EXISTS idx_vendas_dia_prod_dia ON VendasDiaProduto (Dia)",
+]
+
+# Soma (sinal=+1) ou retira (sinal=-1) as linhas de uma encomenda de todos os agregados.
+# {nenc} é NEW.NEnc / OLD.NEnc e {data}/{func} a data e o vendedor a usar.
+_SQL_MOVER_LINHAS = """
+    INSERT INTO VendasDiaFuncionario (CodFunc, Dia, NumLinhas, NumItens, Total)
+    SELECT {func}, date({data}), {sinal} * COUNT(*), {sinal} * SUM(I.Quant), {sinal} * SUM(I.Quant * I.PrecoUnitario)
+    FROM ItensEncomenda I WHERE I.NEnc = {nenc} AND {func} IS NOT NULL {filtro}
+    GROUP BY I.NEnc
+    ON CONFLICT (CodFunc, Dia) DO UPDATE SET NumLinhas = NumLinhas + excluded.NumLinhas,
+        NumItens = NumItens + excluded.NumItens, Total = Total + excluded.Total;
+    INSERT INTO VendasDiaProduto (CodProd, Dia, NumLinhas, Quant, Total)
+    SELECT I.CodProd, date({data}), {sinal} * COUNT(*), {sinal} * SUM(I.Quant), {sinal} * SUM(I.Quant * I.PrecoUnitario)
+    FROM ItensEncomenda I WHERE I.NEnc = {nenc} {filtro}
+    GROUP BY I.CodProd
+    ON CONFLICT (CodProd, Dia) DO UPDATE SET NumLinhas = NumLinhas + excluded.NumLinhas,
+        Quant = Quant + excluded.Quant, Total = Total + excluded.Total;
+    INSERT INTO VendasDiaCategoria (Categoria, Dia, NumLinhas, Quant, Total)
+    SELECT IFNULL(P.Categoria, ''), date({data}), {sinal} * COUNT(*), {sinal} * SUM(I.Quant),
+           {sinal} * SUM(I.Quant * I.PrecoUnitario)
+    FROM ItensEncomenda I JOIN Produtos P ON P.CodProd = I.CodProd WHERE I.NEnc = {nenc} {filtro}
+    GROUP BY IFNULL(P.Categoria, '')
+    ON CONFLICT (Categoria, Dia) DO UPDATE SET NumLinhas = NumLinhas + excluded.NumLinhas,
+        Quant = Quant + excluded.Quant, Total = Total + excluded.Total;
+"""
+
+# Remove as linhas dos agregados que ficaram vazias depois de uma subtração
+_SQL_LIMPAR_AGREGADOS = """
+    DELETE FROM VendasDiaFuncionario WHERE CodFunc = {func} AND Dia = date({data})
+        AND NumEncomendas <= 0 AND NumLinhas <= 0;
+    DELETE FROM VendasDiaProduto WHERE Dia = date({data}) AND NumLinhas <= 0;
+    DELETE FROM VendasDiaCategoria WHERE Dia = date({data}) AND NumLinhas <= 0;
+"""
+
+
+def _sql_mover(sinal, nenc, data, func, filtro=""):
+    return _SQL_MOVER_LINHAS.format(sinal=sinal, nenc=nenc, data=data, func=func, filtro=filtro)
+
+
+def _sql_limpar(data, func):
+    return _SQL_LIMPAR_AGREGADOS.format(data=data, func=func)
+
+
+SQL_TRIGGERS_AGREGADOS = [
+    # Nova linha de venda (o cabeçalho da encomenda já existe)
+    f"""CREATE TRIGGER IF NOT EXISTS trg_itens_agregados_ins AFTER INSERT ON ItensEncomenda
+        BEGIN
+            {_sql_mover("+1", "NEW.NEnc",
+                        "(SELECT DataEnc FROM Encomendas WHERE NEnc = NEW.NEnc)",
+                        "(SELECT CodFunc FROM Encomendas WHERE NEnc = NEW.NEnc)",
+                        "AND I.NItem = NEW.NItem")}
+        END""",
+    # Linha apagada: BEFORE, para a linha e o cabeçalho ainda existirem
+    f"""CREATE TRIGGER IF NOT EXISTS trg_itens_agregados_del BEFORE DELETE ON ItensEncomenda
+        BEGIN
+            {_sql_mover("-1", "OLD.NEnc",
+                        "(SELECT DataEnc FROM Encomendas WHERE NEnc = OLD.NEnc)",
+                        "(SELECT CodFunc FROM Encomendas WHERE NEnc = OLD.NEnc)",
+                        "AND I.NItem = OLD.NItem")}
+            {_sql_limpar("(SELECT DataEnc FROM Encomendas WHERE NEnc = OLD.NEnc)",
+                         "(SELECT CodFunc FROM Encomendas WHERE NEnc = OLD.NEnc)")}
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_encomendas_agregados_ins AFTER INSERT ON Encomendas
+        WHEN NEW.CodFunc IS NOT NULL
+        BEGIN
+            INSERT INTO VendasDiaFuncionario (CodFunc, Dia, NumEncomendas) VALUES (NEW.CodFunc, date(NEW.DataEnc), 1)
+            ON CONFLICT (CodFunc, Dia) DO UPDATE SET NumEncomendas = NumEncomendas + 1;
+        END""",
+    # Apaga primeiro as linhas (em vez do ON DELETE CASCADE) para os triggers delas
+    # ainda encontrarem a data e o vendedor da encomenda
+    f"""CREATE TRIGGER IF NOT EXISTS trg_encomendas_agregados_del BEFORE DELETE ON Encomendas
+        BEGIN
+            DELETE FROM ItensEncomenda WHERE NEnc = OLD.NEnc;
+            UPDATE VendasDiaFuncionario SET NumEncomendas = NumEncomendas - 1
+            WHERE CodFunc = OLD.CodFunc AND Dia = date(OLD.DataEnc);
+            {_sql_limpar("OLD.DataEnc", "OLD.CodFunc")}
+        END""",
+    # Mudança de data ou de vendedor: retira tudo da posição antiga e volta a somar na nova
+    f"""CREATE TRIGGER IF NOT EXISTS trg_encomendas_agregados_upd AFTER UPDATE OF DataEnc, CodFunc ON Encomendas
+        WHEN date(OLD.DataEnc) IS NOT date(NEW.DataEnc) OR OLD.CodFunc IS NOT NEW.CodFunc
+        BEGIN
+            UPDATE VendasDiaFuncionario SET NumEncomendas = NumEncomendas - 1
+            WHERE CodFunc = OLD.CodFunc AND Dia = date(OLD.DataEnc);
+            {_sql_mover("-1", "NEW.NEnc", "OLD.DataEnc", "OLD.CodFunc")}
+            {_sql_limpar("OLD.DataEnc", "OLD.CodFunc")}
+            INSERT INTO VendasDiaFuncionario (CodFunc, Dia, NumEncomendas)
+            SELECT NEW.CodFunc, date(NEW.DataEnc), 1 WHERE NEW.CodFunc IS NOT NULL
+            ON CONFLICT (CodFunc, Dia) DO UPDATE SET NumEncomendas = NumEncomendas + 1;
+            {_sql_mover("+1", "NEW.NEnc", "NEW.DataEnc", "NEW.CodFunc")}
+        END""",
+]
+
+SQL_RECONSTRUIR_AGREGADOS = [
+    "DELETE FROM VendasDiaFuncionario",
+    "DELETE FROM VendasDiaProduto",
+    "DELETE FROM VendasDiaCategoria",
+    """INSERT INTO VendasDiaFuncionario (CodFunc, Dia, NumEncomendas, NumLinhas, NumItens, Total)
+       SELECT E.CodFunc, date(E.DataEnc), COUNT(*),
+              IFNULL(SUM(T.NumLinhas), 0), IFNULL(SUM(T.NumItens), 0), IFNULL(SUM(T.Total), 0)
+       FROM Encomendas E
+       LEFT JOIN (SELECT NEnc, COUNT(*) AS NumLinhas, SUM(Quant) AS NumItens,
+                         SUM(Quant * PrecoUnitario) AS Total
+                  FROM ItensEncomenda GROUP BY NEnc) T ON T.NEnc = E.NEnc
+       WHERE E.CodFunc IS NOT NULL
+       GROUP BY E.CodFunc, date(E.DataEnc)""",
+    """INSERT INTO VendasDiaProduto (CodProd, Dia, NumLinhas, Quant, Total)
+       SELECT I.CodProd, date(E.DataEnc), COUNT(*), SUM(I.Quant), SUM(I.Quant * I.PrecoUnitario)
+       FROM ItensEncomenda I JOIN Encomendas E ON E.NEnc = I.NEnc
+       GROUP BY I.CodProd, date(E.DataEnc)""",
+    """INSERT INTO VendasDiaCategoria (Categoria, Dia, NumLinhas, Quant, Total)
+       SELECT IFNULL(P.Categoria, ''), date(E.DataEnc), COUNT(*), SUM(I.Quant), SUM(I.Quant * I.PrecoUnitario)
+       FROM ItensEncomenda I
+       JOIN Encomendas E ON E.NEnc = I.NEnc
+       JOIN Produtos P ON P.CodProd = I.CodProd
+       GROUP BY IFNULL(P.Categoria, ''), date(E.DataEnc)""",
+]
+
+
+# Pesquisa de texto (FTS5) para a caixa de pesquisa do ecrã principal.
+# unicode61 com remove_diacritics: "po" encontra "Pó" e "rimel" encontra "Rímel".
+# prefix='2 3': índices extra para os prefixos curtos que se escrevem primeiro.
+_OPCOES_FTS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+# Texto de uma encomenda na pesquisa: número, data, cliente e vendedor
+_SQL_TEXTO_ENCOMENDA = """
+    SELECT E.NEnc, E.NEnc, E.DataEnc, IFNULL(C.NomeCli, ''), IFNULL(F.Nome, '')
+    FROM Encomendas E
+    LEFT JOIN Clientes C ON C.CodCli = E.CodCli
+    LEFT JOIN Funcionarios F ON F.CodFunc = E.CodFunc
+"""
+
+
+def _sql_fts_externo(tabela, chave, campos):
+    # Índice FTS com conteúdo externo (lê o texto da própria tabela) e triggers de sincronização
+    nome = f"Pesquisa{tabela}"
+    cols = ", ".join(campos)
+    novos = ", ".join(f"NEW.{c}" for c in campos)
+    velhos = ", ".join(f"OLD.{c}" for c in campos)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {nome} USING fts5({cols}, content = '{tabela}', "
+        f"content_rowid = '{chave}', {_OPCOES_FTS})",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{nome.lower()}_ins AFTER INSERT ON {tabela} BEGIN
+                INSERT INTO {nome} (rowid, {cols}) VALUES (NEW.{chave}, {novos});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{nome.lower()}_del AFTER DELETE ON {tabela} BEGIN
+                INSERT INTO {nome} ({nome}, rowid, {cols}) VALUES ('delete', OLD.{chave}, {velhos});
+            END""",
+        _sql_fts_trigger_upd(tabela, chave, campos),
+        f"INSERT INTO {nome} ({nome}) VALUES ('rebuild')",
+    ]
+
+
+def _sql_fts_trigger_upd(tabela, chave, campos):
+    # Só quando muda uma coluna indexada: o UPDATE da Quantidade (cada venda) não mexe no índice
+    nome = f"Pesquisa{tabela}"
+    cols = ", ".join(campos)
+    novos = ", ".join(f"NEW.{c}" for c in campos)
+    velhos = ", ".join(f"OLD.{c}" for c in campos)
+    return f"""CREATE TRIGGER IF NOT EXISTS trg_{nome.lower()}_upd AFTER UPDATE OF {cols} ON {tabela} BEGIN
+                INSERT INTO {nome} ({nome}, rowid, {cols}) VALUES ('delete', OLD.{chave}, {velhos});
+                INSERT INTO {nome} (rowid, {cols}) VALUES (NEW.{chave}, {novos});
+            END"""
+
+
+SQL_PESQUISA = (
+    _sql_fts_externo("Clientes", "CodCli", ["CodCli", "NomeCli", "Telefone", "Email"])
+    + _sql_fts_externo("Produtos", "CodProd", ["CodProd", "Produto", "Categoria", "Marca"])
+    + _sql_fts_externo("Funcionarios", "CodFunc", ["CodFunc", "Nome", "Username", "Cargo"])
+    + [
+        # As encomendas juntam texto de três tabelas, por isso o índice guarda o seu próprio texto
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS PesquisaEncomendas USING fts5(NEnc, DataEnc, Cliente, Vendedor, "
+        f"{_OPCOES_FTS})",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_pesquisaencomendas_ins AFTER INSERT ON Encomendas BEGIN
+                INSERT INTO PesquisaEncomendas (rowid, NEnc, DataEnc, Cliente, Vendedor)
+                {_SQL_TEXTO_ENCOMENDA} WHERE E.NEnc = NEW.NEnc;
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_pesquisaencomendas_del AFTER DELETE ON Encomendas BEGIN
+                DELETE FROM PesquisaEncomendas WHERE rowid = OLD.NEnc;
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_pesquisaencomendas_upd
+            AFTER UPDATE OF DataEnc, CodCli, CodFunc ON Encomendas BEGIN
+                DELETE FROM PesquisaEncomendas WHERE rowid = NEW.NEnc;
+                INSERT INTO PesquisaEncomendas (rowid, NEnc, DataEnc, Cliente, Vendedor)
+                {_SQL_TEXTO_ENCOMENDA} WHERE E.NEnc = NEW.NEnc;
+            END""",
+        # Mudar o nome de um cliente ou vendedor muda o texto das encomendas dele
+        f"""CREATE TRIGGER IF NOT EXISTS trg_pesquisaencomendas_cli AFTER UPDATE OF NomeCli ON Clientes BEGIN
+                DELETE FROM PesquisaEncomendas WHERE rowid IN (SELECT NEnc FROM Encomendas WHERE CodCli = NEW.CodCli);
+                INSERT INTO PesquisaEncomendas (rowid, NEnc, DataEnc, Cliente, Vendedor)
+                {_SQL_TEXTO_ENCOMENDA} WHERE E.CodCli = NEW.CodCli;
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_pesquisaencomendas_func AFTER UPDATE OF Nome ON Funcionarios BEGIN
+                DELETE FROM PesquisaEncomendas WHERE rowid IN (SELECT NEnc FROM Encomendas WHERE CodFunc = NEW.CodFunc);
+                INSERT INTO PesquisaEncomendas (rowid, NEnc, DataEnc, Cliente, Vendedor)
+                {_SQL_TEXTO_ENCOMENDA} WHERE E.CodFunc = NEW.CodFunc;
+            END""",
+        "DELETE FROM PesquisaEncomendas",
+        f"INSERT INTO PesquisaEncomendas (rowid, NEnc, DataEnc, Cliente, Vendedor) {_SQL_TEXTO_ENCOMENDA}",
+    ]
+)
+
+
+def _codigo_barras(conn):
+    _adicionar_coluna(conn, "Produtos", "CodigoBarras TEXT")
+
+
+def _id_venda(conn):
+    _adicionar_coluna(conn, "Encomendas", "IdVenda TEXT")
+
+
+# O índice de pesquisa de produtos passa a incluir o código de barras
+SQL_PESQUISA_PRODUTOS_CODIGO = [
+    "DROP TRIGGER IF EXISTS trg_pesquisaprodutos_ins",
+    "DROP TRIGGER IF EXISTS trg_pesquisaprodutos_del",
+    "DROP TRIGGER IF EXISTS trg_pesquisaprodutos_upd",
+    "DROP TABLE IF EXISTS PesquisaProdutos",
+] + _sql_fts_externo("Produtos", "CodProd", ["CodProd", "Produto", "Categoria", "Marca", "CodigoBarras"])
+
+
+# Os triggers de atualização dos índices de pesquisa criados antes disparavam em qualquer UPDATE
+SQL_PESQUISA_TRIGGERS_COLUNAS = [
+    sql for tabela, chave, campos in (
+        ("Clientes", "CodCli", ["CodCli", "NomeCli", "Telefone", "Email"]),
+        ("Produtos", "CodProd", ["CodProd", "Produto", "Categoria", "Marca", "CodigoBarras"]),
+        ("Funcionarios", "CodFunc", ["CodFunc", "Nome", "Username", "Cargo"]))
+    for sql in (f"DROP TRIGGER IF EXISTS trg_pesquisa{tabela.lower()}_upd", _sql_fts_trigger_upd(tabela, chave, campos))
+]
+
+
+# Livro de stock: cada mudança de Produtos.Quantidade fica como um movimento (só se acrescentam).
+# O stock de um produto é o saldo do último corte (compactar_stock) mais os movimentos seguintes;
+# o corte 0 é o stock de cada produto no momento desta migração.
+# Datas em UTC: em hora local a hora da mudança de horário repete-se
+SQL_LIVRO_STOCK = [
+    """CREATE TABLE IF NOT EXISTS MovimentosStock (
+            IdMov INTEGER PRIMARY KEY AUTOINCREMENT,
+            CodProd INTEGER NOT NULL,
+            Data TEXT NOT NULL DEFAULT (datetime('now')),
+            Tipo TEXT NOT NULL CHECK (Tipo IN ('venda', 'devolucao', 'ajuste', 'entrada')),
+            Delta INTEGER NOT NULL,
+            NEnc INTEGER,
+            Nota TEXT)""",
+    # Soma dos movimentos de um produto entre dois IdMov só pelo índice
+    "CREATE INDEX IF NOT EXISTS idx_movimentos_prod ON MovimentosStock (CodProd, IdMov, Delta)",
+    "CREATE INDEX IF NOT EXISTS idx_movimentos_data ON MovimentosStock (Data)",
+    # IdMov = último movimento incluído nos saldos do corte
+    """CREATE TABLE IF NOT EXISTS CortesStock (
+            IdMov INTEGER PRIMARY KEY,
+            Data TEXT NOT NULL,
+            Movimentos INTEGER NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS idx_cortes_data ON CortesStock (Data)",
+    # Só os produtos com movimentos desde o corte anterior têm saldo num corte
+    """CREATE TABLE IF NOT EXISTS SaldosStock (
+            CodProd INTEGER NOT NULL,
+            IdMov INTEGER NOT NULL,
+            Quantidade INTEGER NOT NULL,
+            PRIMARY KEY (CodProd, IdMov)) WITHOUT ROWID""",
+    "INSERT OR IGNORE INTO CortesStock (IdMov, Data, Movimentos) VALUES (0, datetime('now'), 0)",
+    "INSERT OR IGNORE INTO SaldosStock (CodProd, IdMov, Quantidade) SELECT CodProd, 0, Quantidade FROM Produtos",
+]
+
+# Stock do produto P segundo o livro, até ao movimento :corte (inclusive): saldo do último corte
+# até lá mais os movimentos entre esse corte e :corte
+SQL_STOCK_LIVRO = """
+    IFNULL((SELECT S.Quantidade FROM SaldosStock S WHERE S.CodProd = P.CodProd AND S.IdMov <= :corte
+            ORDER BY S.IdMov DESC LIMIT 1), 0)
+    + IFNULL((SELECT SUM(M.Delta) FROM MovimentosStock M
+              WHERE M.CodProd = P.CodProd AND M.IdMov <= :corte
+                AND M.IdMov > IFNULL((SELECT MAX(S.IdMov) FROM SaldosStock S
+                                      WHERE S.CodProd = P.CodProd AND S.IdMov <= :corte), 0)), 0)"""
+
+
+MIGRACOES = [
+    (1, "Índices de ItensEncomenda (totais por encomenda e FK de Produtos)", [
+        # Cobre o JOIN por NEnc e o SUM(Quant * PrecoUnitario) sem ir à tabela
+        "CREATE INDEX IF NOT EXISTS idx_itens_nenc ON ItensEncomenda (NEnc, CodProd, Quant, PrecoUnitario)",
+        # Verificação da FK ao apagar produtos (excluir_produto)
+        "CREATE INDEX IF NOT EXISTS idx_itens_codprod ON ItensEncomenda (CodProd)",
+    ]),
+    (2, "Índices de Encomendas (funcionário, cliente e data)", [
+        # Filtro por vendedor e evolução mensal (vendas_por_funcionario_mes)
+        "CREATE INDEX IF NOT EXISTS idx_encomendas_func_data ON Encomendas (CodFunc, DataEnc)",
+        # Verificação da FK ao apagar clientes (excluir_cliente)
+        "CREATE INDEX IF NOT EXISTS idx_encomendas_codcli ON Encomendas (CodCli)",
+        # Intervalos de datas
+        "CREATE INDEX IF NOT EXISTS idx_encomendas_data ON Encomendas (DataEnc)",
+    ]),
+    (3, "Totais, nº de itens e nº de linhas guardados em Encomendas", [
+        _totais_encomendas,
+        # Listagem de um vendedor por NEnc DESC sem ordenar em memória
+        "CREATE INDEX IF NOT EXISTS idx_encomendas_func_nenc ON Encomendas (CodFunc, NEnc)",
+    ]),
+    (4, "Agregados diários de vendas por funcionário, produto e categoria",
+     SQL_TABELAS_AGREGADOS + SQL_TRIGGERS_AGREGADOS + SQL_RECONSTRUIR_AGREGADOS),
+    (5, "Pesquisa de texto (FTS5) de clientes, produtos, funcionários e encomendas", SQL_PESQUISA),
+    (6, "Índices das chaves naturais usadas na importação (upsert)", [
+        # Produto identificado por nome + marca, cliente pelo email
+        "CREATE INDEX IF NOT EXISTS idx_produtos_nome_marca ON Produtos (Produto, Marca)",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_email ON Clientes (Email COLLATE NOCASE)",
+    ]),
+    (7, "Código de barras dos produtos (único) para o leitor do POS", [
+        _codigo_barras,
+        # Produtos sem código ficam fora do índice (NULL)
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_produtos_codbarras ON Produtos (CodigoBarras) "
+        "WHERE CodigoBarras IS NOT NULL",
+    ] + SQL_PESQUISA_PRODUTOS_CODIGO),
+    (8, "Identificador da venda gerado no posto (sincronização do diário offline)", [
+        _id_venda,
+        # Repetir a mesma venda devolve a encomenda já gravada em vez de a duplicar
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_encomendas_idvenda ON Encomendas (IdVenda) WHERE IdVenda IS NOT NULL",
+    ]),
+    (9, "Livro de stock (movimentos, cortes e saldos)", SQL_LIVRO_STOCK),
+    (10, "Índices de pesquisa só atualizados quando mudam as colunas indexadas", SQL_PESQUISA_TRIGGERS_COLUNAS),
+]
+
+
+def versao_esquema(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migracoes(db):
+    # Aplica, cada uma na sua transação, as migrações mais recentes que a versão da BD
+    aplicadas = []
+    for versao, descricao, passos in MIGRACOES:
+        if versao <= versao_esquema(db.connect()):
+            continue
+        with db.transacao() as conn:
+            # Outro terminal pode ter migrado entretanto
+            if versao <= versao_esquema(conn):
+                continue
+            for passo in passos:
+                if callable(passo):
+                    passo(conn)
+                else:
+                    conn.execute(passo)
+            conn.execute(f"PRAGMA user_version = {int(versao)}")
+        aplicadas.append((versao, descricao))
+    return aplicadas
+
+
+# ------------------- VERIFICAÇÃO DOS PLANOS -------------------
+class _Desfazer(Exception):
+    pass
+
+
+def capturar_consultas(db):
+    # Executa os métodos do MaquilhagemDB dentro de uma transação que é desfeita no fim
+    # e devolve o SQL (com parâmetros) de cada instrução executada.
+    conn = db.connect()
+    capturadas = []
+    conn.set_trace_callback(capturadas.append)
+    try:
+        with db.transacao():
+            _exercitar_metodos(db, conn)
+            raise _Desfazer()
+    except _Desfazer:
+        pass
+    finally:
+        conn.set_trace_callback(None)
+
+    vistas = set()
+    consultas = []
+    for sql in capturadas:
+        s = " ".join(sql.split())
+        # Ignora controlo de transações, PRAGMAs e instruções internas de triggers ("-- ...")
+        if s.startswith("--") or s.split(" ", 1)[0].upper() in ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "SAVEPOINT", "RELEASE"):
+            continue
+        # Leituras internas do FTS5 às suas tabelas de sombra ('main'.'Pesquisa..._config')
+        if "'main'." in s:
+            continue
+        if s not in vistas:
+            vistas.add(s)
+            consultas.append(s)
+    return consultas
+
+
+def _exercitar_metodos(db, conn):
+    # Garante pelo menos um registo de cada tipo (tudo desfeito no fim)
+    db.adicionar_cliente("Plano", "912345678", "plano@exemplo.pt")
+    db.adicionar_produto("Plano", "Base", "Plano", 1.0, 10)
+    cod_cli = conn.execute("SELECT MAX(CodCli) FROM Clientes").fetchone()[0]
+    cod_prod = conn.execute("SELECT MAX(CodProd) FROM Produtos").fetchone()[0]
+    cod_func = conn.execute("SELECT MIN(CodFunc) FROM Funcionarios").fetchone()[0]
+    db.adicionar_encomenda("2025-01-01", cod_cli, [(cod_prod, 1, 1.0)], cod_func)
+    nenc = conn.execute("SELECT MAX(NEnc) FROM Encomendas").fetchone()[0]
+    # Venda do diário offline, repetida (a segunda devolve a mesma encomenda)
+    venda = ("registar_venda", ("2025-01-01", cod_cli, [(cod_prod, 1, 1.0)], cod_func), {"id_venda": "plano"})
+    (gravada, _), _ = db.escrever_lote([venda, venda])
+    db.excluir_encomenda(gravada["nenc"])
+
+    db.efetuar_login("admin", "")
+    db.consultar_clientes()
+    db.consultar_produtos()
+    db.pesquisar_clientes("pla")
+    db.pesquisar_produtos("pla")
+    db.pesquisar_funcionarios("adm")
+    db.pesquisar_encomendas("pla")
+    db.pesquisar_encomendas("pla", cod_func)
+    db.obter_produto_por_id(cod_prod)
+    db.consultar_funcionarios()
+    db.consultar_encomendas()
+    db.consultar_encomendas(cod_func)
+    db.consultar_clientes_pagina(apos=cod_cli)
+    db.consultar_produtos_pagina(apos=cod_prod)
+    db.consultar_funcionarios_pagina(apos=cod_func)
+    db.consultar_encomendas_pagina(apos=nenc)
+    db.consultar_encomendas_pagina(cod_func, apos=nenc)
+    db.obter_encomenda(nenc)
+    db.consultar_itens_encomenda(nenc)
+    db.resumo_vendas_funcionarios()
+    db.resumo_vendas_funcionarios(cod_func)
+    db.vendas_por_funcionario_mes(cod_func)
+    db.vendas_mensais_funcionarios()
+    db.vendas_mensais_funcionarios([cod_func], "2025-01-01", "2025-12-31")
+    db.contar_encomendas()
+    db.contar_encomendas(nenc)
+    db.linhas_analise(1, nenc)
+    db.exportar_linhas_encomendas_pagina(apos=(nenc, 1))
+    db.exportar_linhas_encomendas_pagina("2025-01-01", "2025-12-31", cod_func)
+    db.verificar_totais_encomendas()
+    db.vendas_por_produto()
+    db.vendas_por_categoria("2025-01-01", "2025-12-31")
+    db.atualizar_cliente(cod_cli, "Plano", "912345678", "plano@exemplo.pt")
+    db.atualizar_produto(cod_prod, "Plano", "Base", "Plano", 1.0, 10, "5601234567891")
+    db.atualizar_produto(cod_prod, "Plano", "Base", "Plano", 1.0, 12, "5601234567891", quantidade_anterior=10)
+    db.movimentar_stock(cod_prod, 5, "entrada", "plano")
+    db.movimentos_stock(cod_prod)
+    db.movimentos_stock(cod_prod, apos=nenc)
+    db.stock_em("2100-01-01")
+    db.stock_em("2100-01-01", apos=cod_prod - 1)
+    db.reconciliar_stock()
+    db.reconciliar_stock(acertar=True)
+    db.compactar_stock(manter_dias=0)
+    db.importar_produtos([("Plano", "Base", "Plano", 1.0, 5, "5601234567890"), ("Plano Novo", "Base", "Plano", 2.0, 1, None)])
+    db.codigos_em_uso(["5601234567890"])
+    db.obter_produto_por_codigo("5601234567890")
+    db.importar_clientes([("Plano", "912345678", "PLANO@exemplo.pt")])
+    list(db.exportar_linhas_encomendas())
+    list(db.exportar_linhas_encomendas("2025-01-01", "2025-12-31", cod_func, apos_nenc=nenc - 1))
+    db.excluir_encomenda(nenc)
+    db.excluir_produto(cod_prod)
+    db.excluir_cliente(cod_cli)
+    db.excluir_clientes([cod_cli])
+    db.excluir_produtos([cod_prod])
+    db.excluir_funcionarios([cod_func])
+
+
+def relatorio_planos(db):
+    # Imprime o EXPLAIN QUERY PLAN de cada consulta e devolve as que fazem SCAN
+    conn = db.connect()
+    com_scan = []
+    for sql in capturar_consultas(db):
+        plano = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        print(sql)
+        for _id, _pai, _, detalhe in plano:
+            print(f"    {detalhe}")
+        print()
+        # "SCAN ... VIRTUAL TABLE INDEX" é a procura no índice FTS5 (ou json_each), não uma leitura
+        # da tabela; SCAN de uma subconsulta materializada percorre só o resultado já filtrado
+        materializadas = {d.split()[1] for _, _, _, d in plano if d.startswith("MATERIALIZE")}
+        # Os upserts da importação percorrem de propósito o lote inteiro (tabela temporária I)
+        if "FROM temp.Importar" in sql:
+            materializadas.add("I")
+        if any(d.startswith("SCAN") and "VIRTUAL TABLE" not in d and d.split()[1] not in materializadas
+               for _, _, _, d in plano):
+            com_scan.append(sql)
+
+    print(f"Versão do esquema: {versao_esquema(conn)}")
+    print(f"{len(com_scan)} consulta(s) com SCAN:")
+    for sql in com_scan:
+        print(f"  - {sql[:120]}")
+    return com_scan
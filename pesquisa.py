@@ -0,0 +1,111 @@
+# ARQUIVO: pesquisa.py
+# Pesquisa em memória para o ecrã principal (alternativa ao índice FTS5 em lojas pequenas).
+import unicodedata
+
+
+def normalizar(texto) -> str:
+    # Minúsculas e sem acentos: "Rímel" -> "rimel"
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+class InstantaneoPesquisa:
+    # Cópia das linhas de um ecrã com a chave de pesquisa de cada linha já normalizada.
+    # Só volta à BD quando db.versao_dados() muda (houve uma escrita, aqui ou noutro terminal).
+    def __init__(self, db, carregar):
+        self.db = db
+        self.carregar = carregar
+        self.versao = None
+        self.linhas = []
+        self.chaves = []
+        self._ultimo_termo = None
+        self._ultimo_resultado = None
+
+    def atualizar(self):
+        versao = self.db.versao_dados()
+        if versao == self.versao:
+            return
+        self.linhas = self.carregar()
+        self.chaves = [normalizar(" ".join(str(x) for x in row if x is not None)) for row in self.linhas]
+        self.versao = versao
+        self._ultimo_termo = None
+        self._ultimo_resultado = None
+
+    def filtrar(self, termo):
+        self.atualizar()
+        termo = normalizar(termo)
+        # Pesquisa que estende a anterior ("bat" -> "bato"): só procura nos resultados anteriores
+        if self._ultimo_termo is not None and termo.startswith(self._ultimo_termo):
+            candidatos = self._ultimo_resultado
+        else:
+            candidatos = range(len(self.linhas))
+        chaves = self.chaves
+        resultado = [i for i in candidatos if termo in chaves[i]]
+        self._ultimo_termo, self._ultimo_resultado = termo, resultado
+        return [self.linhas[i] for i in resultado]
+
+
+class IndiceCatalogo:
+    # Índice do catálogo para a pesquisa do POS, construído uma vez ao abrir a venda.
+    # produtos: (CodProd, Produto, Categoria, Marca, Preco, Quantidade[, CodigoBarras]).
+    # Cada palavra da pesquisa tem de aparecer (em qualquer posição) numa palavra do nome ou
+    # da marca, sem acentos nem maiúsculas. Os resultados vêm sempre pela ordem do catálogo.
+    N = 3
+
+    def __init__(self, produtos):
+        self.produtos = list(produtos)
+        self.textos = [" ".join(normalizar(f"{p[1]} {p[3] or ''}").split()) for p in self.produtos]
+        # Palavra do catálogo -> posições dos produtos que a têm
+        self.palavras = {}
+        for i, texto in enumerate(self.textos):
+            for palavra in set(texto.split()):
+                self.palavras.setdefault(palavra, set()).add(i)
+        # n-grama (1 a N letras) -> palavras do catálogo que o contêm (o vocabulário é muito
+        # mais pequeno do que o catálogo, por isso a pesquisa por substring é feita nele)
+        self.ngramas = {}
+        for palavra in self.palavras:
+            for n in range(1, self.N + 1):
+                for j in range(len(palavra) - n + 1):
+                    self.ngramas.setdefault(palavra[j:j + n], set()).add(palavra)
+        # Código de barras -> produto (leitor do POS)
+        self.codigos = {p[6]: p for p in self.produtos if len(p) > 6 and p[6]}
+        # Categoria -> posições
+        self.categorias = {}
+        for i, p in enumerate(self.produtos):
+            self.categorias.setdefault(p[2], set()).add(i)
+        self._cache = {}
+        self._por_categoria = {}
+
+    def candidatos(self, termo):
+        # Posições dos produtos com uma palavra que contém `termo`
+        if termo not in self._cache:
+            if len(termo) <= self.N:
+                vocab = self.ngramas.get(termo, ())
+            else:
+                # Cruza os n-gramas e confirma (podem existir todos sem estarem seguidos)
+                listas = sorted((self.ngramas.get(termo[j:j + self.N], set())
+                                 for j in range(len(termo) - self.N + 1)), key=len)
+                vocab = [w for w in listas[0].intersection(*listas[1:]) if termo in w]
+            self._cache[termo] = set().union(*(self.palavras[w] for w in vocab))
+        return self._cache[termo]
+
+    def procurar(self, termo="", categoria=None):
+        # A palavra mais longa (normalmente a mais seletiva) vai ao índice e cruza com a categoria;
+        # as restantes só são confirmadas no texto dos produtos que sobram
+        termos = sorted(normalizar(termo).split(), key=len, reverse=True)
+        if not termos:
+            if categoria is None:
+                return self.produtos
+            if categoria not in self._por_categoria:
+                self._por_categoria[categoria] = [self.produtos[i] for i in sorted(self.categorias.get(categoria, ()))]
+            return self._por_categoria[categoria]
+        listas = [self.candidatos(termos[0])] if termos else []
+        if categoria is not None:
+            listas.append(self.categorias.get(categoria, set()))
+        listas.sort(key=len)
+        posicoes = listas[0].intersection(*listas[1:])
+        textos = self.textos
+        for t in termos[1:]:
+            posicoes = [i for i in posicoes if t in textos[i]]
+        produtos = self.produtos
+        return [produtos[i] for i in sorted(posicoes)]
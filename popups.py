@@ -5,6 +5,9 @@ import sqlite3
 import re
 from datetime import datetime
 import functools
+from importacao import TELEFONE_VALIDO, EMAIL_VALIDO
+from pesquisa import IndiceCatalogo
+from carrinho import Carrinho
 BG_COLOR = "#E6D9E0"  # Lilás muito suave (Fundo da janela)
 CARD_COLOR = "#FFFFFF"  # Branco (Fundo dos cartões/paineis)
 PRIMARY_COLOR = "#5D1B8B"  # Roxo Escuro (Títulos e Preços)
@@ -13,6 +16,14 @@ BUTTON_BG = "#97589C"  # Roxo Médio (Botão Adicionar/Finalizar)
 BUTTON_HOVER = "#7A3E80"  # Roxo Mais Escuro
 TEXT_COLOR = "#FFFFFF"  # Texto Branco
 
+# Categorias do ProdutoPopup (também usadas pelo gerador de dados, gerar_dados.py)
+CATEGORIAS_PADRAO = [
+    "Base", "Corretor", "Pó Compacto/Solto", "Blush", "Iluminador",
+    "Bronzeador", "Sombra", "Rímel (Máscara)", "Delineador",
+    "Lápis de Olhos", "Batom", "Gloss", "Lápis de Lábios",
+    "Sobrancelhas", "Primer/Fixador", "Paletas/Kits"
+]
+
 
 
 # =======================================================
@@ -26,17 +37,12 @@ class ProdutoPopup(tk.Toplevel):
 
         # Configuração da Janela
         self.title("Gerir Produto")
-        self.geometry("500x600")
+        self.geometry("500x680")
         self.configure(bg=BG_COLOR)  # Fundo Lilás Suave
         self.resizable(False, False)
 
         # Categorias
-        self.categorias_padrao = [
-            "Base", "Corretor", "Pó Compacto/Solto", "Blush", "Iluminador",
-            "Bronzeador", "Sombra", "Rímel (Máscara)", "Delineador",
-            "Lápis de Olhos", "Batom", "Gloss", "Lápis de Lábios",
-            "Sobrancelhas", "Primer/Fixador", "Paletas/Kits"
-        ]
+        self.categorias_padrao = CATEGORIAS_PADRAO
 
         self.setup_ui()
         if produto_atual:
@@ -51,7 +57,7 @@ class ProdutoPopup(tk.Toplevel):
         # O "Cartão" branco
         self.card = tk.Frame(main_frame, bg=CARD_COLOR, bd=1, relief="solid")
         # padx/pady externos para dar margem do fundo lilás
-        self.card.place(relx=0.5, rely=0.5, anchor="center", width=420, height=520)
+        self.card.place(relx=0.5, rely=0.5, anchor="center", width=420, height=600)
 
         # --- TÍTULO ---
         titulo_txt = "Novo Produto" if not self.produto_atual else "Editar Produto"
@@ -84,6 +90,11 @@ class ProdutoPopup(tk.Toplevel):
         self.entry_marca = self.estilizar_entry(tk.Entry(f_marca))
         self.entry_marca.pack(fill="x", ipady=4, pady=(2, 0))
 
+        # Código de barras (opcional; o leitor do POS escreve aqui como um teclado)
+        f_codigo = criar_input("CÓDIGO DE BARRAS")
+        self.entry_codigo = self.estilizar_entry(tk.Entry(f_codigo))
+        self.entry_codigo.pack(fill="x", ipady=4, pady=(2, 0))
+
         # Linha Dupla (Preço e Qtd)
         f_duplo = tk.Frame(self.card, bg=CARD_COLOR)
         f_duplo.pack(fill="x", padx=40, pady=10)
@@ -125,12 +136,15 @@ class ProdutoPopup(tk.Toplevel):
         self.entry_marca.insert(0, self.produto_atual[3])
         self.entry_preco.insert(0, str(self.produto_atual[4]))
         self.entry_qtd.insert(0, str(self.produto_atual[5]))
+        if len(self.produto_atual) > 6:
+            self.entry_codigo.insert(0, self.produto_atual[6])
 
     def salvar(self):
         try:
             nome = self.entry_nome.get().strip()
             cat = self.entry_cat.get()
             marca = self.entry_marca.get().strip()
+            codigo = self.entry_codigo.get().strip()
 
             # Tratamento de preço (troca vírgula por ponto)
             preco_raw = self.entry_preco.get().replace(",", ".").replace("€", "")
@@ -142,21 +156,29 @@ class ProdutoPopup(tk.Toplevel):
             if not preco_raw: preco_raw = "0"
             if not qtd_raw: qtd_raw = "0"
 
-            preco = float(preco_raw)
-            qtd = int(float(qtd_raw))  # int(float) permite converter "5.0" para 5
+            try:
+                preco = float(preco_raw)
+                qtd = int(float(qtd_raw))  # int(float) permite converter "5.0" para 5
+            except ValueError:
+                return messagebox.showerror("Erro de Formato", "O Preço e a Quantidade devem ser números válidos.\nExemplo: 12.50")
 
             if self.produto_atual:  # Atualizar
-                self.db.atualizar_produto(self.produto_atual[0], nome, cat, marca, preco, qtd)
+                # Só a diferença para o que estava no ecrã: vendas feitas entretanto não se perdem
+                self.db.atualizar_produto(self.produto_atual[0], nome, cat, marca, preco, qtd, codigo,
+                                          quantidade_anterior=int(float(self.produto_atual[5])))
             else:  # Novo
-                self.db.adicionar_produto(nome, cat, marca, preco, qtd)
+                self.db.adicionar_produto(nome, cat, marca, preco, qtd, codigo)
 
             messagebox.showinfo("Sucesso", "Produto salvo com sucesso!")
             self.destroy()
             if hasattr(self.master, "open_produtos"):
                 self.master.open_produtos()
 
-        except ValueError:
-            messagebox.showerror("Erro de Formato", "O Preço e a Quantidade devem ser números válidos.\nExemplo: 12.50")
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Erro", "Esse código de barras já pertence a outro produto.")
+        except ValueError as e:
+            # Stock insuficiente: vendeu-se entretanto mais do que a edição tira
+            messagebox.showerror("Stock", str(e))
         except Exception as e:
             messagebox.showerror("Erro", f"Ocorreu um erro inesperado: {e}")
     pass
@@ -314,11 +336,11 @@ class ClientePopup(tk.Toplevel):
         if not nome: return messagebox.showwarning("Aviso", "Nome obrigatório.")
 
         # Regex Telefone
-        if not re.match(r"^(\+\d{1,3})?\s?\d{9}$", tel):
+        if not TELEFONE_VALIDO.match(tel):
             return messagebox.showwarning("Erro", "Telefone inválido (Ex: 912345678 ou +351 912345678)")
 
         # Regex Email
-        if not re.match(r"^[\w\.-]+@[\w\.-]+\.\w+$", email):
+        if not EMAIL_VALIDO.match(email):
             return messagebox.showwarning("Erro", "Email inválido.")
 
         try:
@@ -343,7 +365,10 @@ class EncomendaPopup(tk.Toplevel):
         super().__init__(master)
         self.db = db
         self.user = user
-        self.itens_compra = []  # Carrinho: Lista de (id, qtd, preco)
+        # Leituras e a gravação da venda correm na thread da BD da janela principal
+        self.trabalhador = master.trabalhador
+        self.carrinho = Carrinho()  # Linhas por CodProd e total sempre atualizado
+        self.produtos_por_id = {}
 
         # --- Configuração da Janela ---
         self.title("POS - Nova Venda")
@@ -389,17 +414,41 @@ class EncomendaPopup(tk.Toplevel):
         tk.Label(self.left_panel, text="CLIENTE", font=("Segoe UI", 10, "bold"),
                  bg=CARD_COLOR, fg=PRIMARY_COLOR).pack(anchor="w", padx=20, pady=(20, 5))
 
-        self.clientes = self.db.consultar_clientes()
-        self.cli_map = {f"{c[1]}": c[0] for c in self.clientes}  # Nome -> ID
+        self.clientes = []
+        self.cli_map = {}  # Nome -> ID
 
-        self.cb_cli = ttk.Combobox(self.left_panel, values=list(self.cli_map.keys()),
+        self.cb_cli = ttk.Combobox(self.left_panel, values=[],
                                    state="readonly", font=("Segoe UI", 11))
         self.cb_cli.pack(fill="x", padx=20, ipady=4)
+        self.trabalhador.pedir(self.db.consultar_clientes, ao_terminar=self.receber_clientes)
+
+        # --- LEITOR DE CÓDIGO DE BARRAS ---
+        # O leitor USB escreve o código e um Enter neste campo, que começa com o foco
+        tk.Label(self.left_panel, text="CÓDIGO DE BARRAS", font=("Segoe UI", 10, "bold"),
+                 bg=CARD_COLOR, fg=PRIMARY_COLOR).pack(anchor="w", padx=20, pady=(20, 5))
+        self.entry_codigo = tk.Entry(self.left_panel, font=("Segoe UI", 12), bg="#F5F5F5", relief="flat",
+                                     highlightthickness=1, highlightbackground="#DDD", highlightcolor=PRIMARY_COLOR)
+        self.entry_codigo.pack(fill="x", padx=20, ipady=4)
+        self.entry_codigo.bind("<Return>", self.ler_codigo)
+        self.entry_codigo.focus_set()
 
         # --- TABELA DE ITENS ---
         tk.Label(self.left_panel, text="ITENS SELECIONADOS", font=("Segoe UI", 10, "bold"),
                  bg=CARD_COLOR, fg=PRIMARY_COLOR).pack(anchor="w", padx=20, pady=(20, 5))
 
+        # Quantidade: o próximo produto clicado entra com esta quantidade; com uma linha
+        # selecionada, Enter (ou "Definir") muda a quantidade dessa linha
+        qtd_frame = tk.Frame(self.left_panel, bg=CARD_COLOR)
+        qtd_frame.pack(fill="x", padx=20, pady=(0, 5))
+        tk.Label(qtd_frame, text="Qtd:", font=("Segoe UI", 10, "bold"), bg=CARD_COLOR,
+                 fg=PRIMARY_COLOR).pack(side="left")
+        self.spin_qtd = tk.Spinbox(qtd_frame, from_=1, to=9999, width=6, font=("Segoe UI", 11))
+        self.spin_qtd.pack(side="left", padx=5)
+        self.spin_qtd.bind("<Return>", lambda e: self.definir_quantidade())
+        b_style = {"bg": BUTTON_BG, "fg": "white", "font": ("Segoe UI", 9, "bold"), "relief": "flat", "padx": 10}
+        tk.Button(qtd_frame, text="Definir", command=self.definir_quantidade, **b_style).pack(side="left", padx=5)
+        tk.Button(qtd_frame, text="Remover", command=self.remover_linhas, **b_style).pack(side="left")
+
         tree_frame = tk.Frame(self.left_panel, bg=CARD_COLOR)
         tree_frame.pack(fill="both", expand=True, padx=20, pady=(0, 10))
 
@@ -424,6 +473,7 @@ class EncomendaPopup(tk.Toplevel):
         sb.pack(side="right", fill="y")
 
         self.tree.bind("<Double-1>", self.reduzir_item)
+        self.tree.bind("<Delete>", lambda e: self.remover_linhas())
 
         # --- RODAPÉ (TOTAL E BOTÃO) ---
         bottom_frame = tk.Frame(self.left_panel, bg="#F9F9F9", bd=1, relief="solid")
@@ -434,7 +484,7 @@ class EncomendaPopup(tk.Toplevel):
                                         bg="#F9F9F9", fg=PRIMARY_COLOR)
         self.lbl_total_valor.pack(pady=(15, 5))
 
-        btn_finish = tk.Button(bottom_frame, text="FINALIZAR VENDA", command=self.finalizar_venda,
+        self.btn_finish = btn_finish = tk.Button(bottom_frame, text="FINALIZAR VENDA", command=self.finalizar_venda,
                                bg=BUTTON_BG, fg="white", font=("Segoe UI", 12, "bold"),
                                relief="flat", cursor="hand2")
         btn_finish.pack(fill="x", padx=20, pady=20, ipady=8)
@@ -467,70 +517,55 @@ class EncomendaPopup(tk.Toplevel):
         container = tk.Frame(self.right_panel, bg=BG_COLOR)
         container.pack(fill="both", expand=True)
 
-        self.canvas = tk.Canvas(container, bg=BG_COLOR, highlightthickness=0)
-        sb_v = ttk.Scrollbar(container, orient="vertical", command=self.canvas.yview)
-
-        self.scrollable_frame = tk.Frame(self.canvas, bg=BG_COLOR)
+        self.canvas = tk.Canvas(container, bg=BG_COLOR, highlightthickness=0, yscrollincrement=20)
+        self.sb_produtos = ttk.Scrollbar(container, orient="vertical", command=self.canvas.yview)
 
-        self.scrollable_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=sb_v.set)
+        # Grelha virtual: só existem os cartões que cabem na área visível (mais uma folga),
+        # reaproveitados ao rolar e ao filtrar (ver desenhar_grelha)
+        self.lista_grelha = []
+        self.cartoes = []  # [(botão, id da janela no canvas)]
+        self.prod_cartao = {}  # botão -> produto que está a mostrar
+        self.tam_cartao = None  # (largura, altura) de cada célula, medida no primeiro cartão
+        self._regiao_grelha = None
+        self.canvas.configure(yscrollcommand=self.ao_rolar_produtos)
+        self.canvas.bind("<Configure>", lambda e: self.desenhar_grelha())
 
         self.canvas.pack(side="left", fill="both", expand=True)
-        sb_v.pack(side="right", fill="y")
+        self.sb_produtos.pack(side="right", fill="y")
 
         # Mouse Scroll
         self.canvas.bind_all("<MouseWheel>", lambda e: self.canvas.yview_scroll(int(-1 * (e.delta / 120)), "units"))
 
-    # --- LÓGICA DE DADOS (SEGURA) ---
-    def carregar_dados_seguro(self):
-        conn = self.db.connect()
-        c = conn.cursor()
-
-        # Tenta buscar tudo. Se faltarem colunas, ajusta automaticamente.
-        try:
-            # Tente ajustar esta query aos nomes REAIS da sua BD
-            # Estou assumindo: CodProd, Produto, Categoria, Marca, Preco, Stock
-            c.execute("SELECT * FROM Produtos")
-            raw_data = c.fetchall()
-
-            self.todos_produtos = []
-            for row in raw_data:
-                # Previne erros se a tabela tiver menos colunas
-                p_id = row[0]
-                p_nome = row[1]
-                p_cat = row[2] if len(row) > 2 else "Geral"
-
-                # Procura preço (float) e stock (int)
-                p_preco = 0.0
-                p_stock = 0
-
-                # Tenta encontrar o preço na linha
-                for item in row:
-                    if isinstance(item, float): p_preco = item
-                    if isinstance(item, int) and item > 1000:
-                        pass  # Ignora IDs grandes
-                    elif isinstance(item, int) and item != p_id:
-                        p_stock = item  # Assume outro int como stock
-
-                # Se não achou stock, define padrão
-                if p_stock == 0: p_stock = 50
-
-                # Tupla normalizada com 6 itens
-                self.todos_produtos.append((p_id, p_nome, p_cat, "Marca", p_preco, p_stock))
-
-        except Exception as e:
-            messagebox.showerror("Erro BD", f"Erro ao ler produtos: {e}")
-            self.todos_produtos = []
+    def receber_clientes(self, clientes):
+        if not self.winfo_exists():
+            return
+        self.clientes = clientes
+        self.cli_map = {f"{c[1]}": c[0] for c in self.clientes}
+        self.cb_cli["values"] = list(self.cli_map.keys())
 
-        conn.close()
+    # --- LÓGICA DE DADOS ---
+    def carregar_dados_seguro(self):
+        self.todos_produtos = []
+        self.indice = IndiceCatalogo([])
+        self.categoria_atual = None
+        # O índice de pesquisa do catálogo também é construído na thread da BD
+        self.trabalhador.pedir(lambda: IndiceCatalogo(self.db.consultar_produtos()), ao_terminar=self.receber_produtos,
+                               ao_falhar=lambda e: messagebox.showerror("Erro BD", f"Erro ao ler produtos: {e}"))
+
+    def receber_produtos(self, indice):
+        if not self.winfo_exists():
+            return
+        # Linhas de consultar_produtos: CodProd, Produto, Categoria, Marca, Preco, Stock, CodigoBarras
+        self.indice = indice
+        self.todos_produtos = indice.produtos
+        self.produtos_por_id = {p[0]: p for p in indice.produtos}
 
         # Configurar Categorias
-        categorias = sorted(list(set(p[2] for p in self.todos_produtos)))
+        categorias = sorted(indice.categorias, key=lambda c: c or "")
         self.criar_botoes_categoria(categorias)
 
-        # Mostrar todos
-        self.carregar_botoes_produtos(self.todos_produtos)
+        # Mostrar todos (ou o que já foi escrito na pesquisa)
+        self.aplicar_filtros()
 
     def criar_botoes_categoria(self, categorias):
         # Limpa botões antigos
@@ -550,77 +585,90 @@ class EncomendaPopup(tk.Toplevel):
 
         # Outros botões
         for cat in categorias:
-            b = tk.Button(self.cat_frame, text=cat.upper(), command=cmd(cat),
+            b = tk.Button(self.cat_frame, text=(cat or "Geral").upper(), command=cmd(cat),
                           bg="white", fg=PRIMARY_COLOR, font=("Segoe UI", 9, "bold"), relief="flat", padx=15)
             b.pack(side="left", padx=5)
             self.btn_filtros[cat] = b
 
     def carregar_botoes_produtos(self, lista):
-        # Limpar área de scroll
-        for w in self.scrollable_frame.winfo_children(): w.destroy()
+        # Troca só a lista; os cartões existentes passam a mostrar o início da nova lista
+        self.lista_grelha = lista
+        self.canvas.yview_moveto(0)
+        self.desenhar_grelha()
+
+    def criar_cartao(self):
+        # --- CRIAÇÃO DO BOTÃO "CARD" ---
+        # O botão contém todo o texto e é clicável por inteiro; o produto muda, o botão fica
+        btn = tk.Button(self.canvas, font=("Segoe UI", 11, "bold"),
+                        relief="flat", bd=0,
+                        highlightthickness=1, highlightbackground=BUTTON_BG,
+                        width=22, height=8,
+                        wraplength=160, justify="center")
+        btn.config(command=lambda b=btn: self.adicionar_item(self.prod_cartao[b]))
+
+        # Efeito Hover simples (apenas se tiver stock)
+        btn.bind("<Enter>", lambda e, b=btn: b["state"] == "normal" and b.config(bg="#F3EBFF"))  # Roxo muito claro
+        btn.bind("<Leave>", lambda e, b=btn: b["state"] == "normal" and b.config(bg="white"))
+
+        janela = self.canvas.create_window(0, 0, window=btn, anchor="nw", state="hidden")
+        if self.tam_cartao is None:
+            btn.update_idletasks()
+            self.tam_cartao = (btn.winfo_reqwidth() + 16, btn.winfo_reqheight() + 16)
+        self.cartoes.append((btn, janela))
+
+    def mostrar_produto_cartao(self, btn, prod):
+        if self.prod_cartao.get(btn) == prod:
+            return  # Já mostra este produto (ex.: rolar uma linha só reaproveita os outros)
+        self.prod_cartao[btn] = prod
+        p_id, p_nome, p_cat, p_marca, p_preco, p_stock = prod[:6]
+
+        # Cor baseada no stock
+        if p_stock <= 0:
+            btn.config(text=f"{p_nome}\n\nESGOTADO", bg="#E0E0E0", fg="#999",
+                       state="disabled", cursor="arrow")
+        else:
+            btn.config(text=f"{p_nome}\n\n{p_preco:.2f} €", bg="white", fg=PRIMARY_COLOR,
+                       state="normal", cursor="hand2")
 
+    def desenhar_grelha(self):
         cols = 4  # Número de colunas na grelha
-
-        for i, prod in enumerate(lista):
-            p_id, p_nome, p_cat, p_marca, p_preco, p_stock = prod
-
-            row = i // cols
-            col = i % cols
-
-            # --- CRIAÇÃO DO BOTÃO "CARD" ---
-            # O botão contém todo o texto e é clicável por inteiro
-
-            texto = f"{p_nome}\n\n{p_preco:.2f} €"
-
-            # Cor baseada no stock
-            if p_stock <= 0:
-                bg_btn = "#E0E0E0"
-                fg_btn = "#999"
-                texto = f"{p_nome}\n\nESGOTADO"
-                state = "disabled"
-                cursor = "arrow"
+        if not self.cartoes:
+            self.criar_cartao()
+        larg, alt = self.tam_cartao
+        linhas = -(-len(self.lista_grelha) // cols)
+        regiao = (0, 0, cols * larg, max(linhas * alt, 1))
+        # Só quando muda: alterar a scrollregion volta a chamar ao_rolar_produtos
+        if regiao != self._regiao_grelha:
+            self._regiao_grelha = regiao
+            self.canvas.configure(scrollregion=regiao)
+
+        # Cartões para as linhas visíveis e mais uma de cada lado
+        visiveis = self.canvas.winfo_height() // alt + 3
+        while len(self.cartoes) < visiveis * cols:
+            self.criar_cartao()
+
+        primeira = max(int(self.canvas.canvasy(0)) // alt - 1, 0)
+        inicio = primeira * cols
+        for k, (btn, janela) in enumerate(self.cartoes):
+            i = inicio + k
+            if i < len(self.lista_grelha):
+                self.mostrar_produto_cartao(btn, self.lista_grelha[i])
+                self.canvas.coords(janela, (i % cols) * larg + 8, (i // cols) * alt + 8)
+                self.canvas.itemconfigure(janela, state="normal")
             else:
-                bg_btn = "white"
-                fg_btn = PRIMARY_COLOR
-                state = "normal"
-                cursor = "hand2"
-
-            # O Botão
-            btn = tk.Button(self.scrollable_frame, text=texto,
-                            font=("Segoe UI", 11, "bold"),
-                            bg=bg_btn, fg=fg_btn,
-                            relief="flat", bd=0,
-                            highlightthickness=1, highlightbackground=BUTTON_BG,
-                            width=22, height=8,
-                            wraplength=160, justify="center",
-                            cursor=cursor, state=state,
-                            command=lambda p=prod: self.adicionar_item(p))
-
-            btn.grid(row=row, column=col, padx=8, pady=8)
-
-            # Efeito Hover simples (apenas se tiver stock)
-            if state == "normal":
-                btn.bind("<Enter>", lambda e, b=btn: b.config(bg="#F3EBFF"))  # Roxo muito claro
-                btn.bind("<Leave>", lambda e, b=btn: b.config(bg="white"))
+                self.canvas.itemconfigure(janela, state="hidden")
+
+    def ao_rolar_produtos(self, first, last):
+        self.sb_produtos.set(first, last)
+        self.desenhar_grelha()
 
     # --- FILTROS E PESQUISA ---
     def filtrar_pesquisa(self, event):
-        termo = self.search_entry.get().lower()
-        if termo == "":
-            self.filtrar_categoria("TUDO")  # Reseta se vazio
-            return
-
-        # Filtra na lista completa
-        filtrados = [p for p in self.todos_produtos if termo in p[1].lower()]
-
-        # Reseta cores dos botões de categoria
-        for b in self.btn_filtros.values(): b.config(bg="white", fg=PRIMARY_COLOR)
-
-        self.carregar_botoes_produtos(filtrados)
+        self.aplicar_filtros()
 
     def filtrar_categoria(self, categoria):
-        # Limpa pesquisa
-        self.search_entry.delete(0, tk.END)
+        # A pesquisa escrita mantém-se: procura só dentro da categoria
+        self.categoria_atual = None if categoria == "TUDO" else categoria
 
         # Atualiza cores dos botões
         for cat, btn in self.btn_filtros.items():
@@ -629,66 +677,138 @@ class EncomendaPopup(tk.Toplevel):
             else:
                 btn.config(bg="white", fg=PRIMARY_COLOR)
 
-        if categoria == "TUDO":
-            self.carregar_botoes_produtos(self.todos_produtos)
-        else:
-            filtrados = [p for p in self.todos_produtos if p[2] == categoria]
-            self.carregar_botoes_produtos(filtrados)
+        self.aplicar_filtros()
+
+    def aplicar_filtros(self):
+        # Nome/marca (sem acentos, qualquer parte da palavra) cruzado com a categoria escolhida
+        self.carregar_botoes_produtos(self.indice.procurar(self.search_entry.get(), self.categoria_atual))
 
     # --- LÓGICA DO CARRINHO ---
+    def ler_codigo(self, event=None):
+        codigo = self.entry_codigo.get().strip()
+        self.entry_codigo.delete(0, tk.END)
+        if not codigo:
+            return
+        # Primeiro o catálogo em memória; um produto criado depois de abrir o POS vem da BD
+        prod = self.indice.codigos.get(codigo)
+        if prod:
+            return self.adicionar_item(prod)
+        self.trabalhador.pedir(self.db.obter_produto_por_codigo, codigo,
+                               ao_terminar=lambda row: self.receber_produto_codigo(codigo, row))
+
+    def receber_produto_codigo(self, codigo, row):
+        if not self.winfo_exists():
+            return
+        if row is None:
+            self.bell()
+            return messagebox.showwarning("Código", f"Nenhum produto com o código {codigo}.")
+        self.produtos_por_id[row[0]] = row
+        self.adicionar_item(row)
+
+    def quantidade_escolhida(self):
+        try:
+            qtd = int(self.spin_qtd.get())
+        except ValueError:
+            qtd = 0
+        if qtd < 1:
+            messagebox.showwarning("Quantidade", "Indique uma quantidade válida (1 ou mais).")
+        return qtd
+
     def adicionar_item(self, prod):
-        p_id, p_nome, _, _, p_preco, p_stock = prod
-
-        # Verifica se já existe
-        for i, item in enumerate(self.itens_compra):
-            if item[0] == p_id:
-                if item[1] + 1 > p_stock:
-                    return messagebox.showwarning("Stock", f"Apenas {p_stock} unidades disponíveis.")
-                # Atualiza quantidade
-                self.itens_compra[i] = (p_id, item[1] + 1, p_preco)
-                self.atualizar_tabela()
-                return
-
-        # Novo item
-        self.itens_compra.append((p_id, 1, p_preco))
-        self.atualizar_tabela()
+        p_id, p_nome, _, _, p_preco, p_stock = prod[:6]
+        qtd = self.quantidade_escolhida()
+        if qtd < 1:
+            return
+        if self.carrinho.quantidade(p_id) + qtd > p_stock:
+            return messagebox.showwarning("Stock", f"Apenas {p_stock} unidades disponíveis.")
+        self.carrinho.adicionar(p_id, qtd, p_preco)
+        self.atualizar_linha(p_id)
+        # A quantidade escrita vale só para este clique
+        self.spin_qtd.delete(0, tk.END)
+        self.spin_qtd.insert(0, "1")
+
+    def definir_quantidade(self):
+        sel = self.tree.selection()
+        if not sel:
+            return messagebox.showwarning("Aviso", "Selecione uma linha do carrinho.")
+        qtd = self.quantidade_escolhida()
+        if qtd < 1:
+            return
+        p_id = int(sel[0])
+        p_stock = self.produtos_por_id[p_id][5]
+        if qtd > p_stock:
+            return messagebox.showwarning("Stock", f"Apenas {p_stock} unidades disponíveis.")
+        self.carrinho.definir(p_id, qtd)
+        self.atualizar_linha(p_id)
+
+    def remover_linhas(self):
+        for iid in self.tree.selection():
+            self.carrinho.remover(int(iid))
+            self.atualizar_linha(int(iid))
 
     def reduzir_item(self, event):
         sel = self.tree.selection()
         if not sel: return
-        idx = self.tree.index(sel[0])
-
-        item = self.itens_compra[idx]
-        if item[1] > 1:
-            self.itens_compra[idx] = (item[0], item[1] - 1, item[2])
+        p_id = int(sel[0])
+        self.carrinho.definir(p_id, self.carrinho.quantidade(p_id) - 1)
+        self.atualizar_linha(p_id)
+
+    def atualizar_linha(self, p_id):
+        # Só a linha deste produto (iid = CodProd) e o total
+        iid = str(p_id)
+        qtd = self.carrinho.quantidade(p_id)
+        if qtd == 0:
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
         else:
-            self.itens_compra.pop(idx)
-        self.atualizar_tabela()
-
-    def atualizar_tabela(self):
-        for i in self.tree.get_children(): self.tree.delete(i)
-
-        total = 0
-        for p_id, qtd, preco in self.itens_compra:
-            nome = next((p[1] for p in self.todos_produtos if p[0] == p_id), "Produto")
-            sub = qtd * preco
-            total += sub
-            self.tree.insert("", "end", values=(nome, qtd, f"{sub:.2f} €"))
+            valores = (self.produtos_por_id[p_id][1], qtd, f"{self.carrinho.subtotal(p_id):.2f} €")
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=valores)
+            else:
+                self.tree.insert("", "end", iid=iid, values=valores)
+                self.tree.see(iid)
 
-        self.lbl_total_valor.config(text=f"{total:.2f} €")
+        self.lbl_total_valor.config(text=f"{self.carrinho.total:.2f} €")
 
     def finalizar_venda(self):
-        if not self.itens_compra:
+        if not self.carrinho:
             return messagebox.showwarning("Vazio", "Adicione produtos ao carrinho.")
         if not self.cb_cli.get():
             return messagebox.showwarning("Cliente", "Selecione um cliente.")
 
+        cli_id = self.cli_map[self.cb_cli.get()]
+        hoje = datetime.today().strftime('%Y-%m-%d')
+
+        diario = getattr(self.master, "diario", None)
+        if diario:
+            # Modo offline: a venda fica no diário do posto e segue para a BD em segundo plano
+            try:
+                diario.acrescentar(hoje, cli_id, self.carrinho.itens(), self.user['id'])
+            except sqlite3.Error as e:
+                return self.venda_falhou(e)
+            self.master.sincronizador.acordar()
+            return self.venda_registada({"ok": True, "nenc": None, "em_falta": []})
+
+        # Salvar na BD (carrinho inteiro numa só transação); o botão fica inativo até à resposta
+        self.btn_finish.config(state="disabled")
+        self.trabalhador.pedir(self.db.registar_venda, hoje, cli_id, self.carrinho.itens(), self.user['id'],
+                               ao_terminar=self.venda_registada, ao_falhar=self.venda_falhou)
+
+    def venda_falhou(self, erro):
+        if self.winfo_exists():
+            self.btn_finish.config(state="normal")
+        messagebox.showerror("Erro", f"Falha ao gravar: {erro}")
+
+    def venda_registada(self, resultado):
+        if not self.winfo_exists():
+            return
+        self.btn_finish.config(state="normal")
         try:
-            cli_id = self.cli_map[self.cb_cli.get()]
-            hoje = datetime.today().strftime('%Y-%m-%d')
-
-            # Salvar na BD
-            self.db.adicionar_encomenda(hoje, cli_id, self.itens_compra, self.user['id'])
+            if not resultado["ok"]:
+                nomes = {p[0]: p[1] for p in self.todos_produtos}
+                linhas = [f"{nomes.get(cod, f'ID {cod}')}: pedido {q}, disponível {disp}"
+                          for cod, q, disp in resultado["em_falta"]]
+                return messagebox.showwarning("Stock insuficiente", "\n".join(linhas))
 
             messagebox.showinfo("Sucesso", f"Venda de {self.lbl_total_valor.cget('text')} registada!")
             self.destroy()
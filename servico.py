@@ -0,0 +1,506 @@
+# ARQUIVO: servico.py
+# Serviço HTTP/JSON local sobre o MaquilhagemDB, para vários postos partilharem uma só BD sem
+# a abrirem diretamente (pastas de rede, muitos terminais).
+#
+#   python gestao_de_maquilhagem.py --db maquilhagem.db serve --porta 8765       (servidor)
+#   python gestao_de_maquilhagem.py --servidor http://127.0.0.1:8765             (cada posto)
+#
+# Protocolo (JSON):
+#   POST /login  {"username", "password"}      -> {"token", "utilizador", "tamanho_pagina"}
+#   POST /logout
+#   GET  /versao                               -> {"versao": [...]}  (muda a cada escrita gravada)
+#   GET  /rpc/<método>?args=[...]&kwargs={...} -> leituras; ETag = versão dos dados (304 se igual)
+#   POST /rpc/<método>  {"args", "kwargs"}     -> escritas
+#   POST /lote  [{"metodo", "args", "kwargs"}, ...] -> várias escritas num só pedido
+# Todos os pedidos, menos o login, levam "Authorization: Bearer <token>". Os métodos de SO_ADMIN
+# respondem 403 a quem não é Admin, tal como as vendas em nome de outro funcionário.
+#
+# Uma só thread escreve (com a sua ligação): as escritas que chegam ao mesmo tempo são gravadas
+# na mesma transação (um SAVEPOINT por pedido, um só commit). As leituras correm num conjunto
+# de threads, cada uma com a sua ligação (ver MaquilhagemDB.connect); a BD servida está sempre em
+# WAL, para os leitores não esperarem pelos commits do escritor.
+import asyncio
+import functools
+import http.client
+import json
+import queue
+import secrets
+import signal
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+# Métodos do MaquilhagemDB expostos pelo serviço
+LEITURAS = {
+    "consultar_clientes", "consultar_clientes_pagina", "consultar_produtos", "consultar_produtos_pagina",
+    "obter_produto_por_id", "obter_produto_por_codigo", "codigos_em_uso", "consultar_funcionarios",
+    "consultar_funcionarios_pagina", "consultar_encomendas", "consultar_encomendas_pagina", "obter_encomenda",
+    "consultar_itens_encomenda", "pesquisar_clientes", "pesquisar_produtos", "pesquisar_funcionarios",
+    "pesquisar_encomendas", "resumo_vendas_funcionarios", "vendas_por_funcionario_mes", "vendas_mensais_funcionarios",
+    "vendas_por_produto", "vendas_por_categoria", "contar_encomendas", "linhas_analise", "movimentos_stock",
+    "stock_em", "exportar_linhas_encomendas_pagina",
+}
+ESCRITAS = {
+    "adicionar_cliente", "atualizar_cliente", "excluir_cliente", "excluir_clientes", "adicionar_produto",
+    "atualizar_produto", "excluir_produto", "excluir_produtos", "importar_produtos", "importar_clientes",
+    "adicionar_funcionario", "atualizar_funcionario", "excluir_funcionario", "excluir_funcionarios",
+    "registar_venda", "adicionar_encomenda", "excluir_encomenda", "excluir_encomendas", "movimentar_stock",
+    # Só lê, mas com acertar=True escreve: vai sempre para o escritor
+    "reconciliar_stock",
+}
+# Só para sessões de Admin (como na interface): funcionários, apagar clientes e encomendas,
+# acertar o livro de stock e as leituras do ecrã Relatórios
+SO_ADMIN = {
+    "adicionar_funcionario", "atualizar_funcionario", "excluir_funcionario", "excluir_funcionarios",
+    "excluir_cliente", "excluir_clientes", "excluir_encomenda", "excluir_encomendas", "reconciliar_stock",
+    "resumo_vendas_funcionarios", "vendas_por_funcionario_mes", "vendas_mensais_funcionarios", "vendas_por_produto",
+    "vendas_por_categoria", "linhas_analise", "exportar_linhas_encomendas_pagina",
+}
+# Vendas: posição do cod_func nos argumentos; tem de ser o funcionário da sessão (menos para o Admin)
+VENDAS = {"registar_venda": 3, "adicionar_encomenda": 3}
+# Erros que voltam ao cliente com o mesmo tipo (o resto chega como RuntimeError)
+ERROS = {"IntegrityError": sqlite3.IntegrityError, "OperationalError": sqlite3.OperationalError,
+         "StockInsuficiente": ValueError, "ValueError": ValueError, "PermissionError": PermissionError}
+ESTADO_ERRO = {"IntegrityError": 409, "StockInsuficiente": 409, "ValueError": 400, "PermissionError": 403,
+               "OperationalError": 503}
+TAMANHO_MAX_CORPO = 16 * 1024 * 1024
+RESPOSTAS_EM_CACHE = 512
+
+
+def para_json(valor):
+    # Linhas (tuplos) vão como listas; {id: estado} dos apagamentos em lote como pares
+    if isinstance(valor, dict) and not all(isinstance(k, str) for k in valor):
+        return {"__pares__": [[k, para_json(v)] for k, v in valor.items()]}
+    if isinstance(valor, dict):
+        return {k: para_json(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [para_json(v) for v in valor]
+    return valor
+
+
+def de_json(valor, tupla=False):
+    # Inverso de para_json: dentro do resultado, as listas são linhas (tuplos)
+    if isinstance(valor, dict) and "__pares__" in valor:
+        return {k: de_json(v) for k, v in valor["__pares__"]}
+    if isinstance(valor, dict):
+        return {k: de_json(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        itens = [de_json(v, True) for v in valor]
+        return tuple(itens) if tupla else itens
+    return valor
+
+
+def resposta_erro(erro):
+    tipo = type(erro).__name__
+    corpo = {"erro": tipo, "mensagem": str(erro), "em_falta": para_json(getattr(erro, "em_falta", None))}
+    return ESTADO_ERRO.get(tipo, 500), corpo
+
+
+# ------------------- SERVIDOR -------------------
+class ServicoBD:
+    def __init__(self, db, leitores=4, lote_max=64):
+        self.db = db
+        self.lote_max = lote_max
+        self._leitores = ThreadPoolExecutor(leitores, thread_name_prefix="LeitorBD")
+        self._escritas = queue.Queue()
+        self._escritor = threading.Thread(target=self._escrever, name="EscritorBD", daemon=True)
+        self._sessoes = {}
+        # (método, argumentos) -> (versão dos dados, corpo JSON); só serve enquanto a versão for a mesma
+        self._cache = OrderedDict()
+        # Versão dos dados servidos: o escritor soma 1 depois de cada commit (o data_version do SQLite
+        # é de cada ligação e cada leitor tem a sua). O número do arranque não deixa as ETags de um
+        # servidor reiniciado coincidir com as antigas. Escritas feitas à BD por fora do serviço não
+        # mudam a versão: enquanto ele corre, escreve-se pelo serviço.
+        self._arranque = secrets.randbits(31)
+        self.versao = 0
+        self.lotes = 0
+        self.pedidos_escrita = 0
+
+    async def servir(self, host="127.0.0.1", porta=8765, pronto=None):
+        self._escritor.start()
+        servidor = await asyncio.start_server(self._ligacao, host, porta)
+        if pronto:
+            pronto(servidor.sockets[0].getsockname())
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            self._escritas.put(None)
+            self._escritor.join(5)
+            self._leitores.shutdown(wait=True)
+
+    async def _ligacao(self, leitor, escritor):
+        # HTTP/1.1 com keep-alive: vários pedidos na mesma ligação
+        try:
+            while True:
+                pedido = await self._ler_pedido(leitor)
+                if pedido is None:
+                    break
+                metodo, alvo, cabecalhos, corpo = pedido
+                try:
+                    estado, extra, dados = await self._responder(metodo, alvo, cabecalhos, corpo)
+                except Exception as e:
+                    (estado, dados), extra = resposta_erro(e), {}
+                if not isinstance(dados, bytes):
+                    dados = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+                linhas = [f"HTTP/1.1 {estado} {http.client.responses.get(estado, '')}",
+                          "Content-Type: application/json; charset=utf-8", f"Content-Length: {len(dados)}"]
+                linhas += [f"{k}: {v}" for k, v in extra.items()]
+                escritor.write(("\r\n".join(linhas) + "\r\n\r\n").encode("latin-1") + dados)
+                await escritor.drain()
+                if cabecalhos.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Servidor a parar com ligações keep-alive abertas: fecham-se sem erro
+            pass
+        finally:
+            escritor.close()
+
+    async def _ler_pedido(self, leitor):
+        linha = await leitor.readline()
+        if not linha.strip():
+            return None
+        metodo, alvo, _ = linha.decode("latin-1").split(" ", 2)
+        cabecalhos = {}
+        while True:
+            linha = await leitor.readline()
+            if linha in (b"\r\n", b"\n", b""):
+                break
+            nome, _, valor = linha.decode("latin-1").partition(":")
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        tamanho = int(cabecalhos.get("content-length", 0))
+        if tamanho > TAMANHO_MAX_CORPO:
+            raise ValueError("Pedido demasiado grande")
+        corpo = await leitor.readexactly(tamanho) if tamanho else b""
+        return metodo, alvo, cabecalhos, corpo
+
+    async def _responder(self, metodo, alvo, cabecalhos, corpo):
+        partes = urlsplit(alvo)
+        caminho = partes.path.rstrip("/")
+        loop = asyncio.get_running_loop()
+        if metodo == "POST" and caminho == "/login":
+            dados = json.loads(corpo or b"{}")
+            utilizador = await loop.run_in_executor(self._leitores, self.db.efetuar_login,
+                                                    dados.get("username", ""), dados.get("password", ""))
+            if not utilizador:
+                return 401, {}, {"erro": "Login", "mensagem": "Login inválido"}
+            token = secrets.token_hex(16)
+            self._sessoes[token] = utilizador
+            return 200, {}, {"token": token, "utilizador": utilizador, "tamanho_pagina": self.db.TAMANHO_PAGINA}
+
+        token = cabecalhos.get("authorization", "").removeprefix("Bearer ").strip()
+        sessao = self._sessoes.get(token)
+        if sessao is None:
+            return 401, {}, {"erro": "Login", "mensagem": "Sessão inválida"}
+        if metodo == "POST" and caminho == "/logout":
+            self._sessoes.pop(token, None)
+            return 200, {}, {}
+        if metodo == "GET" and caminho == "/versao":
+            return 200, {}, {"versao": [self._arranque, self.versao]}
+
+        nome = caminho.removeprefix("/rpc/")
+        if nome in SO_ADMIN and sessao["cargo"] != "Admin":
+            return self._sem_permissao(nome)
+        if metodo == "GET" and nome in LEITURAS:
+            return await self._ler(nome, partes.query, cabecalhos.get("if-none-match"))
+        if metodo == "POST" and nome in ESCRITAS:
+            dados = json.loads(corpo or b"{}")
+            return self._resultado(*await self._pedir_escrita_de(sessao, nome, dados.get("args", []),
+                                                                 dados.get("kwargs", {})))
+        if metodo == "POST" and caminho == "/lote":
+            chamadas = [c for c in json.loads(corpo or b"[]")]
+            if any(c.get("metodo") not in ESCRITAS for c in chamadas):
+                return 404, {}, {"erro": "Metodo", "mensagem": "Método desconhecido no lote"}
+            proibido = next((c["metodo"] for c in chamadas if c["metodo"] in SO_ADMIN), None)
+            if proibido and sessao["cargo"] != "Admin":
+                return self._sem_permissao(proibido)
+            feitos = await asyncio.gather(*(self._pedir_escrita_de(sessao, c["metodo"], c.get("args", []),
+                                                                   c.get("kwargs", {})) for c in chamadas))
+            respostas = []
+            for resultado, erro in feitos:
+                estado, _, dados = self._resultado(resultado, erro)
+                respostas.append(dict(dados, estado=estado))
+            return 200, {}, respostas
+        return 404, {}, {"erro": "Metodo", "mensagem": f"{metodo} {caminho} não existe"}
+
+    def _sem_permissao(self, nome):
+        return 403, {}, {"erro": "PermissionError", "mensagem": f"{nome}: só para o Admin"}
+
+    def _pedir_escrita_de(self, sessao, nome, args, kwargs):
+        # Uma venda em nome de outro funcionário só é aceite a um Admin: as do diário offline chegam
+        # com o CodFunc de quem as fez e o posto só as envia na sessão dessa pessoa (ver diario.py)
+        posicao = VENDAS.get(nome)
+        if posicao is not None and sessao["cargo"] != "Admin":
+            cod_func = args[posicao] if len(args) > posicao else kwargs.get("cod_func")
+            if cod_func != sessao["id"]:
+                futuro = asyncio.get_running_loop().create_future()
+                futuro.set_result((None, PermissionError(f"{nome}: venda em nome de outro funcionário ({cod_func})")))
+                return futuro
+        return self._pedir_escrita(nome, args, kwargs)
+
+    def _resultado(self, resultado, erro):
+        if erro is not None:
+            estado, corpo = resposta_erro(erro)
+            return estado, {}, corpo
+        return 200, {}, {"resultado": para_json(resultado), "tupla": isinstance(resultado, tuple)}
+
+    async def _ler(self, nome, query, etag_cliente):
+        # A versão é lida antes da consulta: no pior caso a resposta fica marcada com uma versão
+        # mais antiga do que os dados e é refeita no pedido seguinte, nunca o contrário
+        loop = asyncio.get_running_loop()
+        versao = self.versao
+        etag = f'"{self._arranque}.{versao}"'
+        if etag_cliente == etag:
+            return 304, {"ETag": etag}, b""
+        chave = (nome, query)
+        guardado = self._cache.get(chave)
+        if guardado and guardado[0] == versao:
+            self._cache.move_to_end(chave)
+            return 200, {"ETag": etag}, guardado[1]
+        parametros = parse_qs(query)
+        args = json.loads(parametros.get("args", ["[]"])[0])
+        kwargs = json.loads(parametros.get("kwargs", ["{}"])[0])
+        metodo = getattr(self.db, nome)
+        try:
+            resultado = await loop.run_in_executor(self._leitores, functools.partial(metodo, *args, **kwargs))
+        except Exception as e:
+            return self._resultado(None, e)
+        corpo = json.dumps({"resultado": para_json(resultado), "tupla": isinstance(resultado, tuple)},
+                           ensure_ascii=False).encode("utf-8")
+        self._cache[chave] = (versao, corpo)
+        if len(self._cache) > RESPOSTAS_EM_CACHE:
+            self._cache.popitem(last=False)
+        return 200, {"ETag": etag}, corpo
+
+    def _pedir_escrita(self, nome, args, kwargs):
+        # Devolve um future com (resultado, erro), resolvido quando o lote onde entrou for gravado
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._escritas.put((nome, args, kwargs, futuro, loop))
+        return futuro
+
+    def _escrever(self):
+        # Thread única de escrita: junta o que estiver na fila numa só transação
+        while True:
+            primeiro = self._escritas.get()
+            if primeiro is None:
+                return
+            lote = [primeiro]
+            while len(lote) < self.lote_max:
+                try:
+                    pedido = self._escritas.get_nowait()
+                except queue.Empty:
+                    break
+                if pedido is None:
+                    self._escritas.put(None)
+                    break
+                lote.append(pedido)
+            try:
+                # SAVEPOINT por pedido: um pedido que falha não desfaz os outros do lote
+                resultados = self.db.escrever_lote([(nome, args, kwargs) for nome, args, kwargs, _, _ in lote])
+                # Antes de responder: quem recebe a resposta da escrita já lê a versão nova
+                self.versao += 1
+            except Exception as e:
+                # O commit falhou: nenhum pedido do lote ficou gravado
+                resultados = [(None, e)] * len(lote)
+            self.lotes += 1
+            self.pedidos_escrita += len(lote)
+            for (_, _, _, futuro, loop), resultado in zip(lote, resultados):
+                loop.call_soon_threadsafe(_resolver, futuro, resultado)
+
+
+def _resolver(futuro, resultado):
+    if not futuro.done():
+        futuro.set_result(resultado)
+
+
+def servir(db, host="127.0.0.1", porta=8765, leitores=4, lote_max=64):
+    servico = ServicoBD(db, leitores, lote_max)
+    # SIGTERM (systemd, kill) acaba como o Ctrl+C: a fila de escrita é esvaziada antes de sair
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(servico.servir(host, porta, pronto=lambda e: print(f"A servir em http://{e[0]}:{e[1]}",
+                                                                        flush=True)))
+    except KeyboardInterrupt:
+        pass
+    print(f"{servico.pedidos_escrita} escrita(s) em {servico.lotes} transação(ões).")
+
+
+# ------------------- CLIENTE -------------------
+class ClienteBD:
+    # Mesma interface que o MaquilhagemDB usado pela interface (MainApp, popups), mas por HTTP.
+    # Uma ligação HTTP persistente por thread (a do Tk e a do TrabalhadorBD).
+    def __init__(self, url, tempo_limite=30.0):
+        partes = urlsplit(url)
+        self.host = partes.hostname or "127.0.0.1"
+        self.porta = partes.port or 8765
+        self.tempo_limite = tempo_limite
+        self.TAMANHO_PAGINA = 200
+        self.instrumentacao = None
+        self.token = None
+        # Para voltar a entrar sozinho se o servidor for reiniciado
+        self._credenciais = None
+        self._local = threading.local()
+        self._ligacoes = []
+        self._geracao = 0
+        self._lock = threading.Lock()
+        # (método, argumentos) -> (ETag, resultado)
+        self._cache = OrderedDict()
+
+    def _ligacao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.geracao != self._geracao:
+            conn = http.client.HTTPConnection(self.host, self.porta, timeout=self.tempo_limite)
+            with self._lock:
+                self._ligacoes.append(conn)
+                self._local.conn = conn
+                self._local.geracao = self._geracao
+        return conn
+
+    def _pedido(self, metodo, caminho, corpo=None, cabecalhos=None):
+        cabecalhos = dict(cabecalhos or {})
+        if self.token:
+            cabecalhos["Authorization"] = f"Bearer {self.token}"
+        dados = None
+        if corpo is not None:
+            dados = json.dumps(corpo).encode("utf-8")
+            cabecalhos["Content-Type"] = "application/json"
+        estado, etag, resposta = self._enviar(metodo, caminho, dados, cabecalhos)
+        if estado == 401 and self._credenciais and caminho != "/login":
+            # O servidor reiniciou e esqueceu as sessões: entra outra vez e repete
+            self.efetuar_login(*self._credenciais)
+            cabecalhos["Authorization"] = f"Bearer {self.token}"
+            estado, etag, resposta = self._enviar(metodo, caminho, dados, cabecalhos)
+        return estado, etag, resposta
+
+    def _enviar(self, metodo, caminho, dados, cabecalhos):
+        for tentativa in range(2):
+            conn = self._ligacao()
+            try:
+                conn.request(metodo, caminho, body=dados, headers=cabecalhos)
+                resposta = conn.getresponse()
+                return resposta.status, resposta.getheader("ETag"), resposta.read()
+            except (OSError, http.client.HTTPException) as e:
+                # Depois de uma falha a ligação só volta a servir fechada (volta a ligar no pedido seguinte)
+                conn.close()
+                # Ligação keep-alive fechada pelo servidor: repete uma vez
+                if tentativa or not isinstance(e, (ConnectionResetError, BrokenPipeError)):
+                    raise
+
+    def _verificar(self, estado, corpo):
+        if estado >= 400:
+            erro = ERROS.get(corpo.get("erro"), RuntimeError)(corpo.get("mensagem", f"HTTP {estado}"))
+            if corpo.get("em_falta"):
+                erro.em_falta = [tuple(l) for l in corpo["em_falta"]]
+            raise erro
+        return de_json(corpo.get("resultado"), corpo.get("tupla", False))
+
+    def _ler(self, nome, *args, **kwargs):
+        caminho = f"/rpc/{nome}?" + urlencode({"args": json.dumps(args), "kwargs": json.dumps(kwargs)})
+        guardado = self._cache.get(caminho)
+        cabecalhos = {"If-None-Match": guardado[0]} if guardado else None
+        try:
+            estado, etag, dados = self._pedido("GET", caminho, cabecalhos=cabecalhos)
+        except OSError:
+            # Servidor inacessível: a última resposta recebida serve para o POS continuar a vender
+            if guardado:
+                return guardado[1]
+            raise
+        if estado == 304 and guardado:
+            return guardado[1]
+        resultado = self._verificar(estado, json.loads(dados))
+        if etag:
+            with self._lock:
+                self._cache[caminho] = (etag, resultado)
+                if len(self._cache) > RESPOSTAS_EM_CACHE:
+                    self._cache.popitem(last=False)
+        return resultado
+
+    def _escrever(self, nome, *args, **kwargs):
+        estado, _, dados = self._pedido("POST", f"/rpc/{nome}", {"args": args, "kwargs": kwargs})
+        return self._verificar(estado, json.loads(dados))
+
+    def escrever_lote(self, chamadas):
+        # [(método, args, kwargs), ...] -> [(resultado, erro), ...] num só pedido HTTP
+        estado, _, dados = self._pedido("POST", "/lote", [{"metodo": m, "args": a, "kwargs": k} for m, a, k in chamadas])
+        corpo = json.loads(dados)
+        if estado != 200:
+            self._verificar(estado, corpo)
+        saida = []
+        for item in corpo:
+            try:
+                saida.append((self._verificar(item["estado"], item), None))
+            except Exception as e:
+                saida.append((None, e))
+        return saida
+
+    def exportar_linhas_encomendas(self, data_ini=None, data_fim=None, cod_func=None, apos_nenc=None, lote=1000):
+        # Mesmo gerador que o do MaquilhagemDB, feito de páginas pela chave (NEnc, NItem). Cada página
+        # é um instantâneo à parte, mas nenhuma linha se repete nem falta das que já existiam no início.
+        # As páginas não passam pela cache (seriam só lidas uma vez)
+        apos = (apos_nenc or 0, None)
+        while True:
+            caminho = "/rpc/exportar_linhas_encomendas_pagina?" + urlencode({
+                "args": json.dumps([data_ini, data_fim, cod_func, apos, lote]), "kwargs": "{}"})
+            estado, _, dados = self._pedido("GET", caminho)
+            linhas = self._verificar(estado, json.loads(dados))
+            yield from linhas
+            if len(linhas) < lote:
+                break
+            apos = (linhas[-1][0], linhas[-1][6])
+
+    def __getattr__(self, nome):
+        if nome in LEITURAS:
+            funcao = functools.partial(self._ler, nome)
+        elif nome in ESCRITAS:
+            funcao = functools.partial(self._escrever, nome)
+        else:
+            raise AttributeError(nome)
+        return self.instrumentacao.envolver(nome, funcao) if self.instrumentacao else funcao
+
+    def efetuar_login(self, username, password):
+        self.token = None
+        estado, _, dados = self._pedido("POST", "/login", {"username": username, "password": password})
+        if estado == 401:
+            return None
+        corpo = json.loads(dados)
+        if estado != 200:
+            self._verificar(estado, corpo)
+        self.token = corpo["token"]
+        self._credenciais = (username, password)
+        self.TAMANHO_PAGINA = corpo["tamanho_pagina"]
+        return corpo["utilizador"]
+
+    def versao_dados(self):
+        estado, _, dados = self._pedido("GET", "/versao")
+        corpo = json.loads(dados)
+        if estado != 200:
+            self._verificar(estado, corpo)
+        return tuple(corpo["versao"])
+
+    def instrumentar(self, instrumentacao):
+        # Mede as chamadas ao serviço (ida e volta), sem SQL: esse fica do lado do servidor
+        self.instrumentacao = instrumentacao
+
+    def desinstrumentar(self):
+        self.instrumentacao = None
+
+    def fechar(self):
+        # Logout: termina a sessão no servidor e fecha as ligações HTTP de todas as threads
+        if self.token:
+            try:
+                self._pedido("POST", "/logout")
+            except OSError:
+                pass
+            self.token = None
+        self._credenciais = None
+        with self._lock:
+            ligacoes, self._ligacoes = self._ligacoes, []
+            self._geracao += 1
+            self._cache.clear()
+        for conn in ligacoes:
+            conn.close()
@@ -0,0 +1,114 @@
+# ARQUIVO: stress_terminais.py
+# Teste de carga: vários processos (postos de venda) a registar vendas na mesma BD.
+#
+#   python stress_terminais.py --terminais 4 --vendas 200
+#   python stress_terminais.py --sem-multi-terminal   (compara com o modo antigo)
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from gestao_de_maquilhagem import MaquilhagemDB, bd_ocupada
+
+NUM_PRODUTOS = 50
+STOCK_INICIAL = 1_000_000
+
+
+def preparar_bd(caminho, multi_terminal):
+    db = MaquilhagemDB(caminho, multi_terminal=multi_terminal)
+    with db.transacao() as conn:
+        conn.execute("INSERT INTO Clientes (NomeCli, Telefone, Email) VALUES (?, ?, ?)",
+                     ("Cliente Teste", "912345678", "teste@exemplo.pt"))
+        # Pelo método da BD, para o stock inicial ficar também no livro de stock
+        for i in range(NUM_PRODUTOS):
+            db.adicionar_produto(f"Produto {i}", "Base", "Teste", 9.99, STOCK_INICIAL)
+    db.fechar()
+
+
+def terminal(caminho, multi_terminal, busy_timeout, num_vendas, semente, inicio, fila):
+    # Cada processo é um posto de venda com a sua própria ligação
+    db = MaquilhagemDB(caminho, multi_terminal=multi_terminal, busy_timeout=busy_timeout)
+    rnd = random.Random(semente)
+    hoje = datetime.today().strftime('%Y-%m-%d')
+    ok = falhas = 0
+    latencias = []
+
+    inicio.wait()
+    for _ in range(num_vendas):
+        itens = [(rnd.randint(1, NUM_PRODUTOS), rnd.randint(1, 3), 9.99) for _ in range(rnd.randint(1, 8))]
+        t0 = time.perf_counter()
+        try:
+            db.adicionar_encomenda(hoje, 1, itens, 1)
+            ok += 1
+        except sqlite3.OperationalError as e:
+            if not bd_ocupada(e):
+                raise
+            falhas += 1
+        latencias.append(time.perf_counter() - t0)
+        # Leitura concorrente, como o ecrã de Encomendas de outro posto
+        if rnd.random() < 0.2:
+            db.resumo_vendas_funcionarios()
+    db.fechar()
+    fila.put((ok, falhas, latencias))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test multi-terminal do MaquilhagemDB")
+    parser.add_argument("--terminais", type=int, default=4)
+    parser.add_argument("--vendas", type=int, default=200, help="Vendas por terminal")
+    parser.add_argument("--busy-timeout", type=float, default=5.0)
+    parser.add_argument("--sem-multi-terminal", action="store_true", help="Usa o modo antigo (rollback journal)")
+    args = parser.parse_args()
+    multi_terminal = not args.sem_multi_terminal
+
+    pasta = tempfile.mkdtemp(prefix="stress_maquilhagem_")
+    caminho = os.path.join(pasta, "stress.db")
+    preparar_bd(caminho, multi_terminal)
+
+    fila = multiprocessing.Queue()
+    inicio = multiprocessing.Event()
+    processos = [multiprocessing.Process(target=terminal,
+                                         args=(caminho, multi_terminal, args.busy_timeout, args.vendas, i, inicio, fila))
+                 for i in range(args.terminais)]
+    for p in processos:
+        p.start()
+
+    t0 = time.perf_counter()
+    inicio.set()
+    resultados = [fila.get() for _ in processos]
+    duracao = time.perf_counter() - t0
+    for p in processos:
+        p.join()
+
+    ok = sum(r[0] for r in resultados)
+    falhas = sum(r[1] for r in resultados)
+    latencias = sorted(l for r in resultados for l in r[2])
+
+    # Confirma que nenhuma venda se perdeu nem ficou a meio
+    db = MaquilhagemDB(caminho, multi_terminal=multi_terminal)
+    conn = db.connect()
+    n_enc = conn.execute("SELECT COUNT(*) FROM Encomendas").fetchone()[0]
+    vendidas = conn.execute("SELECT IFNULL(SUM(Quant), 0) FROM ItensEncomenda").fetchone()[0]
+    stock = conn.execute("SELECT SUM(Quantidade) FROM Produtos").fetchone()[0]
+    divergentes = db.reconciliar_stock()
+    db.fechar()
+
+    print(f"Modo: {'multi-terminal (WAL)' if multi_terminal else 'rollback journal'}")
+    print(f"Terminais: {args.terminais}  Vendas/terminal: {args.vendas}")
+    print(f"Vendas gravadas: {ok}  Falhas 'database is locked': {falhas}")
+    print(f"Duração: {duracao:.2f} s  Débito: {ok / duracao:.1f} vendas/s")
+    if latencias:
+        p50 = latencias[len(latencias) // 2]
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        print(f"Latência por venda: p50 {p50 * 1000:.1f} ms  p99 {p99 * 1000:.1f} ms")
+    consistente = n_enc == ok and stock + vendidas == NUM_PRODUTOS * STOCK_INICIAL and not divergentes
+    print(f"Consistência (encomendas, stock e livro de stock): {'OK' if consistente else 'FALHOU'}")
+    print(f"BD: {caminho}")
+
+
+if __name__ == "__main__":
+    main()
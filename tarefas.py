@@ -0,0 +1,112 @@
+# ARQUIVO: tarefas.py
+# Acesso à BD fora da thread do Tk. As consultas correm numa thread própria (com a sua ligação,
+# ver MaquilhagemDB.connect) e os resultados voltam ao Tk por um after() periódico, por isso a
+# janela continua a responder enquanto um relatório pesado ou um lock demoram.
+#
+# Uma só thread de propósito: os pedidos correm pela ordem em que são feitos (uma leitura
+# pedida depois de uma escrita vê essa escrita) e o SQLite só aceita um escritor de cada vez.
+import queue
+import threading
+from tkinter import messagebox
+
+
+class Pedido:
+    def __init__(self, funcao, args, kwargs, ao_terminar, ao_falhar, canal):
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.ao_terminar = ao_terminar
+        self.ao_falhar = ao_falhar
+        self.canal = canal
+        self.cancelado = False
+
+    def cancelar(self):
+        # Se ainda estiver na fila não chega a correr; se já correu o resultado é ignorado
+        self.cancelado = True
+
+
+class TrabalhadorBD:
+    # Intervalo da verificação de resultados (~60 verificações por segundo, só com pedidos pendentes)
+    INTERVALO_MS = 16
+
+    def __init__(self, widget, ao_mudar_ocupado=None):
+        self.widget = widget
+        # ao_mudar_ocupado(True/False): indicador "a carregar" da janela
+        self.ao_mudar_ocupado = ao_mudar_ocupado
+        self._pedidos = queue.Queue()
+        self._resultados = queue.Queue()
+        self._canais = {}
+        self._pendentes = 0
+        self._verificacao = None
+        self._thread = threading.Thread(target=self._executar, name="TrabalhadorBD", daemon=True)
+        self._thread.start()
+
+    def pedir(self, funcao, *args, ao_terminar=None, ao_falhar=None, canal=None, **kwargs):
+        # Corre funcao(*args, **kwargs) na thread da BD; ao_terminar(resultado) ou ao_falhar(erro)
+        # correm depois na thread do Tk. Um pedido novo num canal ("tabela", "pesquisa"...)
+        # cancela o anterior do mesmo canal, que deixou de interessar.
+        pedido = Pedido(funcao, args, kwargs, ao_terminar, ao_falhar, canal)
+        if canal is not None:
+            self.cancelar(canal)
+            self._canais[canal] = pedido
+        self._pendentes += 1
+        if self._pendentes == 1 and self.ao_mudar_ocupado:
+            self.ao_mudar_ocupado(True)
+        self._pedidos.put(pedido)
+        if self._verificacao is None:
+            self._verificacao = self.widget.after(self.INTERVALO_MS, self._verificar)
+        return pedido
+
+    def cancelar(self, canal):
+        anterior = self._canais.pop(canal, None)
+        if anterior:
+            anterior.cancelar()
+
+    def parar(self, espera=5.0):
+        # Cancela o que está na fila, deixa acabar o pedido em curso e termina a thread
+        for pedido in list(self._canais.values()):
+            pedido.cancelar()
+        self._pedidos.put(None)
+        if self._verificacao is not None:
+            self.widget.after_cancel(self._verificacao)
+            self._verificacao = None
+        self._thread.join(espera)
+
+    def _executar(self):
+        while True:
+            pedido = self._pedidos.get()
+            if pedido is None:
+                return
+            resultado = erro = None
+            if not pedido.cancelado:
+                try:
+                    resultado = pedido.funcao(*pedido.args, **pedido.kwargs)
+                except Exception as e:
+                    erro = e
+            self._resultados.put((pedido, resultado, erro))
+
+    def _verificar(self):
+        self._verificacao = None
+        try:
+            while True:
+                try:
+                    pedido, resultado, erro = self._resultados.get_nowait()
+                except queue.Empty:
+                    break
+                self._pendentes -= 1
+                if self._canais.get(pedido.canal) is pedido:
+                    del self._canais[pedido.canal]
+                if pedido.cancelado:
+                    continue
+                if erro is None:
+                    if pedido.ao_terminar:
+                        pedido.ao_terminar(resultado)
+                elif pedido.ao_falhar:
+                    pedido.ao_falhar(erro)
+                else:
+                    messagebox.showerror("Erro BD", f"{erro}")
+        finally:
+            if self._pendentes:
+                self._verificacao = self.widget.after(self.INTERVALO_MS, self._verificar)
+            elif self.ao_mudar_ocupado:
+                self.ao_mudar_ocupado(False)